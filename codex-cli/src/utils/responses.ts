@@ -6,7 +6,9 @@ import type {
 import type { Readable } from "stream";
 
 import { log } from "./logger/log.js";
+import { getSessionId } from "./session.js";
 import { spawn } from "child_process";
+import http from "http";
 import path from "path";
 import { createInterface } from "readline";
 import { fileURLToPath } from "url";
@@ -523,9 +525,14 @@ async function* streamResponses(
         completion_tokens: chunk.usage.completion_tokens,
         total_tokens: chunk.usage.total_tokens,
         input_tokens: chunk.usage.prompt_tokens,
-        input_tokens_details: { cached_tokens: 0 },
+        input_tokens_details: {
+          cached_tokens: chunk.usage.prompt_tokens_details?.cached_tokens ?? 0,
+        },
         output_tokens: chunk.usage.completion_tokens,
-        output_tokens_details: { reasoning_tokens: 0 },
+        output_tokens_details: {
+          reasoning_tokens:
+            chunk.usage.completion_tokens_details?.reasoning_tokens ?? 0,
+        },
       };
       log(`[Stream Responses] Updated usage: ${JSON.stringify(usage)}`);
     }
@@ -743,8 +750,114 @@ async function* streamResponses(
 }
 
 
-function callCustomLLM(messages: unknown): AsyncIterable<unknown> {
-  log("Calling custom LLM with messages:" + JSON.stringify(messages, null, 2));
+/**
+ * Parse one event line from the bridge. Returns undefined for text that is
+ * not JSON and throws when the bridge reports that the upstream call failed.
+ */
+function parseBridgeEvent(text: string): unknown {
+  let event: { error?: { message?: string } } | null;
+  try {
+    event = JSON.parse(text);
+  } catch {
+    log(`Failed to parse bridge event: ${text}`);
+    return undefined;
+  }
+  if (event?.error) {
+    throw new Error(
+      `Bridge upstream error: ${event.error.message ?? "unknown error"}`,
+    );
+  }
+  return event;
+}
+
+/**
+ * Stream events from a long-lived bridge started with
+ * `python3 scripts/call_gpt.py --serve`. `bridgeUrl` is either an
+ * `http://host:port` address or `unix:/path/to/socket`.
+ */
+function callBridgeServer(
+  bridgeUrl: string,
+  messages: unknown,
+): AsyncIterable<unknown> {
+  const body = JSON.stringify(messages);
+  const target: http.RequestOptions = bridgeUrl.startsWith("unix:")
+    ? { socketPath: bridgeUrl.slice("unix:".length), path: "/v1/responses" }
+    : (() => {
+        const url = new URL("/v1/responses", bridgeUrl);
+        return { hostname: url.hostname, port: url.port, path: url.pathname };
+      })();
+
+  async function* generator() {
+    const res = await new Promise<http.IncomingMessage>((resolve, reject) => {
+      const req = http.request(
+        {
+          ...target,
+          method: "POST",
+          headers: {
+            "Content-Type": "application/json",
+            "Content-Length": Buffer.byteLength(body),
+          },
+        },
+        resolve,
+      );
+      req.on("error", reject);
+      req.end(body);
+    });
+    if (res.statusCode !== 200) {
+      // 4xx/5xx replies carry {"error": {"message": ...}} instead of a stream.
+      res.setEncoding("utf8");
+      let text = "";
+      for await (const chunk of res) {
+        text += chunk;
+      }
+      let message = text;
+      try {
+        message = JSON.parse(text)?.error?.message ?? text;
+      } catch {
+        // Not JSON; report the raw body.
+      }
+      throw new Error(`Bridge server error ${res.statusCode}: ${message}`);
+    }
+    log(`Bridge session ${res.headers["x-request-id"]} started`);
+
+    const rl = createInterface({ input: res });
+    try {
+      for await (const line of rl) {
+        if (!line.startsWith("data:")) {
+          continue;
+        }
+        const data = line.slice("data:".length).trim();
+        if (!data) {
+          continue;
+        }
+        const event = parseBridgeEvent(data);
+        if (event !== undefined) {
+          yield event;
+        }
+      }
+    } finally {
+      rl.close();
+      res.destroy();
+    }
+  }
+
+  return {
+    [Symbol.asyncIterator]: generator,
+  } as AsyncIterable<unknown>;
+}
+
+function callCustomLLM(input: unknown): AsyncIterable<unknown> {
+  log("Calling custom LLM with messages:" + JSON.stringify(input, null, 2));
+  // The bridge keeps per-session usage totals keyed by this id.
+  const sessionId = getSessionId();
+  const messages =
+    sessionId && input && typeof input === "object"
+      ? { ...input, session_id: sessionId }
+      : input;
+  const bridgeUrl = process.env["CODEX_BRIDGE_URL"];
+  if (bridgeUrl) {
+    return callBridgeServer(bridgeUrl, messages);
+  }
   const scriptPath = path.resolve(
     path.dirname(fileURLToPath(import.meta.url)),
     "../../scripts/call_gpt.py",
@@ -759,20 +872,26 @@ function callCustomLLM(messages: unknown): AsyncIterable<unknown> {
   const rl = createInterface({ input: child.stdout as Readable });
 
   async function* generator() {
-    for await (const line of rl) {
-      const trimmed = line.trim();
-      if (!trimmed) {
-        continue;
-      }
-      try {
+    try {
+      for await (const line of rl) {
+        const trimmed = line.trim();
+        if (!trimmed) {
+          continue;
+        }
         log(`Received line: ${trimmed}`);
-        yield JSON.parse(trimmed);
-      } catch {
-        log(`Failed to parse line: ${trimmed}`);
+        const event = parseBridgeEvent(trimmed);
+        if (event !== undefined) {
+          yield event;
+        }
+      }
+    } finally {
+      rl.close();
+      // Stopped reading early (e.g. the user aborted): SIGTERM makes the
+      // bridge abort its upstream stream instead of draining it.
+      if (child.exitCode === null && child.signalCode === null) {
+        child.kill("SIGTERM");
       }
     }
-    rl.close();
-
   }
 
   return {
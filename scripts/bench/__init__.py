@@ -0,0 +1,27 @@
+"""Benchmarks for the python bridge hot path.
+
+Run from the ``scripts`` directory:
+
+    python3 -m bench                       # all payload sizes, compare to baseline
+    python3 -m bench --sizes small -n 50   # fewer, faster runs
+    python3 -m bench --save-baseline       # record a new baseline.json
+
+End-to-end runs spawn ``call_gpt.py`` per request against a local
+``mock_openai_server`` and time process start, first event, first content
+token and completion.  Microbenchmarks time the in-process stages: request
+parsing, ``convert_input_messages``, ``build_messages`` and ``emit``.
+Every stage is reported as p50/p95/p99 per payload size.
+
+``baseline.json`` holds absolute timings from the machine that recorded
+it, together with a calibration measurement that ``compare`` uses to scale
+them to the current machine (see ``bench.stats``).  The scaling is
+approximate, so regenerate the baseline on each machine that gates on it.
+Bench runs log to a temporary file unless ``CODEX_BRIDGE_LOG`` is set,
+and the spawned bridges run with the usage ledger off.
+"""
+import os
+import sys
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import os
+import tempfile
+
+# Keep bench runs out of the tracked log.out; set before bridge_log is
+# imported (via micro) so both in-process and spawned runs pick it up.
+os.environ.setdefault("CODEX_BRIDGE_LOG", os.path.join(tempfile.gettempdir(), "codex-bridge-bench.log"))
+
+from bench import e2e, micro, payloads
+from bench.stats import baseline_scale, calibrate, compare, host, load_baseline, save_baseline, summarize
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python3 -m bench", description="Benchmark the call_gpt.py bridge hot path.")
+    parser.add_argument("--sizes", default=",".join(payloads.PAYLOADS), help="Comma-separated payload sizes to run.")
+    parser.add_argument("-n", "--iterations", type=int, default=20, help="End-to-end runs per payload size.")
+    parser.add_argument("--micro-iterations", type=int, default=200, help="Microbenchmark runs per stage.")
+    parser.add_argument("--format", choices=("chat", "responses"), default="chat", help="Bridge output format.")
+    parser.add_argument("--no-e2e", action="store_true", help="Only run the in-process microbenchmarks.")
+    parser.add_argument("--baseline", default=BASELINE, help="Baseline file to compare against.")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative p50 increase reported as a regression.")
+    return parser.parse_args(argv)
+
+
+def print_table(results):
+    print(f"{'size':<10} {'stage':<24} {'n':>5} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for size, stages in results.items():
+        for stage, s in stages.items():
+            print(f"{size:<10} {stage:<24} {s['n']:>5} {s['p50']:>10.3f} {s['p95']:>10.3f} {s['p99']:>10.3f}")
+
+
+async def main():
+    args = parse_args()
+    results = {}
+    for size in args.sizes.split(","):
+        data_str = payloads.encoded(size)
+        samples = micro.run(data_str, args.micro_iterations)
+        if not args.no_e2e:
+            samples.update(await e2e.run(data_str, args.iterations, fmt=args.format))
+        results[size] = {stage: summarize(values) for stage, values in samples.items()}
+
+    print_table(results)
+    calibration_ms = calibrate()
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results, calibration_ms)
+        print(f"\nSaved baseline to {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0
+    scale = baseline_scale(baseline, calibration_ms)
+    print(f"\nCalibration {calibration_ms:.3f} ms; baseline timings scaled by {scale:.2f}.")
+    if baseline.get("host") != host():
+        print(f"Baseline was recorded on {baseline.get('host') or 'an unknown host'}; "
+              "process start-up and I/O stages scale imperfectly, so regenerate it with --save-baseline on this machine.")
+    regressions = compare(results, baseline, args.threshold, scale=scale)
+    if not regressions:
+        print("\nNo regressions against baseline.")
+        return 0
+    print("\nRegressions (p50):")
+    for size, stage, old, new in regressions:
+        print(f"  {size}/{stage}: {old:.3f} ms -> {new:.3f} ms ({(new / old - 1) * 100:+.0f}%)")
+    return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
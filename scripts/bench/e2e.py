@@ -0,0 +1,79 @@
+"""End-to-end runs of ``call_gpt.py`` against the local mock server."""
+import asyncio
+import json
+import os
+import sys
+import time
+
+from bench import SCRIPTS_DIR
+from mock_openai_server import MockOpenAIServer
+
+CALL_GPT = os.path.join(SCRIPTS_DIR, "call_gpt.py")
+
+
+async def _interpreter_start():
+    start = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(sys.executable, "-c", "import call_gpt", cwd=SCRIPTS_DIR)
+    await proc.wait()
+    return (time.perf_counter() - start) * 1000
+
+
+async def _one_request(data, env):
+    start = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable,
+        CALL_GPT,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+        env=env,
+    )
+    proc.stdin.write(data)
+    proc.stdin.close()
+    first_event = first_token = last_event = None
+    streamed = 0
+    async for line in proc.stdout:
+        now = last_event = (time.perf_counter() - start) * 1000
+        if first_token is not None:
+            streamed += 1
+        if first_event is None:
+            first_event = now
+        if first_token is None:
+            evt = json.loads(line)
+            choices = evt.get("choices") or [{}]
+            if evt.get("type") == "response.output_text.delta" or (choices[0].get("delta") or {}).get("content"):
+                first_token = now
+    await proc.wait()
+    total = (time.perf_counter() - start) * 1000
+    return {
+        "first_event": first_event or total,
+        "first_token": first_token or total,
+        "total": total,
+        "per_event": (last_event - first_token) / streamed if streamed else 0.0,
+    }
+
+
+async def run(data_str, iterations, fmt="chat", tokens=200):
+    """Return ``{stage: [milliseconds, ...]}`` for ``iterations`` spawned requests."""
+    server = MockOpenAIServer(port=0, reply=" ".join(f"tok{i}" for i in range(tokens)))
+    await server.start()
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="bench",
+        OPENAI_BASE_URL=server.base_url,
+        CODEX_BRIDGE_FORMAT=fmt,
+        CODEX_BRIDGE_LOG_LEVEL=os.environ.get("CODEX_BRIDGE_LOG_LEVEL", "OFF"),
+        # Keep bench traffic out of the real usage ledger and its timings.
+        CODEX_BRIDGE_USAGE_FILE="off",
+    )
+    data = data_str.encode()
+    samples = {"interpreter_start": [], "first_event": [], "first_token": [], "total": [], "per_event": []}
+    try:
+        for _ in range(iterations):
+            samples["interpreter_start"].append(await _interpreter_start())
+            result = await _one_request(data, env)
+            for stage in ("first_event", "first_token", "total", "per_event"):
+                samples[stage].append(result[stage])
+    finally:
+        await server.close()
+    return samples
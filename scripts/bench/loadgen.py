@@ -0,0 +1,299 @@
+"""Replay a corpus of bridge requests under load.
+
+Run from the ``scripts`` directory:
+
+    python3 -m bench.loadgen --corpus inputs.jsonl --concurrency 16 --requests 200
+    python3 -m bench.loadgen --rate 5 --duration 60 --modes persistent --profile realistic
+
+The corpus holds one bridge request (what ``callCustomLLM`` writes to
+stdin) per line; lines without ``messages`` or ``input`` are skipped, and
+the bench payloads are used when no corpus is given.  Requests are sent
+by a fixed number of workers (``--concurrency``) or as Poisson arrivals
+(``--rate`` per second) to ``call_gpt.py`` spawned per request
+(``process``) and/or to one ``call_gpt.py --serve`` (``persistent``).
+Upstream is a local ``mock_openai_server`` unless ``--upstream`` names a
+real endpoint.
+
+For each mode it reports throughput, TTFT (first content token) and
+end-to-end latency percentiles, errors, CPU milliseconds per session and
+peak RSS of a bridge process.  The spawned bridges run with the usage
+ledger off, so load runs never land in ``~/.codex/bridge_usage.json``.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from bench import SCRIPTS_DIR, payloads
+from bench.stats import summarize
+from mock_openai_server import PROFILES, MockOpenAIServer
+
+CALL_GPT = os.path.join(SCRIPTS_DIR, "call_gpt.py")
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def load_corpus(path):
+    """Return the request payloads (as bytes) found in a JSON-lines file."""
+    corpus = []
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(request, dict) and ("messages" in request or "input" in request):
+                corpus.append(json.dumps(request).encode())
+    return corpus
+
+
+def is_token(evt):
+    choices = evt.get("choices") or [{}]
+    return evt.get("type") == "response.output_text.delta" or bool((choices[0].get("delta") or {}).get("content"))
+
+
+async def process_request(data, env):
+    """Spawn one ``call_gpt.py`` for ``data``; return ``(ttft_ms, total_ms, ok)``."""
+    start = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable,
+        CALL_GPT,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+        env=env,
+    )
+    proc.stdin.write(data)
+    proc.stdin.close()
+    ttft = None
+    finished = False
+    async for line in proc.stdout:
+        evt = json.loads(line)
+        if ttft is None and is_token(evt):
+            ttft = (time.perf_counter() - start) * 1000
+        finished = finished or evt.get("type") == "response.completed" or any(
+            c.get("finish_reason") for c in evt.get("choices") or ()
+        )
+    await proc.wait()
+    return ttft, (time.perf_counter() - start) * 1000, finished and proc.returncode == 0
+
+
+async def persistent_request(data, socket_path):
+    """POST ``data`` to a running bridge server; return ``(ttft_ms, total_ms, ok)``."""
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    writer.write(
+        b"POST /v1/responses HTTP/1.1\r\nHost: bridge\r\nContent-Type: application/json\r\n"
+        b"Content-Length: %d\r\n\r\n" % len(data) + data
+    )
+    await writer.drain()
+    ttft = None
+    finished = False
+    status = await reader.readline()
+    try:
+        async for line in reader:
+            if not line.startswith(b"data:"):
+                continue
+            evt = json.loads(line[5:])
+            if ttft is None and is_token(evt):
+                ttft = (time.perf_counter() - start) * 1000
+            finished = finished or evt.get("type") == "response.completed" or any(
+                c.get("finish_reason") for c in evt.get("choices") or ()
+            )
+    finally:
+        writer.close()
+    return ttft, (time.perf_counter() - start) * 1000, finished and b" 200 " in status
+
+
+async def drive(send, corpus, concurrency=None, rate=None, requests=None, duration=None):
+    """Send requests round-robin from ``corpus``; return per-request results."""
+    results = []
+    deadline = time.monotonic() + duration if duration else None
+    counter = itertools.count()
+
+    def more(i):
+        return (requests is None or i < requests) and (deadline is None or time.monotonic() < deadline)
+
+    async def one(i):
+        try:
+            results.append(await send(corpus[i % len(corpus)]))
+        except Exception:
+            results.append((None, None, False))
+
+    if rate:
+        tasks = []
+        i = next(counter)
+        while more(i):
+            tasks.append(asyncio.ensure_future(one(i)))
+            await asyncio.sleep(random.expovariate(rate))
+            i = next(counter)
+        await asyncio.gather(*tasks)
+        return results
+
+    async def worker():
+        i = next(counter)
+        while more(i):
+            await one(i)
+            i = next(counter)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency or 1)))
+    return results
+
+
+def proc_cpu_ms(pid):
+    """User+system CPU of ``pid`` from /proc, or None where unavailable."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) * 1000 / CLOCK_TICKS
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def proc_peak_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+async def run_process_mode(corpus, env, **load):
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    results = await drive(lambda data: process_request(data, env), corpus, **load)
+    elapsed = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_ms = ((after.ru_utime + after.ru_stime) - (before.ru_utime + before.ru_stime)) * 1000
+    # ru_maxrss is in KiB on Linux: the largest single child seen so far.
+    return results, elapsed, cpu_ms, after.ru_maxrss / 1024
+
+
+async def run_persistent_mode(corpus, env, **load):
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = os.path.join(tmp, "bridge.sock")
+        server = await asyncio.create_subprocess_exec(
+            sys.executable, CALL_GPT, "--serve", "--socket", socket_path, stderr=asyncio.subprocess.DEVNULL, env=env
+        )
+        try:
+            for _ in range(200):
+                if os.path.exists(socket_path):
+                    break
+                await asyncio.sleep(0.05)
+            else:
+                raise RuntimeError("bridge server did not start")
+            cpu_before = proc_cpu_ms(server.pid)
+            start = time.perf_counter()
+            results = await drive(lambda data: persistent_request(data, socket_path), corpus, **load)
+            elapsed = time.perf_counter() - start
+            cpu_after = proc_cpu_ms(server.pid)
+            rss = proc_peak_rss_mb(server.pid)
+        finally:
+            server.terminate()
+            await server.wait()
+    cpu_ms = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+    return results, elapsed, cpu_ms, rss
+
+
+def report(mode, results, elapsed, cpu_ms, rss_mb):
+    ok = [r for r in results if r[2]]
+    ttft = [r[0] for r in ok if r[0] is not None]
+    total = [r[1] for r in ok]
+    return {
+        "mode": mode,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "ttft_ms": summarize(ttft) if ttft else None,
+        "latency_ms": summarize(total) if total else None,
+        "cpu_ms_per_session": cpu_ms / len(results) if cpu_ms is not None and results else None,
+        "peak_rss_mb": rss_mb,
+    }
+
+
+def print_report(rows):
+    def fmt(value, spec=".1f"):
+        return "-" if value is None else format(value, spec)
+
+    print(
+        f"{'mode':<11} {'reqs':>5} {'err':>4} {'req/s':>7} {'ttft p50':>9} {'p95':>8} {'p99':>8}"
+        f" {'lat p50':>9} {'p95':>8} {'p99':>8} {'cpu ms':>8} {'rss MB':>7}"
+    )
+    for row in rows:
+        ttft, lat = row["ttft_ms"] or {}, row["latency_ms"] or {}
+        print(
+            f"{row['mode']:<11} {row['requests']:>5} {row['errors']:>4} {row['throughput_rps']:>7.2f}"
+            f" {fmt(ttft.get('p50')):>9} {fmt(ttft.get('p95')):>8} {fmt(ttft.get('p99')):>8}"
+            f" {fmt(lat.get('p50')):>9} {fmt(lat.get('p95')):>8} {fmt(lat.get('p99')):>8}"
+            f" {fmt(row['cpu_ms_per_session']):>8} {fmt(row['peak_rss_mb']):>7}"
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python3 -m bench.loadgen", description="Replay bridge requests under load.")
+    parser.add_argument("--corpus", help="JSON-lines file of bridge requests (default: the bench payloads).")
+    parser.add_argument("--modes", default="process,persistent", help="Comma-separated: process, persistent.")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=4, help="Closed-loop workers (default 4).")
+    load.add_argument("--rate", type=float, help="Open-loop arrivals per second instead of fixed workers.")
+    parser.add_argument("--requests", type=int, help="Requests per mode (default 50 unless --duration is set).")
+    parser.add_argument("--duration", type=float, help="Seconds to keep sending per mode.")
+    parser.add_argument("--format", choices=("chat", "responses"), default="chat", help="Bridge output format.")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="realistic", help="Mock upstream timing profile.")
+    parser.add_argument("--upstream", help="OpenAI-compatible base URL to use instead of the mock server.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    return parser.parse_args(argv)
+
+
+async def main():
+    args = parse_args()
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+        if not corpus:
+            print(f"No bridge requests found in {args.corpus}", file=sys.stderr)
+            return 1
+    else:
+        corpus = [payloads.encoded(name).encode() for name in ("small", "history")]
+    requests = args.requests if args.requests or args.duration else 50
+    load = {"concurrency": args.concurrency, "rate": args.rate, "requests": requests, "duration": args.duration}
+
+    server = None
+    base_url = args.upstream
+    if base_url is None:
+        server = await MockOpenAIServer(port=0, random_words=120, **PROFILES[args.profile]).start()
+        base_url = server.base_url
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "") if args.upstream else "loadgen",
+        OPENAI_BASE_URL=base_url,
+        CODEX_BRIDGE_FORMAT=args.format,
+        CODEX_BRIDGE_LOG_LEVEL=os.environ.get("CODEX_BRIDGE_LOG_LEVEL", "OFF"),
+        # Keep bench traffic out of the real usage ledger and its timings.
+        CODEX_BRIDGE_USAGE_FILE="off",
+    )
+    rows = []
+    try:
+        for mode in args.modes.split(","):
+            run = {"process": run_process_mode, "persistent": run_persistent_mode}[mode]
+            rows.append(report(mode, *await run(corpus, env, **load)))
+    finally:
+        if server is not None:
+            await server.close()
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_report(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
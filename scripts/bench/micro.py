@@ -0,0 +1,44 @@
+"""In-process microbenchmarks of the bridge's per-request and per-event work."""
+import io
+import json
+import time
+
+import bridge_json
+import call_gpt
+
+SAMPLE_EVENT = {
+    "type": "response.output_text.delta",
+    "item_id": "msg_1234abcd",
+    "output_index": 0,
+    "content_index": 0,
+    "delta": " token",
+}
+
+
+def _time(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+class _Discard(io.RawIOBase):
+    def writable(self):
+        return True
+
+    def write(self, b):
+        return len(b)
+
+
+def run(data_str, iterations):
+    """Return ``{stage: [milliseconds, ...]}`` for one encoded payload."""
+    request = json.loads(data_str)
+    out = _Discard()
+    return {
+        "parse_request": _time(lambda: bridge_json.loads(data_str), iterations),
+        "convert_input_messages": _time(lambda: call_gpt.convert_input_messages(request["input"]), iterations),
+        "build_messages": _time(lambda: call_gpt.build_messages(request), iterations),
+        "emit_event": _time(lambda: call_gpt.emit(SAMPLE_EVENT, out), iterations),
+    }
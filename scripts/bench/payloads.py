@@ -0,0 +1,70 @@
+"""Request payloads of increasing size, shaped like what codex sends."""
+import json
+
+INSTRUCTIONS = (
+    "You are operating as and within the Codex CLI, a terminal-based agentic coding assistant. "
+    "You are expected to be precise, safe, and helpful.\n"
+) * 40  # ~5 KB, about the size of the real instructions blob
+
+SHELL_TOOL = {
+    "type": "function",
+    "name": "shell",
+    "description": "Runs a shell command, and returns its output.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "command": {"type": "array", "items": {"type": "string"}},
+            "workdir": {"type": "string"},
+            "timeout": {"type": "number"},
+        },
+        "required": ["command"],
+    },
+}
+
+
+def _user(text):
+    return {"type": "message", "role": "user", "content": [{"type": "input_text", "text": text}]}
+
+
+def _assistant(text):
+    return {"type": "message", "role": "assistant", "content": [{"type": "output_text", "text": text}]}
+
+
+def _tool_output(call_id, output):
+    return {"type": "function_call_output", "call_id": call_id, "output": output}
+
+
+def small():
+    return {
+        "model": "gpt-4o-mini",
+        "instructions": INSTRUCTIONS,
+        "input": [_user("what files are in my cwd")],
+        "tools": [SHELL_TOOL],
+        "stream": True,
+    }
+
+
+def history(turns=100):
+    items = []
+    for i in range(turns):
+        items.append(_user(f"step {i}: please inspect the next file and summarise it"))
+        items.append(_tool_output(f"call_{i}", f"file_{i}.py\n" + "x = 1\n" * 20))
+        items.append(_assistant(f"File {i} assigns x a few times; nothing unusual."))
+    payload = small()
+    payload["input"] = items + [_user("what next?")]
+    return payload
+
+
+def large_tool_output(megabytes=1):
+    line = "drwxr-xr-x  2 user user 4096 Jan  1 00:00 some/long/path/to/a/directory\n"
+    blob = line * (megabytes * 1024 * 1024 // len(line))
+    payload = small()
+    payload["input"] = [_user("list everything"), _tool_output("call_big", blob), _user("summarise that")]
+    return payload
+
+
+PAYLOADS = {"small": small, "history": history, "large": large_tool_output}
+
+
+def encoded(name):
+    return json.dumps(PAYLOADS[name]())
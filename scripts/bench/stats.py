@@ -0,0 +1,98 @@
+"""Percentile summaries and baseline comparison.
+
+Timings only compare on the machine that recorded them, so a baseline also
+stores ``calibration_ms``, the p50 of a fixed pure-Python workload on that
+machine.  ``compare`` scales the baseline by how much slower or faster the
+same workload runs now, which absorbs most of the CPU difference between
+machines.  Stages dominated by process start-up or I/O do not scale the
+same way; regenerate the baseline (``--save-baseline``) on each machine
+that gates on it.
+"""
+import json
+import math
+import platform
+import time
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    if not ordered:
+        return float("nan")
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(values):
+    return {
+        "n": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+    }
+
+
+def _calibration_workload():
+    data = [{"id": i, "text": "x" * (i % 32), "tags": ["a", "b"]} for i in range(200)]
+    for _ in range(5):
+        json.loads(json.dumps(data))
+        sorted(str(i * 7919 % 1009) for i in range(2000))
+
+
+def calibrate(iterations=30):
+    """p50 milliseconds of a fixed workload, the unit baselines are scaled by."""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        _calibration_workload()
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentile(samples, 50)
+
+
+def host():
+    return f"{platform.node()} {platform.machine()} {platform.python_implementation()} {platform.python_version()}"
+
+
+def load_baseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, results, calibration_ms):
+    baseline = {"calibration_ms": calibration_ms, "host": host(), "results": results}
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def baseline_scale(baseline, calibration_ms):
+    """Factor that maps ``baseline`` timings onto this machine."""
+    recorded = baseline.get("calibration_ms")
+    if not recorded:
+        # Baselines from before calibration are compared as recorded.
+        return 1.0
+    return calibration_ms / recorded
+
+
+def compare(results, baseline, threshold=0.2, floor_ms=0.05, scale=1.0):
+    """Return ``(size, stage, base_p50, new_p50)`` for every p50 that regressed.
+
+    Baseline p50s are multiplied by ``scale`` (see ``baseline_scale``) first.
+    A stage regresses when its p50 grows by more than ``threshold`` relative
+    to the baseline and by more than ``floor_ms`` in absolute terms, so
+    sub-microsecond noise is not reported.
+    """
+    recorded = baseline.get("results", baseline)
+    regressions = []
+    for size, stages in results.items():
+        for stage, summary in stages.items():
+            base = (recorded.get(size) or {}).get(stage)
+            if not base:
+                continue
+            old, new = base["p50"] * scale, summary["p50"]
+            if new > old * (1 + threshold) and new - old > floor_ms:
+                regressions.append((size, stage, old, new))
+    return regressions
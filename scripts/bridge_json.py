@@ -0,0 +1,149 @@
+"""JSON codec for the bridge's stdin parsing and event emission.
+
+The fastest available backend is picked once at import: ``orjson``, then
+``msgspec``, then the stdlib ``json`` module.  ``CODEX_BRIDGE_JSON`` can
+force one (``orjson``, ``msgspec`` or ``json``).  All backends produce
+compact UTF-8 output; strings with lone surrogates, which UTF-8 cannot
+represent, are written with ``\\uXXXX`` escapes instead.
+
+With the stdlib backend, ``encode_event`` builds the most frequent events
+from pre-encoded byte templates: the ``response.created`` /
+``response.in_progress`` envelopes and the text/argument delta wrappers,
+where only the ids and the delta string need encoding.
+"""
+import json
+import os
+from json.encoder import encode_basestring as _encode_basestring
+from json.encoder import encode_basestring_ascii as _encode_basestring_ascii
+
+BACKEND = "json"
+
+_stdlib_encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, default=str)
+_ascii_encoder = json.JSONEncoder(separators=(",", ":"), default=str)
+
+
+def _stdlib_dumpb(obj):
+    try:
+        return _stdlib_encoder.encode(obj).encode("utf-8")
+    except UnicodeEncodeError:
+        # A lone surrogate (e.g. from a split emoji) has no UTF-8 form;
+        # escaped as \uXXXX it is still valid JSON.
+        return _ascii_encoder.encode(obj).encode("ascii")
+
+
+_dumpb = _stdlib_dumpb
+_loads = json.loads
+
+
+def _select(preferred):
+    global BACKEND, _dumpb, _loads
+    candidates = [preferred] if preferred and preferred != "auto" else ["orjson", "msgspec", "json"]
+    for name in candidates:
+        if name == "orjson":
+            try:
+                import orjson
+            except ImportError:
+                continue
+
+            def orjson_dumpb(obj, _dumps=orjson.dumps):
+                try:
+                    return _dumps(obj, default=str)
+                except TypeError:
+                    # e.g. non-string keys or integers beyond 64 bits
+                    return _stdlib_dumpb(obj)
+
+            BACKEND, _dumpb, _loads = "orjson", orjson_dumpb, orjson.loads
+            return
+        if name == "msgspec":
+            try:
+                import msgspec
+            except ImportError:
+                continue
+            encoder = msgspec.json.Encoder(enc_hook=str)
+
+            def msgspec_dumpb(obj, _encode=encoder.encode):
+                try:
+                    return _encode(obj)
+                except (TypeError, UnicodeEncodeError, msgspec.EncodeError):
+                    return _stdlib_dumpb(obj)
+
+            BACKEND, _dumpb, _loads = "msgspec", msgspec_dumpb, msgspec.json.decode
+            return
+        if name == "json":
+            BACKEND, _dumpb, _loads = "json", _stdlib_dumpb, json.loads
+            return
+    BACKEND, _dumpb, _loads = "json", _stdlib_dumpb, json.loads
+
+
+def loads(data):
+    """Parse JSON from ``str`` or ``bytes``."""
+    return _loads(data)
+
+
+def dumpb(obj) -> bytes:
+    """Serialise ``obj`` to compact UTF-8 JSON bytes."""
+    return _dumpb(obj)
+
+
+def dumps(obj) -> str:
+    return _dumpb(obj).decode("utf-8")
+
+
+_DELTA_KEYS = ("type", "item_id", "output_index", "content_index", "delta")
+_ENVELOPE_KEYS = {"id", "status"}
+_DELTA_PREFIX = {
+    etype: b'{"type":"' + etype.encode() + b'","item_id":'
+    for etype in ("response.output_text.delta", "response.function_call_arguments.delta")
+}
+_ENVELOPE_PREFIX = {
+    etype: b'{"type":"' + etype.encode() + b'","response":{"id":'
+    for etype in ("response.created", "response.in_progress")
+}
+
+
+def encode_event(evt) -> bytes:
+    """Serialise one bridge event.
+
+    orjson and msgspec encode a whole event faster than templates can be
+    stitched together, so templates are only used with the stdlib backend.
+    """
+    if BACKEND != "json":
+        return _dumpb(evt)
+    return _encode_event_template(evt)
+
+
+def _encode_str(value) -> bytes:
+    try:
+        return _encode_basestring(value).encode("utf-8")
+    except UnicodeEncodeError:
+        return _encode_basestring_ascii(value).encode("ascii")
+
+
+def _encode_event_template(evt) -> bytes:
+    etype = evt.get("type")
+    prefix = _DELTA_PREFIX.get(etype)
+    if prefix is not None and tuple(evt) == _DELTA_KEYS:
+        output_index, content_index = evt["output_index"], evt["content_index"]
+        if type(output_index) is int and type(content_index) is int:
+            item_id, delta = evt["item_id"], evt["delta"]
+            if type(item_id) is str and type(delta) is str:
+                return b"".join(
+                    (
+                        prefix,
+                        _encode_str(item_id),
+                        b',"output_index":%d,"content_index":%d,"delta":' % (output_index, content_index),
+                        _encode_str(delta),
+                        b"}",
+                    )
+                )
+    prefix = _ENVELOPE_PREFIX.get(etype)
+    if prefix is not None and len(evt) == 2:
+        response = evt.get("response")
+        if isinstance(response, dict) and response.keys() == _ENVELOPE_KEYS:
+            resp_id, status = response["id"], response["status"]
+            if type(resp_id) is str and type(status) is str:
+                return b"".join((prefix, _encode_str(resp_id), b',"status":', _encode_str(status), b"}}"))
+    return _dumpb(evt)
+
+
+_select(os.environ.get("CODEX_BRIDGE_JSON", "auto").lower())
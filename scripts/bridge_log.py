@@ -0,0 +1,168 @@
+"""Shared, buffered logging for the python bridge scripts.
+
+``log()`` used to open ``log.out``, append one line and close it on every
+call.  Here callers only push the formatted line onto a queue; a background
+thread drains whatever has accumulated into a single ``write`` and rotates
+the file once it grows past a size limit.  Messages below the configured
+level return before doing any work, and per-chunk logging is sampled.
+
+Configuration comes from the environment:
+
+``CODEX_BRIDGE_LOG``            log file path (default ``log.out``)
+``CODEX_BRIDGE_LOG_LEVEL``      DEBUG, INFO, WARNING, ERROR or OFF (default INFO)
+``CODEX_BRIDGE_LOG_SAMPLE``     log one streamed chunk in N at DEBUG (default 1)
+``CODEX_BRIDGE_LOG_MAX_BYTES``  rotate after this many bytes (default 10 MiB)
+``CODEX_BRIDGE_LOG_BACKUPS``    rotated files to keep (default 3)
+
+The file is appended to, never truncated, so concurrent bridges sharing it
+no longer wipe each other's output.
+"""
+import atexit
+import contextvars
+import os
+import queue
+import threading
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR, "OFF": OFF}
+
+request_id = contextvars.ContextVar("bridge_request_id", default=None)
+
+
+class _Writer(threading.Thread):
+    def __init__(self, path, max_bytes, backups):
+        super().__init__(name="bridge-log-writer", daemon=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue = queue.SimpleQueue()
+        self._fd = None
+
+    def run(self):
+        stop = False
+        while not stop:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stop = True
+                batch = [line for line in batch if line is not None]
+            if batch:
+                self._write("".join(batch).encode("utf-8", "replace"))
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _open(self):
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _write(self, data):
+        try:
+            if self._fd is None:
+                self._open()
+            os.write(self._fd, data)
+            if self.max_bytes and os.fstat(self._fd).st_size >= self.max_bytes:
+                self._rotate()
+        except OSError:
+            pass
+
+    def _rotate(self):
+        try:
+            same_file = os.stat(self.path).st_ino == os.fstat(self._fd).st_ino
+        except OSError:
+            same_file = False
+        os.close(self._fd)
+        self._fd = None
+        if not same_file:
+            # Another bridge sharing the file already rotated it.
+            return
+        if self.backups <= 0:
+            os.truncate(self.path, 0)
+            return
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+_lock = threading.Lock()
+_writer = None
+_level = INFO
+_sample = 1
+_chunk_count = 0
+_config = {}
+
+
+def configure(path=None, level=None, sample=None, max_bytes=None, backups=None):
+    """(Re)configure logging; unspecified settings come from the environment."""
+    global _level, _sample, _chunk_count, _config
+    shutdown()
+    env = os.environ
+    _config = {
+        "path": path or env.get("CODEX_BRIDGE_LOG", "log.out"),
+        "max_bytes": int(max_bytes if max_bytes is not None else env.get("CODEX_BRIDGE_LOG_MAX_BYTES", 10 * 1024 * 1024)),
+        "backups": int(backups if backups is not None else env.get("CODEX_BRIDGE_LOG_BACKUPS", 3)),
+    }
+    if level is None:
+        level = env.get("CODEX_BRIDGE_LOG_LEVEL", "INFO")
+    _level = LEVELS.get(level.upper(), INFO) if isinstance(level, str) else level
+    _sample = max(1, int(sample if sample is not None else env.get("CODEX_BRIDGE_LOG_SAMPLE", 1)))
+    _chunk_count = 0
+
+
+def enabled(level=INFO) -> bool:
+    return level >= _level
+
+
+def _get_writer():
+    global _writer
+    with _lock:
+        if _writer is None:
+            _writer = _Writer(**_config)
+            _writer.start()
+        return _writer
+
+
+def log(msg: str, level=INFO) -> None:
+    if level < _level:
+        return
+    rid = request_id.get()
+    prefix = f"{time.strftime('%H:%M:%S')} [{os.getpid()}]"
+    if rid:
+        prefix += f" [{rid}]"
+    (_writer or _get_writer()).queue.put(f"{prefix} {msg}\n")
+
+
+def log_chunk(chunk) -> None:
+    """Log a streamed upstream chunk at DEBUG, keeping one in every N."""
+    global _chunk_count
+    if DEBUG < _level:
+        return
+    _chunk_count += 1
+    if (_chunk_count - 1) % _sample:
+        return
+    log(f"[→] Chunk: {chunk!r}", DEBUG)
+
+
+def shutdown() -> None:
+    """Flush queued lines and stop the writer thread."""
+    global _writer
+    with _lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.queue.put(None)
+        writer.join(timeout=5)
+
+
+configure()
+atexit.register(shutdown)
@@ -0,0 +1,70 @@
+"""Process-wide counters, gauges and timing samples for the bridge.
+
+Metric names are dotted strings (``hedge.fired``, ``ttft_ms.openai``).
+Timings keep a bounded window of recent samples, so percentiles follow
+the current traffic.  A bridge server exposes ``snapshot()`` on
+``GET /metrics``; a one-shot stdin bridge logs it at DEBUG on exit.
+"""
+import math
+from collections import defaultdict, deque
+
+WINDOW = 1024
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values``, or None when empty."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Metrics:
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.counters = defaultdict(int)
+        self.gauges = {}
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+
+    def incr(self, name, value=1):
+        self.counters[name] += value
+
+    def set(self, name, value):
+        self.gauges[name] = value
+
+    def observe(self, name, value):
+        self._samples[name].append(value)
+
+    def count(self, name):
+        """Number of samples currently held for timing ``name``."""
+        return len(self._samples.get(name, ()))
+
+    def percentile(self, name, pct):
+        return percentile(self._samples.get(name, ()), pct)
+
+    def snapshot(self):
+        timings = {}
+        for name, samples in self._samples.items():
+            if samples:
+                timings[name] = {
+                    "n": len(samples),
+                    "p50": percentile(samples, 50),
+                    "p90": percentile(samples, 90),
+                    "p99": percentile(samples, 99),
+                    "max": max(samples),
+                }
+        return {"counters": dict(self.counters), "gauges": dict(self.gauges), "timings": timings}
+
+    def reset(self):
+        self.counters.clear()
+        self.gauges.clear()
+        self._samples.clear()
+
+
+METRICS = Metrics()
+
+incr = METRICS.incr
+set_gauge = METRICS.set
+observe = METRICS.observe
+snapshot = METRICS.snapshot
@@ -0,0 +1,262 @@
+"""Long-lived bridge server for ``call_gpt.py --serve``.
+
+Instead of paying for interpreter startup, imports and a cold TLS
+connection on every turn, one asyncio process accepts ``POST /v1/responses``
+over localhost TCP or a Unix socket and streams the bridge events back as
+server-sent events.  Every connection is handled by its own task, so many
+codex sessions can share the process; each stream is tagged with a request
+id (``X-Request-Id`` header or ``request_id`` in the body, generated when
+absent or not made of ``[A-Za-z0-9._:-]``) in the response headers and in
+the ``id:`` field of every event.  An id that is already streaming is
+rejected with 409.
+``GET /healthz`` lists active sessions and ``GET /metrics`` returns the
+bridge_metrics snapshot as JSON.
+"""
+import asyncio
+import itertools
+import os
+import re
+import uuid
+
+import bridge_json
+import bridge_log
+import bridge_metrics
+from bridge_log import ERROR, WARNING, log
+from event_coalescer import CoalescingEmitter
+from event_pipeline import buffered
+from response_events import ResponseTranslator
+
+MAX_HEADER_BYTES = 64 * 1024
+# Request ids are echoed into headers and SSE ``id:`` lines, so they must
+# not carry line breaks or anything else that could change the framing.
+REQUEST_ID_RE = re.compile(r"[A-Za-z0-9._:-]{1,128}")
+
+
+class BadRequest(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+async def read_http_request(reader):
+    """Read one HTTP/1.1 request and return ``(method, path, headers, body)``.
+
+    Raises ``IncompleteReadError`` if the client closed without sending
+    anything and ``BadRequest`` for anything malformed.
+    """
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.LimitOverrunError:
+        # The stream limit is MAX_HEADER_BYTES (see BridgeServer.start).
+        raise BadRequest(431, "Request header too large")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            raise
+        raise BadRequest(400, "Incomplete request header")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, path, _version = lines[0].split(" ", 2)
+    except ValueError:
+        raise BadRequest(400, "Malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = headers.get("content-length") or "0"
+    if not (length.isascii() and length.isdigit()):
+        raise BadRequest(400, "Invalid Content-Length")
+    try:
+        body = await reader.readexactly(int(length))
+    except asyncio.IncompleteReadError:
+        raise BadRequest(400, "Incomplete request body")
+    return method.upper(), path, headers, body
+
+
+def format_sse(request_id, seq, evt):
+    """Encode one bridge event as a server-sent event frame."""
+    etype = evt.get("type") or evt.get("object") or "message"
+    return f"id: {request_id}:{seq}\nevent: {etype}\ndata: ".encode() + bridge_json.encode_event(evt) + b"\n\n"
+
+
+class BridgeServer:
+    """Serve ``handler(request)`` event streams to concurrent clients.
+
+    ``handler`` is an async generator function that takes the parsed request
+    payload and yields JSON-serialisable events, e.g. ``call_gpt.stream_response``.
+    Deltas are coalesced per stream (see ``event_coalescer``); ``coalesce_ms``
+    overrides ``CODEX_BRIDGE_COALESCE_MS``.  ``fmt`` is the handler's output
+    format, which decides how a handler error is reported once the stream
+    has started: ``response.failed`` for ``"responses"``, an ``error``
+    object for ``"chat"``.  A handler that fails before its first event
+    gets its ``BadRequest`` status or a 500 instead.
+    """
+
+    def __init__(self, handler, host="127.0.0.1", port=8765, socket_path=None, coalesce_ms=None, fmt="chat"):
+        self.handler = handler
+        self.fmt = fmt
+        self.coalesce_ms = coalesce_ms
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.active = {}
+        self._server = None
+
+    async def start(self):
+        if self.socket_path:
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self._server = await asyncio.start_unix_server(self._handle, path=self.socket_path, limit=MAX_HEADER_BYTES)
+            log(f"[✓] Bridge server listening on unix:{self.socket_path}")
+        else:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_HEADER_BYTES)
+            self.port = self._server.sockets[0].getsockname()[1]
+            log(f"[✓] Bridge server listening on http://{self.host}:{self.port}")
+        return self._server
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            if self.socket_path and os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            try:
+                method, path, headers, body = await read_http_request(reader)
+            except asyncio.IncompleteReadError:
+                return
+            except BadRequest as e:
+                await self._send_error(writer, e.status, str(e))
+                return
+
+            if method == "GET" and path == "/healthz":
+                await self._send_json(writer, 200, {"status": "ok", "active": sorted(self.active)})
+                return
+            if method == "GET" and path == "/metrics":
+                await self._send_json(writer, 200, bridge_metrics.snapshot())
+                return
+            if method != "POST" or path.split("?", 1)[0] != "/v1/responses":
+                await self._send_error(writer, 404, f"No route for {method} {path}")
+                return
+
+            try:
+                request = bridge_json.loads(body)
+            except Exception as e:
+                log(f"[ERROR] JSON parsing failed: {e}", ERROR)
+                await self._send_error(writer, 400, "Expected request JSON body")
+                return
+            if not isinstance(request, dict):
+                await self._send_error(writer, 400, "Expected a JSON object")
+                return
+
+            request_id = headers.get("x-request-id") or request.get("request_id")
+            if not (isinstance(request_id, str) and REQUEST_ID_RE.fullmatch(request_id)):
+                if request_id:
+                    log(f"[WARN] Ignoring invalid request id {request_id!r}", WARNING)
+                request_id = f"req_{uuid.uuid4().hex[:8]}"
+            elif request_id in self.active:
+                await self._send_error(writer, 409, f"Request {request_id} is already streaming")
+                return
+            await self._stream(writer, request_id, request)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _stream(self, writer, request_id, request):
+        self.active[request_id] = asyncio.current_task()
+        bridge_log.request_id.set(request_id)
+        log(f"Session started ({len(self.active)} active)")
+        # Read ahead of a slow client so it does not hold up the upstream.
+        events = buffered(self.handler(request), "sse")
+        seq = itertools.count()
+        # The status line waits for the first event, so a request that fails
+        # before producing anything still gets an HTTP error status.
+        started = False
+        resp_id = None
+
+        def open_stream():
+            nonlocal started
+            if not started:
+                started = True
+                writer.write(
+                    (
+                        "HTTP/1.1 200 OK\r\n"
+                        "Content-Type: text/event-stream\r\n"
+                        "Cache-Control: no-cache\r\n"
+                        "Connection: close\r\n"
+                        f"X-Request-Id: {request_id}\r\n"
+                        "\r\n"
+                    ).encode()
+                )
+
+        def write(evt):
+            open_stream()
+            writer.write(format_sse(request_id, next(seq), evt))
+
+        emitter = CoalescingEmitter.from_env(write)
+        if self.coalesce_ms is not None:
+            emitter.window = self.coalesce_ms / 1000
+        try:
+            async for evt in events:
+                if resp_id is None and evt.get("type") == "response.created":
+                    resp_id = evt["response"]["id"]
+                emitter.emit(evt)
+                await writer.drain()
+            emitter.flush()
+            open_stream()
+            await writer.drain()
+        except (ConnectionError, BrokenPipeError):
+            log(f"Client disconnected after {emitter.written} events")
+        except Exception as e:
+            log(f"[ERROR] Request {request_id} failed: {e!r}", ERROR)
+            emitter.flush()
+            try:
+                if not started:
+                    status = e.status if isinstance(e, BadRequest) else 500
+                    await self._send_error(writer, status, str(e) if status < 500 else f"Bridge error: {e}")
+                elif self.fmt == "responses":
+                    for evt in ResponseTranslator(resp_id=resp_id).failed("server_error", str(e)):
+                        write(evt)
+                    await writer.drain()
+                else:
+                    write({"error": {"code": "server_error", "message": str(e)}})
+                    await writer.drain()
+            except (ConnectionError, BrokenPipeError):
+                pass
+        finally:
+            emitter.close()
+            await events.aclose()
+            self.active.pop(request_id, None)
+            log(f"Session finished ({emitter.written} events, {emitter.merged} deltas merged)")
+
+    async def _send_json(self, writer, status, payload):
+        body = bridge_json.dumpb(payload)
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 409: "Conflict", 431: "Request Header Fields Too Large", 500: "Internal Server Error"}.get(status, "Error")
+        writer.write(
+            (
+                f"HTTP/1.1 {status} {reason}\r\n"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n"
+                "\r\n"
+            ).encode()
+            + body
+        )
+        await writer.drain()
+
+    async def _send_error(self, writer, status, message):
+        await self._send_json(writer, status, {"error": {"message": message}})
@@ -1,15 +1,33 @@
 #!/usr/bin/env python3
+import argparse
+import contextlib
+import functools
 import json
 import os
 import sys
+import time
 import asyncio
-import uuid
-from invoke_llm import InvokeGPT
-
-# Reset logs
-open("log.out", "w").close()
+import bridge_json
+import bridge_metrics
+from bridge_log import DEBUG, ERROR, WARNING, enabled as log_enabled, log, log_chunk
+from cancellation import Deadline, bounded, cancel_on_signals
+from chunk_trace import TraceWriter
+from context_budget import estimate_tokens, fit_to_context
+from conversation_store import ConversationStore
+from event_coalescer import CoalescingEmitter
+from event_pipeline import PipeWriter, buffered
+from hedging import HedgedStream, HedgePolicy, hedged_response
+from invoke_llm import DEFAULT_MODEL, BackendRouter, InvokeReplay, aclose_shared_clients, chat_chunk
+from rate_limiter import retry_after
+from response_cache import ResponseCache
+from response_events import ResponseTranslator
+from stall_watchdog import StallPolicy, StallWatchdog, StreamStalled
+from usage_ledger import UsageLedger, session_id
 
 def convert_input_messages(raw_input):
+    if isinstance(raw_input, str):
+        # The Responses API accepts a bare string as a single user message.
+        return [{"role": "user", "content": raw_input}]
     messages = []
     for item in raw_input:
         if item.get("type") == "message":
@@ -32,162 +50,443 @@ def convert_input_messages(raw_input):
     return messages
 
 
-def build_messages(request):
-    """Return a message list from the request payload."""
+def build_messages(request, store=None):
+    """Return a message list from the request payload.
+
+    With a ``ConversationStore`` and a known ``previous_response_id``, only
+    the new ``input`` items are converted and appended to the stored history.
+    """
     if "messages" in request:
         return request["messages"]
 
     instructions = request.get("instructions", "")
     messages = convert_input_messages(request.get("input", []))
+
+    previous_id = request.get("previous_response_id")
+    history = store.get(previous_id) if store is not None and previous_id else None
+    if history is not None:
+        if instructions and history and history[0].get("role") == "system":
+            history = history[1:]
+        messages = list(history) + messages
+    elif previous_id and store is not None:
+        log(f"[WARN] No stored conversation for {previous_id}; using the request input only", WARNING)
+
     if instructions:
         messages.insert(0, {"role": "system", "content": instructions})
     return messages
 
 
-def log(msg: str) -> None:
-    with open("log.out", "a") as f:
-        f.write(msg + "\n")
+# Completion tokens counted against a tokens/min limit when max_tokens is unset.
+OUTPUT_TOKEN_ALLOWANCE = 1024
+
+
+def create_llm(router, provider, model):
+    """Return the backend for this request: a recorded trace or the routed provider."""
+    replay = os.environ.get("CODEX_BRIDGE_REPLAY")
+    if replay:
+        return InvokeReplay(replay, speed=float(os.environ.get("CODEX_BRIDGE_REPLAY_SPEED", "1")), model=model)
+    return router.backend(provider)
+
+
+async def open_stream(llm, router, provider, model, messages, call, limiter, estimate):
+    """Open the upstream stream, queueing on ``limiter`` and retrying 429s.
+
+    On success the caller owns the limiter slot and must release it.
+    """
+    hedge = None if os.environ.get("CODEX_BRIDGE_REPLAY") else HedgePolicy.from_env(router.hedge)
+    retries = 0
+    while True:
+        if limiter is not None:
+            await limiter.acquire(estimate)
+        try:
+            if hedge is not None:
+                return await hedged_response(hedge, router, provider, llm, model, messages, call, estimate)
+            return await llm.get_response(messages, model=model, **call)
+        except Exception as e:
+            if limiter is None:
+                raise
+            backoff = retry_after(e)
+            await limiter.release(ok=False, backoff=backoff)
+            if backoff is None or retries >= limiter.max_retries:
+                raise
+            retries += 1
+        except BaseException:
+            if limiter is not None:
+                await limiter.release(ok=False)
+            raise
+
+
+def response_timings(requested, first_at, usage):
+    """TTFT, total duration and output tokens/sec of one upstream call."""
+    now = time.monotonic()
+    timings = {
+        "ttft_ms": round((first_at - requested) * 1000, 1) if first_at is not None else None,
+        "duration_ms": round((now - requested) * 1000, 1),
+        "output_tokens_per_sec": None,
+    }
+    completion = (usage or {}).get("completion_tokens")
+    if completion and first_at is not None and now > first_at:
+        timings["output_tokens_per_sec"] = round(completion / (now - first_at), 1)
+    return timings
+
+
+def record_usage(provider, usage):
+    if not usage:
+        return
+    bridge_metrics.incr(f"tokens.prompt.{provider}", usage.get("prompt_tokens") or 0)
+    bridge_metrics.incr(f"tokens.completion.{provider}", usage.get("completion_tokens") or 0)
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    if cached:
+        bridge_metrics.incr(f"tokens.cached.{provider}", cached)
+
+
+async def upstream_events(request, messages, model, fmt, translator, router, provider, deadline=None, served=None):
+    """Call the model and yield bridge events as its chunks arrive.
+
+    When a hedge on another provider or model answers, usage and stall
+    retries go to it and ``served`` (a dict) is updated with its
+    ``provider`` and ``model``.  A stream that stalls part-way is retried
+    (see stall_watchdog).  Past
+    ``deadline``, or once stall retries run out, the upstream stream is
+    aborted and the response ends as ``response.incomplete`` (a
+    ``finish_reason="length"`` chunk in chat format).
+    """
+    deadline = deadline or Deadline()
+    wrapped_tools = request.get("tools")
+    tool_choice = request.get("tool_choice", "auto")
+
+    capture_dir = os.environ.get("CODEX_BRIDGE_CAPTURE")
+    trace = TraceWriter.in_directory(capture_dir, model=model) if capture_dir else None
 
-def gen_id(prefix: str) -> str:
-    return f"{prefix}_{uuid.uuid4().hex[:8]}"
+    stream = None
+    limiter = None
+    ok = False
+    incomplete = None
+    first_at = held = error = None
+    opened = False
+    try:
+        llm = create_llm(router, provider, model)
+        call = {"tools": wrapped_tools, "stream": True, "tool_choice": tool_choice}
+        limiter = None if os.environ.get("CODEX_BRIDGE_REPLAY") else router.limiter(provider)
+        estimate = estimate_tokens(messages) + (request.get("max_tokens") or OUTPUT_TOKEN_ALLOWANCE)
+        started = requested = time.monotonic()
+        async with asyncio.timeout_at(deadline.at):
+            stream = await open_stream(llm, router, provider, model, messages, call, limiter, estimate)
+        if isinstance(stream, HedgedStream):
+            # Hedging waited for a first chunk and recorded its TTFT itself.
+            started = None
+            if (stream.provider, stream.model) != (provider, model):
+                if stream.provider != provider and limiter is not None:
+                    # The primary's request was cancelled; the hedge was charged to its own limiter.
+                    await limiter.release(ok=False)
+                    limiter = None
+                llm, provider, model = stream.backend, stream.provider, stream.model
+                log(f"[✓] Hedge on {provider} as {model} answered first")
+                if served is not None:
+                    served.update(provider=provider, model=model)
+        stall = None if os.environ.get("CODEX_BRIDGE_REPLAY") else StallPolicy.from_env(router.stall)
+        if stall is not None:
+
+            async def reopen(retry_messages):
+                # A new upstream request under the slot the stalled one held.
+                charged = router.limiter(provider)
+                if charged is not None:
+                    await charged.charge(estimate)
+                return await llm.get_response(retry_messages, model=model, **call)
+
+            stream = StallWatchdog(stream, reopen, stall, messages, provider)
+
+        log("[✓] Started response stream")
+
+        opened = True
+        for evt in translator.start():
+            yield evt
+        chunks = stream if deadline.at is None else bounded(stream, deadline)
+        async for chunk in chunks:
+            if hasattr(chunk, "to_dict"):
+                chunk = chunk.to_dict()
+            if first_at is None:
+                first_at = time.monotonic()
+            if started is not None:
+                bridge_metrics.observe(f"ttft_ms.{provider}", (first_at - started) * 1000)
+                started = None
+
+            log_chunk(chunk)
+            if trace is not None:
+                trace.write(chunk)
+
+            # The translator always tracks the response so callers can see
+            # whether it finished, even when raw chunks are passed through.
+            events = translator.feed(chunk)
+            if fmt == "responses":
+                for evt in events:
+                    yield evt
+                continue
+            # The CLI ends the response at the finish_reason chunk and skips
+            # chunks without choices, so the finishing chunk is held back
+            # until the usage-only chunk that follows it has been folded in.
+            if held is not None:
+                if not chunk.get("choices"):
+                    continue
+                yield held
+                held = None
+            if any(c.get("finish_reason") for c in chunk.get("choices") or ()):
+                held = chunk
+            else:
+                yield chunk
+
+        translator.timings = response_timings(requested, first_at, translator.usage)
+        record_usage(provider, translator.usage)
+        if fmt == "responses":
+            for evt in translator.finish():
+                yield evt
+        elif held is not None:
+            yield {**held, "usage": translator.usage or held.get("usage"), "timings": translator.timings}
+        ok = True
+
+    except TimeoutError:
+        incomplete = "deadline_exceeded"
+        log("[WARN] Request deadline passed; aborting the upstream stream", WARNING)
+    except StreamStalled as e:
+        incomplete = "upstream_stalled"
+        log(f"[ERROR] Upstream stream stalled: {e}", ERROR)
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        log(f"[ERROR] During LLM call or output formatting: {error}", ERROR)
+    finally:
+        # Closing the stream aborts the upstream HTTP response if the
+        # consumer stopped early (e.g. a bridge client disconnected).
+        if stream is not None:
+            await stream.close()
+            if limiter is not None:
+                await limiter.release(ok=ok)
+        if trace is not None:
+            trace.close()
+            log(f"[✓] Captured {trace.count} chunks to {trace.path}")
+
+    if held is not None and not ok:
+        # The response had finished; only its usage was lost.
+        yield held
+        return
+    if fmt == "responses" and not ok and not opened:
+        # Failed before the stream opened: the client still gets a response.
+        for evt in translator.start():
+            yield evt
+    # Emitted after the upstream is closed so no more tokens are paid for.
+    if incomplete is not None:
+        if fmt == "responses":
+            for evt in translator.incomplete(incomplete):
+                yield evt
+        else:
+            yield chat_chunk(translator.resp_id, translator.model or model, {}, "length")
+    elif error is not None:
+        if fmt == "responses":
+            for evt in translator.failed("upstream_error", error):
+                yield evt
+        else:
+            # The error object OpenAI puts in a stream that fails part-way.
+            yield {"error": {"code": "upstream_error", "message": error}}
+
+
+async def stream_response(request, fmt="chat", cache=None, store=None, router=None, ledger=None):
+    """Yield the bridge's output events for one parsed request.
+
+    ``fmt="chat"`` passes chat.completion chunks through (what
+    ``callCustomLLM`` parses today); ``fmt="responses"`` translates them into
+    Responses API events as each chunk arrives.  With a ``ResponseCache``,
+    identical requests replay the recorded stream instead of calling the model.
+    With a ``ConversationStore``, the finished conversation is remembered
+    under the response id so the next turn can send only its new input.
+    Histories over the model's context window are trimmed oldest-turn first
+    before they are sent; the store keeps the untrimmed conversation.
+    The request's ``model`` picks the backend through ``router``
+    (``BackendRouter.from_env()`` when not given).  ``timeout_ms`` in the
+    request (or ``CODEX_BRIDGE_TIMEOUT_MS``) bounds the whole upstream call.
+    With a ``UsageLedger``, the response's token usage and timings are added
+    to its session's and model's running totals.
+    """
+    deadline = Deadline.from_request(request)
+    messages = build_messages(request, store)
+    log("[✓] Built message list")
+    if log_enabled(DEBUG):
+        log(f"Messages: {json.dumps(messages, indent=4)}", DEBUG)
+
+    router = router or BackendRouter.from_env()
+    requested = request.get("model") or os.environ.get("CODEX_BRIDGE_MODEL", DEFAULT_MODEL)
+    provider, model = router.route(requested)
+    log(f"[✓] Routing {requested} to {provider} as {model}")
+    sent, _report = fit_to_context(messages, model, request.get("tools"))
+
+    key = None
+    if cache is not None:
+        key = cache.key(request, sent, f"{provider}/{model}", fmt)
+        if not cache.bypassed(request):
+            entries = await cache.get(key)
+            if entries is not None:
+                log(f"[✓] Cache hit {key[:12]}, replaying {len(entries)} events")
+                async for evt in cache.replay(entries):
+                    yield evt
+                if ledger is not None:
+                    await ledger.record(session_id(request), f"{provider}/{model}", None, cache_hit=True)
+                return
+
+    translator = ResponseTranslator(model=model)
+    recorded = []
+    start = time.monotonic()
+    served = {"provider": provider, "model": model}
+    async for evt in upstream_events(request, sent, model, fmt, translator, router, provider, deadline, served):
+        if key is not None:
+            recorded.append((time.monotonic() - start, evt))
+        yield evt
+
+    if ledger is not None and translator.usage:
+        await ledger.record(session_id(request), f"{served['provider']}/{served['model']}", translator.usage, translator.timings)
+
+    if key is not None and translator.finish_reason:
+        await cache.put(key, recorded)
+        log(f"[✓] Cached {len(recorded)} events as {key[:12]}")
+
+    if store is not None and translator.finish_reason:
+        store.put(translator.resp_id, messages + [translator.assistant_message()])
+
+
+def emit(evt, out=None):
+    """Write one event as a JSON line on stdout (what callCustomLLM reads)."""
+    out = out or sys.stdout.buffer
+    out.write(bridge_json.encode_event(evt) + b"\n")
+    out.flush()
+    if log_enabled(DEBUG):
+        log(f"[→] {evt.get('type')}", DEBUG)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bridge a codex request to the chat completions API.")
+    parser.add_argument(
+        "--format",
+        choices=("chat", "responses"),
+        default=os.environ.get("CODEX_BRIDGE_FORMAT", "chat"),
+        help="Emit raw chat.completion chunks or translated Responses API events.",
+    )
+    parser.add_argument("--cache", action="store_true", help="Enable the on-disk response cache (same as CODEX_BRIDGE_CACHE=1).")
+    parser.add_argument("--capture", metavar="DIR", help="Record every upstream chunk stream as a trace file in DIR.")
+    parser.add_argument("--replay", metavar="TRACE", help="Serve a recorded chunk trace instead of calling the model.")
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        help="Replay speed multiplier for --replay; 0 plays back as fast as possible (default 1).",
+    )
+    parser.add_argument("--serve", action="store_true", help="Run as a long-lived bridge server instead of handling one request from stdin.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on in --serve mode.")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port to listen on in --serve mode.")
+    parser.add_argument("--socket", help="Listen on this Unix socket path instead of TCP in --serve mode.")
+    return parser.parse_args(argv)
 
-async def main():
-    open("log.out", "w").close()
 
-    if not os.environ.get("OPENAI_API_KEY"):
-        log("[ERROR] OPENAI_API_KEY not set")
+async def main():
+    args = parse_args()
+    if args.cache:
+        os.environ["CODEX_BRIDGE_CACHE"] = "1"
+    if args.capture:
+        os.environ["CODEX_BRIDGE_CAPTURE"] = args.capture
+    if args.replay:
+        os.environ["CODEX_BRIDGE_REPLAY"] = args.replay
+    if args.replay_speed is not None:
+        os.environ["CODEX_BRIDGE_REPLAY_SPEED"] = str(args.replay_speed)
+    cache = ResponseCache.from_env()
+    store = ConversationStore.from_env(persistent=args.serve)
+    router = BackendRouter.from_env()
+    ledger = UsageLedger.from_env()
+
+    if args.serve:
+        from bridge_server import BridgeServer
+
+        handler = functools.partial(stream_response, fmt=args.format, cache=cache, store=store, router=router, ledger=ledger)
+        server = BridgeServer(handler, host=args.host, port=args.port, socket_path=args.socket, fmt=args.format)
+        # Load local models while the server starts rather than on the first turn.
+        preload = asyncio.create_task(router.preload())
+        try:
+            await server.serve_forever()
+        finally:
+            preload.cancel()
+            await aclose_shared_clients()
         return
 
-    data_str = sys.stdin.read()
+    data_str = sys.stdin.buffer.read()
     if not data_str:
         sys.stderr.write("Expected request JSON on stdin\n")
         return
     log("[✓] Read input data from stdin")
-    log(json.dumps(data_str, indent=4))
+    if log_enabled(DEBUG):
+        log(data_str.decode("utf-8", "replace"), DEBUG)
     
     try:
-        request = json.loads(data_str)
+        request = bridge_json.loads(data_str)
         log("[✓] Parsed JSON successfully")
     except Exception as e:
-        log(f"[ERROR] JSON parsing failed: {e}")
+        log(f"[ERROR] JSON parsing failed: {e}", ERROR)
         sys.stderr.write("Expected request JSON on stdin\n")
         return
-    messages = build_messages(request)
-    log("[✓] Built message list")
-    log(f"Messages: {json.dumps(messages, indent=4)}")
-
-    wrapped_tools = request.get("tools")
-    tool_choice = request.get("tool_choice", "auto")
-
-    model = "gpt-4o-mini"
-    llm = InvokeGPT(model=model)
-
 
+    # SIGTERM/SIGINT or the reader closing stdout cancels the request:
+    # closing the response generator aborts the upstream HTTP stream.
+    task = asyncio.current_task()
+    stopped = []
+
+    def stop(reason):
+        if not stopped:
+            stopped.append(reason)
+            task.cancel()
+
+    # Events are read ahead of a slow reader into a bounded queue, and a
+    # stdout pipe is written without blocking the loop, so the upstream
+    # keeps being read meanwhile.  A file falls back to plain writes.
+    out = await PipeWriter.open(sys.stdout)
+
+    def write(evt):
+        if "output closed" in stopped:
+            return
+        try:
+            emit(evt, out)
+        except BrokenPipeError:
+            # Keep interpreter shutdown from failing to flush the dead pipe.
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            stop("output closed")
+
+    cancel_on_signals(lambda: stop("signal"))
+    emitter = CoalescingEmitter.from_env(write)
+    resp_id = None
+    status = 0
     try:
-        stream = llm.get_response(
-            messages,
-            tools=wrapped_tools,
-            stream=True,
-            tool_choice=tool_choice,
-            model=model,
-        )
-
-        log("[✓] Started response stream")
-
-        resp_id = gen_id("resp")
-
-        def emit(evt):
-            print(json.dumps(evt), flush=True)
-            log(f"[→] {evt.get('type')}")
-
-        emit({"type": "response.created", "response": {"id": resp_id, "status": "in_progress"}})
-        emit({"type": "response.in_progress", "response": {"id": resp_id, "status": "in_progress"}})
-        for chunk in stream:
-            if hasattr(chunk, "to_dict"):
-                chunk = chunk.to_dict()
-
-            log(f"[→] Chunk: {repr(chunk)}")
-            
-            emit(chunk)
-        '''
-        tool_calls = {}
-        text_content = ""
-        final_output = []
-
-        for chunk in stream:
-            if hasattr(chunk, "to_dict"):
-                chunk = chunk.to_dict()
-
-            log(f"[→] Chunk: {repr(chunk)}")
-            
-
-            choice = chunk.get("choices", [{}])[0]
-            delta = choice.get("delta", {})
-            finish_reason = choice.get("finish_reason")
-
-            for tc in delta.get("tool_calls", []):
-                idx = tc.get("index", 0)
-                call = tool_calls.setdefault(idx, {
-                    "id": tc.get("id", gen_id("call")),
-                    "name": tc.get("function", {}).get("name", ""),
-                    "arguments": "",
-                })
-                if tc.get("function", {}).get("name"):
-                    call["name"] = tc["function"]["name"]
-                if tc.get("function", {}).get("arguments"):
-                    call["arguments"] += tc["function"]["arguments"]
-
-            if "content" in delta and delta["content"] is not None:
-                text_content += delta["content"]
-
-            if finish_reason == "tool_calls":
-                for tc in tool_calls.values():
-                    emit({
-                        "type": "response.output_item.done",
-                        "item": {
-                            "type": "function_call",
-                            "id": tc["id"],
-                            "name": tc["name"],
-                            "arguments": tc["arguments"],
-                        },
-                    })
-                    final_output.append({
-                        "type": "function_call",
-                        "id": tc["id"],
-                        "name": tc["name"],
-                        "arguments": tc["arguments"],
-                    })
-
-            if finish_reason == "stop" and text_content:
-                emit({
-                    "type": "response.output_item.done",
-                    "item": {
-                        "type": "message",
-                        "id": gen_id("msg"),
-                        "role": "assistant",
-                        "content": [{"type": "output_text", "text": text_content}],
-                    },
-                })
-                final_output.append({
-                    "type": "message",
-                    "id": gen_id("msg"),
-                    "role": "assistant",
-                    "content": [{"type": "output_text", "text": text_content}],
-                })
-
-        if not final_output:
-            raise Exception("No output received from model")
-
-        emit({
-            "type": "response.completed",
-            "response": {"id": resp_id, "status": "completed", "output": final_output},
-        })
-        '''
-
-    except Exception as e:
-        log(f"[ERROR] During LLM call or output formatting: {str(e)}")
-
+        events = buffered(stream_response(request, fmt=args.format, cache=cache, store=store, router=router, ledger=ledger), "stdout")
+        async with contextlib.aclosing(events):
+            async for evt in events:
+                if resp_id is None and evt.get("type") == "response.created":
+                    resp_id = evt["response"]["id"]
+                if evt.get("type") == "response.failed" or "error" in evt:
+                    # Tell callers that only check the exit status.
+                    status = 1
+                emitter.emit(evt)
+                if out is not None:
+                    await out.drain()
+    except BrokenPipeError:
+        stopped.append("output closed")
+        log("[WARN] Request cancelled (output closed); aborted the upstream stream", WARNING)
+    except asyncio.CancelledError:
+        if not stopped:
+            raise
+        log(f"[WARN] Request cancelled ({stopped[0]}); aborted the upstream stream", WARNING)
+        if resp_id is not None:
+            for evt in ResponseTranslator(resp_id=resp_id).failed("cancelled", "Request cancelled"):
+                emitter.emit(evt)
+    finally:
+        emitter.close()
+        if out is not None:
+            await out.close()
+        await aclose_shared_clients()
+        if log_enabled(DEBUG):
+            log(f"Metrics: {bridge_json.dumps(bridge_metrics.snapshot())}", DEBUG)
+    return status
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    sys.exit(asyncio.run(main()))
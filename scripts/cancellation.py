@@ -0,0 +1,82 @@
+"""Request deadlines and cancellation.
+
+A request may carry ``timeout_ms``, the budget its sender has left for
+it; without one ``CODEX_BRIDGE_TIMEOUT_MS`` applies, and with neither
+there is no deadline.  ``Deadline`` pins that budget to the monotonic
+clock when the request is read, and every later step bounds its own wait
+by what is left -- queueing for a rate-limit slot, opening the upstream
+stream, each chunk read, each tool command -- so the request stops when
+its budget does instead of at whichever step happens to time out first.
+
+``cancel_on_signals`` turns SIGTERM/SIGINT into cancelling the running
+request so the upstream stream and child processes are torn down before
+the process exits.
+"""
+import asyncio
+import math
+import os
+import signal
+import time
+
+from bridge_log import WARNING, log
+
+
+class Deadline:
+    def __init__(self, seconds=None):
+        # time.monotonic() is the event loop's clock, so ``at`` can be
+        # handed straight to asyncio.timeout_at().
+        self.at = None if seconds is None else time.monotonic() + seconds
+
+    @classmethod
+    def from_request(cls, request):
+        value = request.get("timeout_ms")
+        if value is None:
+            value = os.environ.get("CODEX_BRIDGE_TIMEOUT_MS")
+        if not value:
+            return cls()
+        try:
+            ms = float(value)
+        except (TypeError, ValueError):
+            ms = math.nan
+        if not math.isfinite(ms):
+            log(f"[WARN] Ignoring invalid timeout_ms {value!r}", WARNING)
+            return cls()
+        return cls() if ms <= 0 else cls(ms / 1000)
+
+    def remaining(self, timeout=None):
+        """Seconds left, capped at ``timeout``; None when neither bounds it."""
+        if self.at is None:
+            return timeout
+        left = max(0.0, self.at - time.monotonic())
+        return left if timeout is None else min(timeout, left)
+
+    @property
+    def expired(self):
+        return self.at is not None and time.monotonic() >= self.at
+
+
+async def bounded(aiterable, deadline):
+    """Iterate ``aiterable``, raising TimeoutError once ``deadline`` passes.
+
+    Only the wait for each item is bounded, never the consumer's work
+    between items, so the timeout cannot fire outside this generator.
+    """
+    iterator = aiterable.__aiter__()
+    while True:
+        async with asyncio.timeout_at(deadline.at):
+            try:
+                item = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+        yield item
+
+
+def cancel_on_signals(callback, signals=(signal.SIGTERM, signal.SIGINT)):
+    """Call ``callback()`` from the running loop when one of ``signals`` arrives."""
+    loop = asyncio.get_running_loop()
+    for sig in signals:
+        try:
+            loop.add_signal_handler(sig, callback)
+        except (NotImplementedError, RuntimeError):
+            # Not available on this platform or outside the main thread.
+            pass
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Capture upstream chat.completion chunk streams and play them back.
+
+A trace file is JSON lines: a header object followed by one compact
+``[seconds_since_request, chunk]`` line per upstream chunk, timed with a
+monotonic clock from the moment the request was sent, so the first offset
+is the observed time to first chunk.
+
+Run ``call_gpt.py --capture DIR`` (or set ``CODEX_BRIDGE_CAPTURE``) to record
+one trace per response, and ``--replay TRACE`` (``CODEX_BRIDGE_REPLAY``)
+to serve a recorded trace through the bridge without the network;
+``--replay-speed 0`` plays it back as fast as possible.
+
+    python3 chunk_trace.py TRACE...   # print a summary of each trace
+"""
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+
+_seq = itertools.count()
+
+
+class TraceWriter:
+    def __init__(self, path, model=None):
+        self.path = path
+        self.count = 0
+        self._start = time.monotonic()
+        self._f = open(path, "w", encoding="utf-8")
+        self._f.write(json.dumps({"trace": 1, "model": model, "created": time.time()}) + "\n")
+
+    @classmethod
+    def in_directory(cls, directory, model=None):
+        """Start a new trace with a unique name inside ``directory``."""
+        os.makedirs(directory, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_seq)}.trace.jsonl"
+        return cls(os.path.join(directory, name), model=model)
+
+    def write(self, chunk):
+        offset = time.monotonic() - self._start
+        self._f.write(json.dumps([round(offset, 6), chunk], separators=(",", ":")) + "\n")
+        self.count += 1
+
+    def close(self):
+        self._f.close()
+
+
+def read_trace(path):
+    """Return ``(header, [(offset, chunk), ...])`` for a trace file."""
+    with open(path, encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        chunks = [tuple(json.loads(line)) for line in f if line.strip()]
+    return header, chunks
+
+
+class ReplayStream:
+    """Async iterator over recorded chunks, shaped like the OpenAI stream."""
+
+    def __init__(self, chunks, speed=1.0):
+        self.chunks = chunks
+        self.speed = speed
+        self._closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        start = time.monotonic()
+        for offset, chunk in self.chunks:
+            if self._closed:
+                return
+            if self.speed > 0:
+                delay = offset / self.speed - (time.monotonic() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield chunk
+
+    async def close(self):
+        self._closed = True
+
+
+def summarize(path):
+    header, chunks = read_trace(path)
+    if not chunks:
+        return f"{path}: empty"
+    duration = chunks[-1][0]
+    ttft = chunks[0][0]
+    rate = len(chunks) / (duration - ttft) if duration > ttft else float("inf")
+    return (
+        f"{path}: model={header.get('model')} chunks={len(chunks)} "
+        f"ttft={ttft * 1000:.1f}ms duration={duration * 1000:.1f}ms chunks/s={rate:.1f}"
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.stderr.write("usage: chunk_trace.py TRACE...\n")
+        sys.exit(2)
+    for trace_path in sys.argv[1:]:
+        print(summarize(trace_path))
@@ -0,0 +1,210 @@
+"""Fit the message list into the model's context window.
+
+``fit_messages`` keeps the leading system instructions, then walks back
+from the newest message keeping whole turns while they fit the budget.
+An assistant message that made tool calls and the ``tool`` messages that
+answer it are one unit, so a call is never sent without its output or the
+other way round.  The newest unit is always kept.  What was dropped is
+returned as a report and logged.
+
+Token counts are cached per message, keyed by a hash of its content, so
+re-counting a long history on every turn only tokenizes the new messages.
+Tokenizers are pluggable (``register_tokenizer``); ``tiktoken`` is used
+when installed, otherwise a characters/4 estimate like the CLI's
+``approximateTokensUsed``.
+
+Environment:
+
+``CODEX_BRIDGE_CONTEXT_TOKENS``  context window override, or ``off`` to disable trimming
+``CODEX_BRIDGE_OUTPUT_RESERVE``  tokens left free for the reply (default 4096)
+``CODEX_BRIDGE_TOKENIZER``       ``auto`` (default), ``tiktoken`` or ``approx``
+"""
+import hashlib
+import math
+import os
+from collections import OrderedDict
+
+import bridge_json
+from bridge_log import WARNING, log
+
+# Longest matching prefix wins.
+CONTEXT_WINDOWS = {
+    "gpt-4o": 128_000,
+    "gpt-4o-mini": 128_000,
+    "gpt-4.1": 1_047_576,
+    "gpt-4-turbo": 128_000,
+    "gpt-4": 8_192,
+    "gpt-3.5-turbo": 16_385,
+    "o1": 200_000,
+    "o3": 200_000,
+    "o4-mini": 200_000,
+    "llama3": 8_192,
+    "llama3.1": 128_000,
+}
+DEFAULT_CONTEXT_WINDOW = 128_000
+MESSAGE_OVERHEAD = 4
+
+_tokenizers = {}
+
+
+def register_tokenizer(name, count):
+    """Register ``count(text) -> int`` under ``name``."""
+    _tokenizers[name] = count
+
+
+def _approx_tokens(text):
+    return math.ceil(len(text) / 4)
+
+
+register_tokenizer("approx", _approx_tokens)
+
+
+def _tiktoken_counter():
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    encoding = tiktoken.get_encoding("o200k_base")
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def get_tokenizer(name=None):
+    name = (name or os.environ.get("CODEX_BRIDGE_TOKENIZER", "auto")).lower()
+    if name in ("auto", "tiktoken") and "tiktoken" not in _tokenizers:
+        counter = _tiktoken_counter()
+        if counter is not None:
+            register_tokenizer("tiktoken", counter)
+        elif name == "tiktoken":
+            log("[WARN] tiktoken is not installed; estimating tokens from characters", WARNING)
+    if name == "auto":
+        name = "tiktoken" if "tiktoken" in _tokenizers else "approx"
+    return _tokenizers.get(name, _tokenizers["approx"])
+
+
+def context_window(model):
+    override = os.environ.get("CODEX_BRIDGE_CONTEXT_TOKENS")
+    if override:
+        return None if override.lower() == "off" else int(override)
+    model = model or ""
+    best = None
+    for prefix in CONTEXT_WINDOWS:
+        if model.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return CONTEXT_WINDOWS[best] if best else DEFAULT_CONTEXT_WINDOW
+
+
+def message_text(msg):
+    content = msg.get("content")
+    if isinstance(content, str):
+        text = content
+    elif content is None:
+        text = ""
+    else:
+        text = bridge_json.dumps(content)
+    for tc in msg.get("tool_calls") or ():
+        fn = tc.get("function") or {}
+        text += (fn.get("name") or "") + (fn.get("arguments") or "")
+    return text
+
+
+def estimate_tokens(messages):
+    """Cheap characters/4 estimate for a whole message list."""
+    return sum(_approx_tokens(message_text(m)) + MESSAGE_OVERHEAD for m in messages)
+
+
+class TokenCounter:
+    """Per-message token counts with an LRU cache keyed by content hash."""
+
+    def __init__(self, tokenizer=None, max_entries=50_000):
+        self.count_text = get_tokenizer(tokenizer)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def count(self, msg):
+        text = message_text(msg)
+        key = hashlib.blake2b(text.encode("utf-8", "replace"), digest_size=16).digest()
+        tokens = self._cache.get(key)
+        if tokens is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return tokens
+        self.misses += 1
+        tokens = self.count_text(text) + MESSAGE_OVERHEAD
+        self._cache[key] = tokens
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return tokens
+
+
+def group_units(messages):
+    """Split messages into units that must be kept or dropped together."""
+    units = []
+    pending_calls = set()
+    for msg in messages:
+        if msg.get("role") == "tool" and units and msg.get("tool_call_id") in pending_calls:
+            units[-1].append(msg)
+            pending_calls.discard(msg.get("tool_call_id"))
+            continue
+        units.append([msg])
+        pending_calls = {tc.get("id") for tc in msg.get("tool_calls") or ()}
+    return units
+
+
+def fit_messages(messages, budget, counter, tools=None):
+    """Return ``(messages, report)`` with older turns dropped to fit ``budget`` tokens."""
+    report = {"budget": budget, "dropped_messages": 0, "dropped_tokens": 0}
+    tools_tokens = counter.count({"content": bridge_json.dumps(tools)}) if tools else 0
+    available = budget - tools_tokens
+
+    # Every token spans at least one byte of UTF-8 (a CJK character or an
+    # emoji is often several tokens, but never more than its bytes), so a
+    # list whose text fits in the budget as bytes cannot exceed it.
+    if sum(len(message_text(m).encode("utf-8", "replace")) + MESSAGE_OVERHEAD for m in messages) <= available:
+        return messages, report
+
+    head = 0
+    while head < len(messages) and messages[head].get("role") in ("system", "developer"):
+        head += 1
+    system, rest = messages[:head], messages[head:]
+    used = sum(counter.count(m) for m in system)
+
+    units = group_units(rest)
+    kept = []
+    for i, unit in enumerate(reversed(units)):
+        cost = sum(counter.count(m) for m in unit)
+        if i > 0 and used + cost > available:
+            dropped = units[: len(units) - i]
+            report["dropped_messages"] = sum(len(u) for u in dropped)
+            report["dropped_tokens"] = sum(counter.count(m) for u in dropped for m in u)
+            break
+        used += cost
+        kept.append(unit)
+
+    report["kept_tokens"] = used + tools_tokens
+    if not report["dropped_messages"]:
+        return messages, report
+    return system + [m for unit in reversed(kept) for m in unit], report
+
+
+_counter = None
+
+
+def fit_to_context(messages, model, tools=None):
+    """Trim ``messages`` to ``model``'s context window minus the output reserve."""
+    global _counter
+    window = context_window(model)
+    if window is None:
+        return messages, None
+    if _counter is None:
+        _counter = TokenCounter()
+    budget = window - int(os.environ.get("CODEX_BRIDGE_OUTPUT_RESERVE", 4096))
+    messages, report = fit_messages(messages, budget, _counter, tools)
+    if report["dropped_messages"]:
+        log(
+            f"[WARN] Context over budget for {model}: dropped {report['dropped_messages']} messages "
+            f"(~{report['dropped_tokens']} tokens), kept ~{report['kept_tokens']} of {budget}",
+            WARNING,
+        )
+    return messages, report
@@ -0,0 +1,136 @@
+"""Memory-bounded store of converted conversations keyed by response id.
+
+A persistent bridge remembers the chat message list behind every response
+it produced (prompt plus the assistant's reply).  A follow-up request that
+names it in ``previous_response_id`` then only has to carry, and the bridge
+only has to convert, the new ``input`` items.
+
+Entries are kept in LRU order and expire after a TTL.  When the entry or
+byte budget is exceeded, the least recently used conversations are spilled
+to disk if a spill directory is configured, otherwise dropped.
+
+Environment:
+
+``CODEX_BRIDGE_STORE_ENTRIES``    conversations kept in memory (default 256)
+``CODEX_BRIDGE_STORE_MAX_BYTES``  approximate in-memory budget (default 64 MiB)
+``CODEX_BRIDGE_STORE_TTL``        seconds before a conversation expires (default 6 hours)
+``CODEX_BRIDGE_STORE_DIR``        spill directory; in stdin mode this alone enables the store
+"""
+import os
+import time
+from collections import OrderedDict
+
+import bridge_json
+from bridge_log import WARNING, log
+
+
+def message_size(messages) -> int:
+    """Cheap estimate of the memory a message list holds."""
+    total = 0
+    for msg in messages:
+        content = msg.get("content")
+        total += len(content) if isinstance(content, str) else 64
+        for tc in msg.get("tool_calls") or ():
+            total += len((tc.get("function") or {}).get("arguments") or "") + 64
+        total += 64
+    return total
+
+
+class ConversationStore:
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, ttl=6 * 3600, spill_dir=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, persistent=True):
+        """Store for this process: in memory when persistent, disk-only otherwise."""
+        env = os.environ
+        spill_dir = env.get("CODEX_BRIDGE_STORE_DIR")
+        if not persistent and not spill_dir:
+            return None
+        return cls(
+            max_entries=int(env.get("CODEX_BRIDGE_STORE_ENTRIES", 256)) if persistent else 0,
+            max_bytes=int(env.get("CODEX_BRIDGE_STORE_MAX_BYTES", 64 * 1024 * 1024)),
+            ttl=float(env.get("CODEX_BRIDGE_STORE_TTL", 6 * 3600)),
+            spill_dir=spill_dir,
+        )
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, response_id, messages):
+        self._discard(response_id)
+        size = message_size(messages)
+        self._entries[response_id] = (messages, size, time.time())
+        self.bytes += size
+        self._evict()
+
+    def get(self, response_id):
+        """Return the message list stored for ``response_id`` or None."""
+        entry = self._entries.get(response_id)
+        if entry is not None:
+            messages, _size, created = entry
+            if self._expired(created):
+                self._discard(response_id)
+            else:
+                self._entries.move_to_end(response_id)
+                self.hits += 1
+                return messages
+        messages = self._load(response_id)
+        if messages is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return messages
+
+    def _expired(self, created):
+        return bool(self.ttl) and time.time() - created > self.ttl
+
+    def _discard(self, response_id):
+        entry = self._entries.pop(response_id, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+            response_id, (messages, size, created) = self._entries.popitem(last=False)
+            self.bytes -= size
+            self._spill(response_id, messages, created)
+
+    def _spill_path(self, response_id):
+        safe = "".join(c for c in response_id if c.isalnum() or c in "-_")
+        return os.path.join(self.spill_dir, f"{safe}.json")
+
+    def _spill(self, response_id, messages, created):
+        if not self.spill_dir or self._expired(created):
+            return
+        path = self._spill_path(response_id)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(bridge_json.dumpb(messages))
+            os.replace(tmp, path)
+            os.utime(path, (created, created))
+        except OSError as e:
+            log(f"[WARN] Could not spill conversation {response_id}: {e}", WARNING)
+
+    def _load(self, response_id):
+        if not self.spill_dir:
+            return None
+        path = self._spill_path(response_id)
+        try:
+            if self._expired(os.path.getmtime(path)):
+                os.unlink(path)
+                return None
+            with open(path, "rb") as f:
+                return bridge_json.loads(f.read())
+        except (OSError, ValueError):
+            return None
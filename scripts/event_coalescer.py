@@ -0,0 +1,137 @@
+"""Merge bursts of tiny streaming deltas before they are written out.
+
+Every upstream token used to become its own JSON line, flushed write and
+``JSON.parse`` on the Node side.  ``CoalescingEmitter`` holds consecutive
+text or tool-argument deltas for the same item and writes them as one
+event once the time window closes, the byte budget fills, or any other
+event arrives, so item boundaries are never delayed.  It understands both
+Responses API delta events and raw chat.completion chunks.
+
+``CODEX_BRIDGE_COALESCE_MS`` sets the window (default 15, 0 disables) and
+``CODEX_BRIDGE_COALESCE_BYTES`` the byte budget (default 4096).
+"""
+import asyncio
+import os
+
+RESPONSE_DELTA_TYPES = ("response.output_text.delta", "response.function_call_arguments.delta")
+
+
+def _present(mapping):
+    return {k for k, v in mapping.items() if v is not None}
+
+
+def delta_key(evt):
+    """Return ``(key, text)`` if ``evt`` is a mergeable delta, else ``(None, None)``.
+
+    Events with equal keys can be concatenated in order.
+    """
+    etype = evt.get("type")
+    if etype in RESPONSE_DELTA_TYPES:
+        return (etype, evt.get("item_id"), evt.get("output_index"), evt.get("content_index")), evt.get("delta") or ""
+
+    if evt.get("object") != "chat.completion.chunk" or evt.get("usage"):
+        return None, None
+    choices = evt.get("choices") or []
+    if len(choices) != 1 or choices[0].get("finish_reason"):
+        return None, None
+    choice = choices[0]
+    delta = choice.get("delta") or {}
+    keys = _present(delta)
+    if keys == {"content"}:
+        return ("chat.content", evt.get("id"), choice.get("index")), delta["content"]
+    if keys == {"tool_calls"} and len(delta["tool_calls"]) == 1:
+        tc = delta["tool_calls"][0]
+        fn = tc.get("function") or {}
+        if _present(tc) <= {"index", "function", "type"} and _present(fn) == {"arguments"}:
+            return ("chat.arguments", evt.get("id"), choice.get("index"), tc.get("index")), fn["arguments"]
+    return None, None
+
+
+def merge(base, key, text):
+    """Return a copy of ``base`` carrying ``text`` as its delta."""
+    kind = key[0]
+    if kind in RESPONSE_DELTA_TYPES:
+        return {**base, "delta": text}
+    choice = base["choices"][0]
+    delta = choice["delta"]
+    if kind == "chat.content":
+        new_delta = {**delta, "content": text}
+    else:
+        tc = delta["tool_calls"][0]
+        new_delta = {**delta, "tool_calls": [{**tc, "function": {**tc["function"], "arguments": text}}]}
+    return {**base, "choices": [{**choice, "delta": new_delta}]}
+
+
+class CoalescingEmitter:
+    """Pass events to ``write`` while merging runs of deltas.
+
+    ``emit`` is synchronous; when an event loop is running, a pending merge
+    is also flushed by a timer so a quiet upstream never strands text.
+    """
+
+    def __init__(self, write, window=0.015, max_bytes=4096):
+        self.write = write
+        self.window = window
+        self.max_bytes = max_bytes
+        self.written = 0
+        self.merged = 0
+        self._key = None
+        self._base = None
+        self._parts = []
+        self._size = 0
+        self._timer = None
+
+    @classmethod
+    def from_env(cls, write):
+        return cls(
+            write,
+            window=float(os.environ.get("CODEX_BRIDGE_COALESCE_MS", "15")) / 1000,
+            max_bytes=int(os.environ.get("CODEX_BRIDGE_COALESCE_BYTES", "4096")),
+        )
+
+    def emit(self, evt):
+        if self.window <= 0:
+            self._write(evt)
+            return
+        key, text = delta_key(evt)
+        if key is None:
+            self.flush()
+            self._write(evt)
+            return
+        if self._key is not None and key != self._key:
+            self.flush()
+        if self._key is None:
+            self._key = key
+            self._base = evt
+            self._schedule()
+        else:
+            self.merged += 1
+        self._parts.append(text)
+        self._size += len(text.encode("utf-8", "replace"))
+        if self._size >= self.max_bytes:
+            self.flush()
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._key is None:
+            return
+        key, base, parts = self._key, self._base, self._parts
+        self._key = self._base = None
+        self._parts = []
+        self._size = 0
+        self._write(base if len(parts) == 1 else merge(base, key, "".join(parts)))
+
+    close = flush
+
+    def _write(self, evt):
+        self.written += 1
+        self.write(evt)
+
+    def _schedule(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._timer = loop.call_later(self.window, self.flush)
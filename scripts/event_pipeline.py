@@ -0,0 +1,195 @@
+"""Decouple reading the upstream from writing events out.
+
+``buffered(events)`` runs an event generator -- the upstream read and the
+chunk translation -- in its own task and hands its events to the consumer
+through a ``WatermarkQueue``.  A slow write then no longer holds up the
+socket read: the producer keeps reading until ``high`` events are waiting,
+then pauses until the consumer has drained the queue down to ``low``, so
+memory stays bounded and TCP flow control pushes back on the upstream
+instead.  ``PipeWriter`` gives stdout the same treatment: writes are
+buffered by the event loop rather than blocking it when the reader of the
+pipe falls behind.
+
+``CODEX_BRIDGE_QUEUE_HIGH``  events buffered before the producer pauses (default 256)
+``CODEX_BRIDGE_QUEUE_LOW``   depth at which it resumes (default 64)
+
+Reported in bridge_metrics per queue name: the ``queue.depth.<name>``
+gauge (summed over live queues) and ``queue.max_depth.<name>``, the
+``queue.paused.<name>`` count and ``queue.paused_ms.<name>`` timings.
+"""
+import asyncio
+import contextlib
+import os
+import time
+from collections import defaultdict, deque
+
+import bridge_metrics
+
+DEFAULT_HIGH = 256
+DEFAULT_LOW = 64
+
+_depths = defaultdict(int)
+_DONE = object()
+
+
+class WatermarkQueue:
+    def __init__(self, high=DEFAULT_HIGH, low=DEFAULT_LOW, name="events"):
+        self.high = max(1, high)
+        self.low = min(low, self.high - 1)
+        self.name = name
+        self.max_depth = 0
+        self._items = deque()
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+        self._depth_metric = f"queue.depth.{name}"
+
+    @classmethod
+    def from_env(cls, name="events"):
+        return cls(
+            high=int(os.environ.get("CODEX_BRIDGE_QUEUE_HIGH", DEFAULT_HIGH)),
+            low=int(os.environ.get("CODEX_BRIDGE_QUEUE_LOW", DEFAULT_LOW)),
+            name=name,
+        )
+
+    def __len__(self):
+        return len(self._items)
+
+    def _moved(self, change):
+        _depths[self.name] += change
+        bridge_metrics.set_gauge(self._depth_metric, _depths[self.name])
+
+    def put_nowait(self, item):
+        self._items.append(item)
+        self._readable.set()
+        self._moved(1)
+
+    async def put(self, item):
+        """Queue ``item``; at the high watermark, wait until drained to the low one."""
+        self.put_nowait(item)
+        depth = len(self._items)
+        if depth > self.max_depth:
+            self.max_depth = depth
+            if depth > bridge_metrics.METRICS.gauges.get(f"queue.max_depth.{self.name}", 0):
+                bridge_metrics.set_gauge(f"queue.max_depth.{self.name}", depth)
+        if depth >= self.high:
+            self._writable.clear()
+            bridge_metrics.incr(f"queue.paused.{self.name}")
+            start = time.monotonic()
+            await self._writable.wait()
+            bridge_metrics.observe(f"queue.paused_ms.{self.name}", (time.monotonic() - start) * 1000)
+
+    async def get(self):
+        while not self._items:
+            self._readable.clear()
+            await self._readable.wait()
+        item = self._items.popleft()
+        self._moved(-1)
+        if len(self._items) <= self.low:
+            self._writable.set()
+        return item
+
+    def discard(self):
+        """Drop anything left, e.g. when the consumer went away."""
+        if self._items:
+            self._moved(-len(self._items))
+            self._items.clear()
+        self._writable.set()
+
+
+async def buffered(events, name="events"):
+    """Yield from the async generator ``events``, read ahead by a producer task.
+
+    Closing or cancelling the consumer cancels the producer, which closes
+    ``events`` (and so the upstream stream) from its own task.
+    """
+    queue = WatermarkQueue.from_env(name)
+    failure = []
+
+    async def produce():
+        try:
+            async with contextlib.aclosing(events):
+                async for evt in events:
+                    await queue.put(evt)
+        except Exception as e:
+            failure.append(e)
+        finally:
+            queue.put_nowait(_DONE)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            evt = await queue.get()
+            if evt is _DONE:
+                break
+            yield evt
+    finally:
+        if not producer.done():
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+        queue.discard()
+    if failure:
+        raise failure[0]
+
+
+class _PipeProtocol(asyncio.BaseProtocol):
+    def __init__(self):
+        self.error = None
+        self.writable = asyncio.Event()
+        self.writable.set()
+        self.closed = asyncio.Event()
+
+    def pause_writing(self):
+        self.writable.clear()
+
+    def resume_writing(self):
+        self.writable.set()
+
+    def connection_lost(self, exc):
+        self.error = exc or BrokenPipeError("pipe closed")
+        self.writable.set()
+        self.closed.set()
+
+
+class PipeWriter:
+    """Non-blocking writes to a pipe; ``drain()`` waits while its reader is behind."""
+
+    def __init__(self, transport, protocol, fd):
+        self.transport = transport
+        self.protocol = protocol
+        self.fd = fd
+
+    @classmethod
+    async def open(cls, fileobj):
+        """A writer on ``fileobj``'s descriptor, or None if it is not a pipe (e.g. a file)."""
+        fd = fileobj.fileno()
+        pipe = os.fdopen(os.dup(fd), "wb", buffering=0)
+        try:
+            transport, protocol = await asyncio.get_running_loop().connect_write_pipe(_PipeProtocol, pipe)
+        except (ValueError, OSError):
+            pipe.close()
+            return None
+        return cls(transport, protocol, fd)
+
+    def write(self, data):
+        self.transport.write(data)
+
+    def flush(self):
+        # The transport writes as soon as the pipe accepts data.
+        pass
+
+    async def drain(self):
+        if self.protocol.error is not None:
+            raise BrokenPipeError(str(self.protocol.error))
+        if not self.protocol.writable.is_set():
+            await self.protocol.writable.wait()
+            if self.protocol.error is not None:
+                raise BrokenPipeError(str(self.protocol.error))
+
+    async def close(self):
+        """Write out what is buffered, then leave the descriptor blocking again."""
+        if not self.transport.is_closing():
+            self.transport.close()
+        await self.protocol.closed.wait()
+        # The dup shares O_NONBLOCK with the original descriptor.
+        os.set_blocking(self.fd, True)
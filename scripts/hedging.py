@@ -0,0 +1,231 @@
+"""Hedge upstream calls that are slow to produce their first chunk.
+
+When the primary call has not produced a chunk within the hedge delay, a
+duplicate request goes to the same or a fallback provider.  Whichever
+produces a first chunk first is streamed and the other is cancelled and
+closed.  The delay is fixed or tracks a percentile of recently observed
+time-to-first-chunk for the primary provider.
+
+Configured by a ``"hedge"`` section in the backend config, e.g.
+``{"delay_ms": "p90", "provider": "local", "model": "llama3:8b"}``, or by
+the environment, which takes precedence:
+
+``CODEX_BRIDGE_HEDGE_MS``        delay in milliseconds or ``pNN``; unset disables hedging
+``CODEX_BRIDGE_HEDGE_PROVIDER``  provider for the duplicate (default: the primary's)
+``CODEX_BRIDGE_HEDGE_MODEL``     upstream model for the duplicate (default: the primary's)
+``CODEX_BRIDGE_HEDGE_HISTORY``   file of recent TTFTs for ``pNN`` delays (default
+                                 ``ttft.json`` in ``CODEX_BRIDGE_RATE_DIR``; ``off`` keeps them per process)
+
+A percentile delay needs ``min_samples`` observations (default 20) before
+it is used; until then ``default_ms`` (2000) applies.  A one-shot bridge
+makes a single call, so the samples are kept in a file shared by every
+bridge process (``TtftHistory``) rather than only in bridge_metrics;
+with ``off`` a percentile delay only ever applies under ``--serve``.
+Decisions are counted in bridge_metrics as ``hedge.*``.
+"""
+import asyncio
+import fcntl
+import json
+import os
+import time
+
+import bridge_metrics
+from bridge_log import WARNING, log
+from rate_limiter import DEFAULT_RATE_DIR
+
+
+class TtftHistory:
+    """The last ``size`` time-to-first-chunk samples per provider in a JSON file.
+
+    Updated under ``flock`` in a worker thread, like the rate limiter's state.
+    """
+
+    def __init__(self, path, size=200):
+        self.path = path
+        self.size = size
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def _update(self, provider, ms=None):
+        with open(self.path, "a+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            raw = f.read()
+            try:
+                state = json.loads(raw) if raw else {}
+            except ValueError:
+                state = {}
+            if not isinstance(state, dict):
+                state = {}
+            samples = state.get(provider) or []
+            if ms is not None:
+                samples = state[provider] = (samples + [round(ms, 1)])[-self.size:]
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state).encode())
+            return samples
+
+    async def samples(self, provider):
+        return await asyncio.get_running_loop().run_in_executor(None, self._update, provider)
+
+    async def add(self, provider, ms):
+        await asyncio.get_running_loop().run_in_executor(None, self._update, provider, ms)
+
+
+class HedgePolicy:
+    def __init__(self, delay_ms, provider=None, model=None, default_ms=2000, min_samples=20, history=None):
+        self.delay_ms = delay_ms
+        self.provider = provider
+        self.model = model
+        self.default_ms = default_ms
+        self.min_samples = min_samples
+        self.history = history
+
+    @classmethod
+    def from_env(cls, config=None):
+        """Policy from ``config`` overridden by the environment, or None if disabled."""
+        config = dict(config or {})
+        env = os.environ
+        if "CODEX_BRIDGE_HEDGE_MS" in env:
+            config["delay_ms"] = env["CODEX_BRIDGE_HEDGE_MS"]
+        for key in ("provider", "model"):
+            if f"CODEX_BRIDGE_HEDGE_{key.upper()}" in env:
+                config[key] = env[f"CODEX_BRIDGE_HEDGE_{key.upper()}"]
+        delay = config.pop("delay_ms", None)
+        if delay in (None, "", "off"):
+            return None
+        history = env.get("CODEX_BRIDGE_HEDGE_HISTORY", config.pop("history", None))
+        if str(delay).startswith("p") and history not in ("", "0", "off"):
+            default = os.path.join(env.get("CODEX_BRIDGE_RATE_DIR", DEFAULT_RATE_DIR), "ttft.json")
+            config["history"] = TtftHistory(os.path.expanduser(history or default))
+        return cls(delay, **config)
+
+    async def delay(self, provider):
+        """Seconds to wait for the primary's first chunk before hedging."""
+        delay = str(self.delay_ms)
+        if not delay.startswith("p"):
+            return float(delay) / 1000
+        pct = float(delay[1:])
+        if self.history is not None:
+            samples = await self.history.samples(provider)
+            count, value = len(samples), bridge_metrics.percentile(samples, pct)
+        else:
+            name = f"ttft_ms.{provider}"
+            count, value = bridge_metrics.METRICS.count(name), bridge_metrics.METRICS.percentile(name, pct)
+        if count < self.min_samples:
+            return self.default_ms / 1000
+        return value / 1000
+
+
+class HedgedStream:
+    """The winning stream, replaying the first chunk it already produced.
+
+    ``backend``, ``provider`` and ``model`` say which attempt won, so usage
+    and later retries go to the backend that actually answered.
+    """
+
+    def __init__(self, stream, iterator, first, label, backend=None, provider=None, model=None):
+        self.stream = stream
+        self.label = label
+        self.backend = backend
+        self.provider = provider
+        self.model = model
+        self._iterator = iterator
+        self._first = first
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        if self._first is None:
+            return
+        yield self._first
+        async for chunk in self._iterator:
+            yield chunk
+
+    async def close(self):
+        await self.stream.close()
+
+
+async def first_chunk(backend, messages, model, call, provider, history=None):
+    """Open a stream and wait for its first chunk, recording the TTFT."""
+    start = time.monotonic()
+    stream = await backend.get_response(messages, model=model, **call)
+    iterator = aiter(stream)
+    try:
+        first = await anext(iterator)
+    except StopAsyncIteration:
+        first = None
+    except BaseException:
+        await stream.close()
+        raise
+    ttft = (time.monotonic() - start) * 1000
+    bridge_metrics.observe(f"ttft_ms.{provider}", ttft)
+    if history is not None:
+        await history.add(provider, ttft)
+    return stream, iterator, first
+
+
+async def _discard(task):
+    """Cancel a losing attempt and close its stream if it already opened."""
+    task.cancel()
+    try:
+        stream, _iterator, _first = await task
+    except BaseException:
+        return
+    await stream.close()
+
+
+async def hedged_response(policy, router, provider, backend, model, messages, call, estimate=0):
+    """Return a ``HedgedStream`` from the primary or, if it stalls, a hedge.
+
+    The hedge is charged ``estimate`` tokens on its provider's rate
+    limiter, and is not sent when that limiter has no budget left.
+    """
+    primary = asyncio.ensure_future(first_chunk(backend, messages, model, call, provider, policy.history))
+    delay = await policy.delay(provider)
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done:
+        bridge_metrics.incr("hedge.not_needed")
+        return HedgedStream(*primary.result(), "primary", backend, provider, model)
+
+    hedge_provider = policy.provider or provider
+    hedge_model = policy.model or model
+    try:
+        hedge_backend = router.backend(hedge_provider)
+    except Exception as e:
+        log(f"[WARN] Hedge provider {hedge_provider} unavailable: {e}", WARNING)
+        bridge_metrics.incr("hedge.unavailable")
+        return HedgedStream(*await primary, "primary", backend, provider, model)
+    limiter = router.limiter(hedge_provider)
+    if limiter is not None and not await limiter.charge(estimate, force=False):
+        log(f"[WARN] Not hedging: {hedge_provider} is at its rate limit", WARNING)
+        bridge_metrics.incr("hedge.rate_limited")
+        return HedgedStream(*await primary, "primary", backend, provider, model)
+
+    log(f"[✓] No chunk after {delay * 1000:.0f} ms; hedging to {hedge_provider} as {hedge_model}")
+    bridge_metrics.incr("hedge.fired")
+    hedge = asyncio.ensure_future(first_chunk(hedge_backend, messages, hedge_model, call, hedge_provider, policy.history))
+    attempts = {primary: "primary", hedge: "hedge"}
+    winners = {primary: (backend, provider, model), hedge: (hedge_backend, hedge_provider, hedge_model)}
+    pending = set(attempts)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    log(f"[WARN] {attempts[task]} attempt failed: {task.exception()}", WARNING)
+                    continue
+                label = attempts[task]
+                bridge_metrics.incr(f"hedge.won.{label}")
+                for other in attempts:
+                    if other is not task:
+                        if not other.done():
+                            bridge_metrics.incr("hedge.cancelled")
+                        await _discard(other)
+                return HedgedStream(*task.result(), label, *winners[task])
+        bridge_metrics.incr("hedge.failed")
+        raise primary.exception()
+    except asyncio.CancelledError:
+        for task in attempts:
+            await _discard(task)
+        raise
@@ -1,12 +1,113 @@
+import abc
+import asyncio
 import httpx
-import requests
 import openai
 import os
 import json
+import time
 import traceback
+import uuid
+
+import bridge_json
+from bridge_log import WARNING, log
+from chunk_trace import ReplayStream, read_trace
+from rate_limiter import RateLimiter
 
 OLLAMA_URL = "http://localhost:11434/api/chat"
 
+# One pooled transport is shared by every client in the process so that
+# turns served by a long-lived bridge reuse warm keep-alive connections.
+_http_client = None
+_openai_client = None
+_compatible_clients = {}
+
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def _max_retries():
+    """SDK-internal retries; set ``CODEX_BRIDGE_OPENAI_RETRIES=0`` to leave 429s to rate_limiter."""
+    return int(os.environ.get("CODEX_BRIDGE_OPENAI_RETRIES", 2))
+
+
+def http2_enabled():
+    """HTTP/2 is used when the optional ``h2`` package is installed."""
+    setting = os.environ.get("CODEX_BRIDGE_HTTP2", "auto").lower()
+    if setting in ("0", "false", "off", "no"):
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        if setting != "auto":
+            log("[WARN] CODEX_BRIDGE_HTTP2 set but the h2 package is missing; using HTTP/1.1", WARNING)
+        return False
+    return True
+
+
+def shared_http_client():
+    """Return the process-wide pooled ``httpx.AsyncClient``.
+
+    Pool size and timeouts can be tuned with ``CODEX_BRIDGE_MAX_CONNECTIONS``,
+    ``CODEX_BRIDGE_MAX_KEEPALIVE``, ``CODEX_BRIDGE_KEEPALIVE_EXPIRY``,
+    ``CODEX_BRIDGE_CONNECT_TIMEOUT`` and ``CODEX_BRIDGE_READ_TIMEOUT`` (seconds).
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        limits = httpx.Limits(
+            max_connections=int(_env_float("CODEX_BRIDGE_MAX_CONNECTIONS", 100)),
+            max_keepalive_connections=int(_env_float("CODEX_BRIDGE_MAX_KEEPALIVE", 20)),
+            keepalive_expiry=_env_float("CODEX_BRIDGE_KEEPALIVE_EXPIRY", 300.0),
+        )
+        timeout = httpx.Timeout(
+            connect=_env_float("CODEX_BRIDGE_CONNECT_TIMEOUT", 10.0),
+            read=_env_float("CODEX_BRIDGE_READ_TIMEOUT", 600.0),
+            write=_env_float("CODEX_BRIDGE_CONNECT_TIMEOUT", 10.0),
+            pool=_env_float("CODEX_BRIDGE_CONNECT_TIMEOUT", 10.0),
+        )
+        _http_client = httpx.AsyncClient(http2=http2_enabled(), limits=limits, timeout=timeout)
+    return _http_client
+
+
+def shared_openai_client():
+    """Return the process-wide ``AsyncOpenAI`` client on the shared transport."""
+    global _openai_client
+    if _openai_client is None or _http_client is None or _http_client.is_closed:
+        _openai_client = openai.AsyncOpenAI(
+            api_key=os.environ.get("OPENAI_API_KEY", ""),
+            http_client=shared_http_client(),
+            max_retries=_max_retries(),
+        )
+    return _openai_client
+
+
+def compatible_openai_client(base_url, api_key_env="OPENAI_API_KEY"):
+    """Return an ``AsyncOpenAI`` client for an OpenAI-compatible server.
+
+    One client is kept per (base_url, key variable), all on the shared transport.
+    """
+    key = (base_url, api_key_env)
+    client = _compatible_clients.get(key)
+    if client is None or _http_client is None or _http_client.is_closed:
+        client = openai.AsyncOpenAI(
+            base_url=base_url,
+            api_key=os.environ.get(api_key_env, "") or "unused",
+            http_client=shared_http_client(),
+            max_retries=_max_retries(),
+        )
+        _compatible_clients[key] = client
+    return client
+
+
+async def aclose_shared_clients():
+    global _http_client, _openai_client
+    if _http_client is not None:
+        await _http_client.aclose()
+    _http_client = None
+    _openai_client = None
+    _compatible_clients.clear()
+
 
 def wrap_tool_definition(tool):
     if tool.get("type") == "function" and "name" in tool:
@@ -20,44 +121,229 @@ def wrap_tool_definition(tool):
         }
     return tool
 
-class InvokeLLama:
-    def __init__(self, messages=None):
-        self.messages = []
-    
-    async def get_response(self, messages=None):
+def chat_chunk(resp_id, model, delta, finish_reason=None):
+    """Build one chat.completion.chunk dict, as the OpenAI stream yields them."""
+    return {
+        "id": resp_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+class ChunkStream:
+    """Wrap an async generator of chunks in the ``AsyncStream`` shape.
+
+    ``close`` also runs the optional cleanup coroutine, which matters when
+    the generator was never started and so cannot run its own ``finally``.
+    """
+
+    def __init__(self, agen, close=None):
+        self._agen = agen
+        self._close = close
+
+    def __aiter__(self):
+        return self._agen
+
+    async def close(self):
+        await self._agen.aclose()
+        if self._close is not None:
+            await self._close()
+
+
+class Backend(abc.ABC):
+    """Async chat backend.
+
+    ``get_response`` returns an async iterator of chat.completion chunks with
+    an async ``close()`` when ``stream`` is true, otherwise the completion as
+    a dict.
+    """
+
+    @abc.abstractmethod
+    async def get_response(self, messages=None, tools=None, stream=False, tool_choice="auto", model=None):
+        """Send ``messages`` to ``model`` and return the stream or completion."""
+
+
+def to_ollama_messages(messages):
+    """Convert chat-format messages to what Ollama's /api/chat expects.
+
+    Tool call arguments are sent as objects rather than JSON strings.
+    """
+    converted = []
+    for msg in messages:
+        tool_calls = msg.get("tool_calls")
+        if not tool_calls:
+            converted.append(msg if msg.get("content") is not None else {**msg, "content": ""})
+            continue
+        calls = []
+        for tc in tool_calls:
+            fn = tc.get("function") or {}
+            arguments = fn.get("arguments") or "{}"
+            if isinstance(arguments, str):
+                try:
+                    arguments = json.loads(arguments)
+                except ValueError:
+                    arguments = {}
+            calls.append({"function": {"name": fn.get("name"), "arguments": arguments}})
+        converted.append({"role": msg.get("role"), "content": msg.get("content") or "", "tool_calls": calls})
+    return converted
+
+
+def ollama_usage(data):
+    if "eval_count" not in data and "prompt_eval_count" not in data:
+        return None
+    prompt, completion = data.get("prompt_eval_count", 0), data.get("eval_count", 0)
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+
+class InvokeLLama(Backend):
+    """Ollama's native /api/chat, streamed as NDJSON on the shared client.
+
+    Each NDJSON line becomes a chat.completion chunk so the output goes
+    through the same translation as the OpenAI path.  ``keep_alive`` keeps
+    the model resident between turns; ``preload`` loads models up front.
+    """
+
+    def __init__(self, messages=None, model="llama3:latest", url=OLLAMA_URL, keep_alive="30m", options=None, preload=()):
+        self.messages = messages or []
+        self.model = model
+        self.url = url
+        self.keep_alive = keep_alive
+        self.options = options
+        self.preload_models = list(preload)
+
+    def _payload(self, messages, tools, stream, model):
+        payload = {
+            "model": model,
+            "messages": to_ollama_messages(messages),
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+        }
+        if tools:
+            payload["tools"] = [wrap_tool_definition(t) for t in tools]
+        if self.options:
+            payload["options"] = self.options
+        return payload
+
+    async def get_response(self, messages=None, tools=None, stream=False, tool_choice="auto", model=None):
         if messages is None:
             messages = self.messages
         else:
             self.messages = messages
+        model = self.model if model is None else model
+        payload = self._payload(messages, tools, stream, model)
+        resp_id = f"chatcmpl-ollama-{uuid.uuid4().hex[:12]}"
+        client = shared_http_client()
 
-        payload = {
-            "model": "llama3:latest",
-            "messages": messages,
-            "stream": False
-        }
+        if not stream:
+            response = await client.post(self.url, json=payload)
+            if response.status_code != 200:
+                raise RuntimeError(f"Ollama returned {response.status_code}: {response.text}")
+            data = response.json()
+            delta, finish_reason = self._delta(data, [0])
+            message = {"role": "assistant", "content": delta.get("content") or ""}
+            if delta.get("tool_calls"):
+                message["tool_calls"] = [{k: v for k, v in tc.items() if k != "index"} for tc in delta["tool_calls"]]
+            return {
+                "id": resp_id,
+                "object": "chat.completion",
+                "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason or "stop"}],
+                "usage": ollama_usage(data),
+            }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(OLLAMA_URL, json=payload)
+        response = await client.send(client.build_request("POST", self.url, json=payload), stream=True)
+        if response.status_code != 200:
+            body = await response.aread()
+            await response.aclose()
+            raise RuntimeError(f"Ollama returned {response.status_code}: {body.decode('utf-8', 'replace')}")
 
-        if response.status_code == 200:
-            data = response.json()
-            return data["message"]["content"]
-        else:
-            print("Error:", response.text)
+        async def chunks():
+            call_count = [0]
+            try:
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    data = bridge_json.loads(line)
+                    if data.get("error"):
+                        raise RuntimeError(f"Ollama error: {data['error']}")
+                    delta, finish_reason = self._delta(data, call_count)
+                    if delta or finish_reason:
+                        yield chat_chunk(resp_id, model, delta, finish_reason)
+                    if data.get("done"):
+                        usage = ollama_usage(data)
+                        if usage:
+                            yield {**chat_chunk(resp_id, model, {}), "choices": [], "usage": usage}
+                        return
+            finally:
+                await response.aclose()
+
+        return ChunkStream(chunks(), close=response.aclose)
+
+    @staticmethod
+    def _delta(data, call_count):
+        """Return ``(delta, finish_reason)`` for one Ollama response object."""
+        message = data.get("message") or {}
+        delta = {}
+        if message.get("content"):
+            delta["content"] = message["content"]
+        calls = []
+        for tc in message.get("tool_calls") or ():
+            fn = tc.get("function") or {}
+            arguments = fn.get("arguments")
+            calls.append(
+                {
+                    "index": call_count[0],
+                    "id": f"call_{uuid.uuid4().hex[:24]}",
+                    "type": "function",
+                    "function": {
+                        "name": fn.get("name"),
+                        "arguments": arguments if isinstance(arguments, str) else bridge_json.dumps(arguments or {}),
+                    },
+                }
+            )
+            call_count[0] += 1
+        if calls:
+            delta["tool_calls"] = calls
+        finish_reason = None
+        if data.get("done"):
+            finish_reason = "tool_calls" if call_count[0] else data.get("done_reason") or "stop"
+        return delta, finish_reason
+
+    async def preload(self, models=None):
+        """Load ``models`` into memory so the first turn skips the cold start."""
+        models = self.preload_models if models is None else models
+
+        async def load(name):
+            try:
+                response = await shared_http_client().post(
+                    self.url, json={"model": name, "messages": [], "keep_alive": self.keep_alive}
+                )
+                if response.status_code != 200:
+                    raise RuntimeError(f"status {response.status_code}: {response.text}")
+                log(f"[✓] Preloaded Ollama model {name}")
+            except Exception as e:
+                log(f"[WARN] Could not preload Ollama model {name}: {e}", WARNING)
+
+        await asyncio.gather(*(load(name) for name in models))
 
-class InvokeGPT:
-    def __init__(self, messages=None, model="gpt-4o-mini"):
+
+class InvokeGPT(Backend):
+    def __init__(self, messages=None, model="gpt-4o-mini", client=None, include_usage=True):
         self.messages = messages or []
         self.model = model
-        # Set OpenAI API key from environment if not already set
-        if not openai.api_key:
-            openai.api_key = os.environ.get("OPENAI_API_KEY", "")
+        self.client = client
+        self.include_usage = include_usage
 
 
-    def get_response(self, messages=None, tools=None, stream=False, tool_choice="auto", model=None):
+    async def get_response(self, messages=None, tools=None, stream=False, tool_choice="auto", model=None):
+        """Call chat completions on the shared async client.
 
-        with open("log.out", "a") as f:
-            f.write("Starting get_response in InvokeGPT\n")
+        Returns an async iterator of chunks when ``stream`` is true, otherwise
+        the completion as a dict.
+        """
+        log("Starting get_response in InvokeGPT")
         if messages is None:
             messages = self.messages
         else:
@@ -65,14 +351,238 @@ class InvokeGPT:
 
         wrapped_tools = [wrap_tool_definition(t) for t in tools] if tools else None
 
-        response = openai.chat.completions.create(
+        client = self.client or shared_openai_client()
+        kwargs = {}
+        if wrapped_tools:
+            kwargs["tools"] = wrapped_tools
+            kwargs["tool_choice"] = tool_choice
+        if stream and self.include_usage:
+            # Adds a final chunk with token usage (no choices) to the stream.
+            kwargs["stream_options"] = {"include_usage": True}
+        response = await client.chat.completions.create(
             model=self.model if model is None else model,
             messages=messages,
-            tools=wrapped_tools,
-            tool_choice=tool_choice,
             stream=stream,
+            **kwargs,
         )
-        with open("log.out", "a") as f:
-            f.write("Response received from OpenAI\n")
+        log("Response received from OpenAI")
+
+        if stream:
+            return response
+        return response.to_dict()
+
+
+class InvokeStub(Backend):
+    """Local backend that streams a fixed reply without any network access."""
+
+    def __init__(self, reply="This is a stub reply from the bridge.", delay=0.0, model="stub"):
+        self.reply = reply
+        self.delay = delay
+        self.model = model
+
+    async def get_response(self, messages=None, tools=None, stream=False, tool_choice="auto", model=None):
+        model = self.model if model is None else model
+        resp_id = f"chatcmpl-stub-{int(time.time() * 1000)}"
+        if not stream:
+            return {
+                "id": resp_id,
+                "object": "chat.completion",
+                "model": model,
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": self.reply}, "finish_reason": "stop"}
+                ],
+            }
+
+        async def chunks():
+            yield chat_chunk(resp_id, model, {"role": "assistant", "content": ""})
+            for i, word in enumerate(self.reply.split(" ")):
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                yield chat_chunk(resp_id, model, {"content": word if i == 0 else " " + word})
+            yield chat_chunk(resp_id, model, {}, "stop")
+            prompt = sum(len(str(m.get("content") or "")) for m in messages or ()) // 4
+            completion = len(self.reply.split(" "))
+            usage = {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+            yield {**chat_chunk(resp_id, model, {}), "choices": [], "usage": usage}
+
+        return ChunkStream(chunks())
+
+
+class InvokeReplay(Backend):
+    """Serve a recorded chunk trace (see chunk_trace.py) instead of calling a model.
+
+    ``speed`` scales the recorded timing: 1.0 replays at the original pace,
+    0 replays as fast as possible.
+    """
+
+    def __init__(self, trace_path, speed=1.0, model=None):
+        self.trace_path = trace_path
+        self.speed = speed
+        self.header, self.chunks = read_trace(trace_path)
+        self.model = model or self.header.get("model")
+
+    async def get_response(self, messages=None, tools=None, stream=False, tool_choice="auto", model=None):
+        log(f"Replaying {len(self.chunks)} chunks from {self.trace_path}")
+        return ReplayStream(self.chunks, speed=self.speed)
+
+
+PROVIDERS = {}
+
+
+def register_provider(kind, factory):
+    """Register ``factory(settings) -> Backend`` for provider entries of type ``kind``."""
+    PROVIDERS[kind] = factory
+
+
+def _openai_backend(settings):
+    if not os.environ.get("OPENAI_API_KEY"):
+        raise RuntimeError("OPENAI_API_KEY not set")
+    return InvokeGPT()
+
+
+def _compatible_backend(settings):
+    if "base_url" not in settings:
+        raise ValueError("openai-compatible provider needs a base_url")
+    client = compatible_openai_client(settings["base_url"], settings.get("api_key_env", "OPENAI_API_KEY"))
+    # Some compatible servers reject stream_options; "include_usage": false omits it.
+    return InvokeGPT(client=client, include_usage=settings.get("include_usage", True))
+
+
+def _ollama_backend(settings):
+    preload = settings.get("preload", os.environ.get("CODEX_BRIDGE_OLLAMA_PRELOAD", ""))
+    if isinstance(preload, str):
+        preload = [m.strip() for m in preload.split(",") if m.strip()]
+    return InvokeLLama(
+        url=settings.get("url", os.environ.get("OLLAMA_URL", OLLAMA_URL)),
+        keep_alive=settings.get("keep_alive", os.environ.get("CODEX_BRIDGE_OLLAMA_KEEP_ALIVE", "30m")),
+        options=settings.get("options"),
+        preload=preload,
+    )
+
+
+def _stub_backend(settings):
+    kwargs = {k: settings[k] for k in ("reply", "delay") if k in settings}
+    return InvokeStub(**kwargs)
+
+
+def _replay_backend(settings):
+    return InvokeReplay(settings["trace"], speed=float(settings.get("speed", 1.0)))
+
+
+register_provider("openai", _openai_backend)
+register_provider("openai-compatible", _compatible_backend)
+register_provider("ollama", _ollama_backend)
+register_provider("stub", _stub_backend)
+register_provider("replay", _replay_backend)
+
+DEFAULT_BACKENDS_PATH = os.path.expanduser("~/.codex/bridge_backends.json")
+DEFAULT_MODEL = "gpt-4o-mini"
+
+
+class BackendRouter:
+    """Pick the backend and upstream model name for a requested model.
+
+    The config (``CODEX_BRIDGE_BACKENDS``, default ``~/.codex/bridge_backends.json``)
+    names providers and maps model names to them::
+
+        {
+          "default": "openai",
+          "providers": {
+            "local": {"type": "ollama"},
+            "groq": {"type": "openai-compatible", "base_url": "https://api.groq.com/openai/v1",
+                     "api_key_env": "GROQ_API_KEY"}
+          },
+          "routes": {
+            "llama3*": "local",
+            "codex-mini-latest": {"provider": "openai", "model": "gpt-4o-mini"}
+          }
+        }
+
+    A model written ``provider/name`` goes straight to that provider.
+    Otherwise an exact route wins over the longest matching ``prefix*``
+    route (``*`` matches everything), and anything unmatched goes to the
+    default provider unchanged.  Without any ``routes``, every model goes
+    to the default provider as ``CODEX_BRIDGE_MODEL`` (default
+    ``gpt-4o-mini``): the CLI's own model names, such as
+    ``codex-mini-latest``, are Responses-only.  The built-in providers
+    ``openai``, ``ollama`` and ``stub`` need no config.
+    Optional ``hedge`` and ``stall`` sections are read by hedging.HedgePolicy
+    and stall_watchdog.StallPolicy, and a provider's ``rate_limit``
+    settings by rate_limiter.RateLimiter.
+    """
+
+    def __init__(self, config=None):
+        config = config or {}
+        self.default = config.get("default", "openai")
+        self.hedge = config.get("hedge")
+        self.stall = config.get("stall")
+        self.providers = {"openai": {"type": "openai"}, "ollama": {"type": "ollama"}, "stub": {"type": "stub"}}
+        self.providers.update(config.get("providers") or {})
+        self.routes = {}
+        self.prefixes = []
+        routes = config.get("routes") or {"*": {"model": os.environ.get("CODEX_BRIDGE_MODEL", DEFAULT_MODEL)}}
+        for pattern, target in routes.items():
+            if isinstance(target, str):
+                target = {"provider": target}
+            if pattern.endswith("*"):
+                self.prefixes.append((pattern[:-1], target))
+            else:
+                self.routes[pattern] = target
+        self.prefixes.sort(key=lambda item: len(item[0]), reverse=True)
+        self._backends = {}
+        self._limiters = {}
+
+    @classmethod
+    def from_env(cls):
+        path = os.environ.get("CODEX_BRIDGE_BACKENDS", DEFAULT_BACKENDS_PATH)
+        try:
+            with open(path, "rb") as f:
+                return cls(json.loads(f.read()))
+        except FileNotFoundError:
+            if "CODEX_BRIDGE_BACKENDS" in os.environ:
+                log(f"[WARN] Backend config {path} not found; using defaults", WARNING)
+            return cls()
+
+    def route(self, model):
+        """Return ``(provider_name, upstream_model)`` for ``model``."""
+        provider, sep, name = model.partition("/")
+        if sep and provider in self.providers:
+            return provider, name
+        target = self.routes.get(model)
+        if target is None:
+            target = next((t for prefix, t in self.prefixes if model.startswith(prefix)), None)
+        if target is None:
+            return self.default, model
+        return target.get("provider", self.default), target.get("model", model)
+
+    def backend(self, provider):
+        """Return the (cached) backend instance for a configured provider."""
+        backend = self._backends.get(provider)
+        if backend is None:
+            settings = self.providers.get(provider)
+            if settings is None:
+                raise ValueError(f"Unknown provider {provider!r}")
+            factory = PROVIDERS.get(settings.get("type", provider))
+            if factory is None:
+                raise ValueError(f"Provider {provider!r} has unknown type {settings.get('type')!r}")
+            backend = self._backends[provider] = factory(settings)
+        return backend
+
+    def limiter(self, provider):
+        """Return the (cached) rate limiter for ``provider``, or None if unlimited."""
+        if provider not in self._limiters:
+            self._limiters[provider] = RateLimiter.for_provider(provider, self.providers.get(provider))
+        return self._limiters[provider]
 
-        return response
\ No newline at end of file
+    async def preload(self):
+        """Warm every Ollama provider that lists models to preload."""
+        for name, settings in self.providers.items():
+            if settings.get("type", name) != "ollama":
+                continue
+            try:
+                backend = self.backend(name)
+            except Exception as e:
+                log(f"[WARN] Could not set up provider {name}: {e}", WARNING)
+                continue
+            if backend.preload_models:
+                await backend.preload()
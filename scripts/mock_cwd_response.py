@@ -1,28 +1,27 @@
 #!/usr/bin/env python3
-import json
+import os
 import sys
 import asyncio
-import subprocess
 
+import bridge_json
+from bridge_log import DEBUG, ERROR, WARNING, enabled as log_enabled, log
+from cancellation import Deadline, cancel_on_signals
 from invoke_llm import InvokeGPT
-
-def log(msg: str) -> None:
-    with open("log.out", "a") as f:
-        f.write(msg + "\n")
+from partial_json import PartialJSON
+from shell_tool import run_tool_calls, worker_limit
 
 async def main():
-    open("log.out", "w").close()
-    data_str = sys.stdin.read()
+    data_str = sys.stdin.buffer.read()
     if not data_str:
         sys.stderr.write("Expected request JSON on stdin\n")
         return
     log("[✓] Read input data from stdin")
-    log(data_str)
+    log(data_str.decode("utf-8", "replace"), DEBUG)
     try:
-        request = json.loads(data_str)
+        request = bridge_json.loads(data_str)
         log("[✓] Parsed JSON successfully")
     except Exception as e:
-        log(f"[ERROR] JSON parsing failed: {e}")
+        log(f"[ERROR] JSON parsing failed: {e}", ERROR)
         sys.stderr.write("Expected request JSON on stdin\n")
         return
     instructions = request.get("instructions", "")
@@ -36,129 +35,190 @@ async def main():
                     messages.append({"role": "user", "content": part.get("text", "")})
                     break
     log("[✓] Built message list")
+    deadline = Deadline.from_request(request)
+    # SIGTERM/SIGINT cancel the run; cancelled tool calls kill their process groups.
+    cancel_on_signals(asyncio.current_task().cancel)
 
     gpt = InvokeGPT()
-    chat_resp = await gpt.get_response(
-        messages,
-        tools=request.get("tools"),
-        model=request.get("model"),
-    )
-    log("[✓] Received base reply")
-
     resp_id = "resp_mock"
     msg_id = "msg_1"
 
-    call = chat_resp["choices"][0]["message"]["tool_calls"][0]
-    func_id = call["id"]
-    call_id = call["id"]
-    args = call["function"]["arguments"]
+    def write(evt):
+        if log_enabled(DEBUG):
+            log(f"[→] {evt.get('type')}", DEBUG)
+        sys.stdout.buffer.write(bridge_json.encode_event(evt) + b"\n")
+        sys.stdout.buffer.flush()
+
+    delay = float(os.environ.get("CODEX_BRIDGE_MOCK_EVENT_DELAY_MS", "50")) / 1000
 
     async def emit(evt):
-        log(f"[→] {evt.get('type')}")
-        print(json.dumps(evt), flush=True)
-        await asyncio.sleep(0.05)
+        write(evt)
+        if delay:
+            await asyncio.sleep(delay)
 
-    await emit({"type": "response.created", "response": {"id": resp_id, "status": "in_progress"}})
-    await emit({"type": "response.in_progress", "response": {"id": resp_id, "status": "in_progress"}})
+    async def get_response():
+        # Each model call is bounded by the request deadline like the tool runs.
+        async with asyncio.timeout_at(deadline.at):
+            return await gpt.get_response(
+                messages,
+                tools=request.get("tools"),
+                model=request.get("model"),
+            )
 
-    await emit({
-        "type": "response.output_item.added",
-        "output_index": 0,
-        "item": {"type": "function_call", "id": func_id, "status": "in_progress", "call_id": call_id, "name": "shell", "arguments": ""},
-    })
-    await emit({
-        "type": "response.function_call_arguments.delta",
-        "item_id": func_id,
-        "output_index": 0,
-        "content_index": 0,
-        "delta": args,
-    })
-    await emit({
-        "type": "response.function_call_arguments.done",
-        "item_id": func_id,
-        "output_index": 0,
-        "content_index": 0,
-        "arguments": args,
-    })
-    await emit({
-        "type": "response.output_item.done",
-        "output_index": 0,
-        "item": {"type": "function_call", "id": func_id, "status": "completed", "call_id": call_id, "name": "shell", "arguments": args},
-    })
+    # Each call's item is announced as its command starts, so its progress
+    # events never refer to a call the client has not seen; output_index
+    # follows start order, while the tool results below stay in call order.
+    output = []
+    items = {}
+    announcing = asyncio.Lock()
 
-    try:
-        call_args = json.loads(args)
-        cmd = call_args.get("command", [])
-        workdir = call_args.get("workdir")
-        timeout = call_args.get("timeout")
-    except Exception:
-        cmd = []
-        workdir = None
-        timeout = None
-
-    if isinstance(cmd, list):
-        try:
-            proc = subprocess.run(
-                cmd,
-                cwd=workdir,
-                timeout=(timeout / 1000) if isinstance(timeout, (int, float)) else None,
-                capture_output=True,
-                text=True,
+    async def announce_call(index, call):
+        func_id = call_id = call["id"]
+        name = call["function"]["name"]
+        args = call["function"]["arguments"]
+        item = {"type": "function_call", "id": func_id, "status": "completed", "call_id": call_id, "name": name, "arguments": args}
+        async with announcing:
+            output_index = len(output)
+            output.append(item)
+            items[index] = output_index, item
+            await emit({
+                "type": "response.output_item.added",
+                "output_index": output_index,
+                "item": {**item, "status": "in_progress", "arguments": ""},
+            })
+            await emit({
+                "type": "response.function_call_arguments.delta",
+                "item_id": func_id,
+                "output_index": output_index,
+                "content_index": 0,
+                "delta": args,
+            })
+            parsed = PartialJSON()
+            completed = parsed.feed(args)
+            if completed:
+                await emit({
+                    "type": "response.function_call_arguments.partial",
+                    "item_id": func_id,
+                    "output_index": output_index,
+                    "arguments": parsed.fields,
+                    "completed": completed,
+                })
+            await emit({
+                "type": "response.function_call_arguments.done",
+                "item_id": func_id,
+                "output_index": output_index,
+                "content_index": 0,
+                "arguments": args,
+            })
+
+    async def emit_call(index, call, result):
+        output_index, item = items[index]
+        await emit({
+            "type": "response.output_item.done",
+            "output_index": output_index,
+            "item": item,
+        })
+
+    def emit_progress(index, call, info):
+        # Bridge-specific: lets the client show a long-running command is alive.
+        write({"type": "response.function_call_output.progress", "call_id": call["id"], **info})
+
+    async def respond():
+        chat_resp = await get_response()
+        log("[✓] Received base reply")
+        reply = chat_resp["choices"][0]["message"]
+        calls = reply.get("tool_calls") or []
+
+        if calls:
+            workers = worker_limit(request.get("parallel_tool_calls", True))
+            log(f"[✓] Running {len(calls)} tool calls with {workers} workers")
+            results = await run_tool_calls(
+                calls,
+                workers=workers,
+                on_start=announce_call,
+                on_done=emit_call,
+                on_progress=emit_progress,
+                deadline=deadline,
             )
-            result = proc.stdout.strip()
-        except Exception as e:
-            result = str(e)
-    else:
-        result = ""
-
-    messages.append({"role": "tool", "tool_call_id": call_id, "content": result})
-    chat_resp2 = await gpt.get_response(
-        messages,
-        tools=request.get("tools"),
-        model=request.get("model"),
-    )
-    text = chat_resp2["choices"][0]["message"]["content"]
-    log(f"[✓] Built final text: {text}")
-
-    await emit({
-        "type": "response.output_item.added",
-        "output_index": 1,
-        "item": {"type": "message", "id": msg_id, "status": "in_progress", "role": "assistant", "content": [{"type": "output_text", "text": ""}]},
-    })
-    await emit({
-        "type": "response.output_text.delta",
-        "item_id": msg_id,
-        "output_index": 1,
-        "content_index": 0,
-        "delta": text,
-    })
-    await emit({
-        "type": "response.output_text.done",
-        "item_id": msg_id,
-        "output_index": 1,
-        "content_index": 0,
-        "text": text,
-    })
-    await emit({
-        "type": "response.output_item.done",
-        "output_index": 1,
-        "item": {"type": "message", "id": msg_id, "status": "completed", "role": "assistant", "content": [{"type": "output_text", "text": text}]},
-    })
-
-    await emit({
-        "type": "response.completed",
-        "response": {
-            "id": resp_id,
-            "status": "completed",
-            "model": chat_resp2["model"],
-            "output": [
-                {"type": "function_call", "id": func_id, "status": "completed", "call_id": call_id, "name": "shell", "arguments": args},
-                {"type": "message", "id": msg_id, "status": "completed", "role": "assistant", "content": [{"type": "output_text", "text": text}]},
-            ],
-            "parallel_tool_calls": False,
-        },
-    })
-    log("[✓] Response completed")
+
+            messages.append({"role": "assistant", "content": reply.get("content"), "tool_calls": calls})
+            for call, result in zip(calls, results):
+                messages.append({"role": "tool", "tool_call_id": call["id"], "content": result})
+            chat_resp2 = await get_response()
+        else:
+            chat_resp2 = chat_resp
+        text = chat_resp2["choices"][0]["message"]["content"]
+        log(f"[✓] Built final text: {text}")
+        msg_index = len(output)
+
+        await emit({
+            "type": "response.output_item.added",
+            "output_index": msg_index,
+            "item": {"type": "message", "id": msg_id, "status": "in_progress", "role": "assistant", "content": [{"type": "output_text", "text": ""}]},
+        })
+        await emit({
+            "type": "response.output_text.delta",
+            "item_id": msg_id,
+            "output_index": msg_index,
+            "content_index": 0,
+            "delta": text,
+        })
+        await emit({
+            "type": "response.output_text.done",
+            "item_id": msg_id,
+            "output_index": msg_index,
+            "content_index": 0,
+            "text": text,
+        })
+        await emit({
+            "type": "response.output_item.done",
+            "output_index": msg_index,
+            "item": {"type": "message", "id": msg_id, "status": "completed", "role": "assistant", "content": [{"type": "output_text", "text": text}]},
+        })
+
+        await emit({
+            "type": "response.completed",
+            "response": {
+                "id": resp_id,
+                "status": "completed",
+                "model": chat_resp2["model"],
+                "output": output + [
+                    {"type": "message", "id": msg_id, "status": "completed", "role": "assistant", "content": [{"type": "output_text", "text": text}]},
+                ],
+                "parallel_tool_calls": request.get("parallel_tool_calls", True),
+            },
+        })
+        log("[✓] Response completed")
+
+    await emit({"type": "response.created", "response": {"id": resp_id, "status": "in_progress"}})
+    await emit({"type": "response.in_progress", "response": {"id": resp_id, "status": "in_progress"}})
+    try:
+        await respond()
+    except asyncio.CancelledError:
+        log("[WARN] Request cancelled; aborted the model call and killed running tools", WARNING)
+        write({
+            "type": "response.failed",
+            "response": {
+                "id": resp_id,
+                "status": "failed",
+                "error": {"code": "cancelled", "message": "Request cancelled"},
+                "output": output,
+            },
+        })
+    except TimeoutError:
+        log("[WARN] Request deadline passed during a model call", WARNING)
+        write({
+            "type": "response.incomplete",
+            "response": {
+                "id": resp_id,
+                "status": "incomplete",
+                "incomplete_details": {"reason": "deadline_exceeded"},
+                "output": output,
+            },
+        })
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    except asyncio.CancelledError:
+        log("[WARN] Cancelled", WARNING)
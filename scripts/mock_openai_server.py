@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""Local stand-in for the OpenAI chat completions and embeddings endpoints.
+
+Serves ``POST /v1/chat/completions`` (streaming and non-streaming) and
+``POST /v1/embeddings`` so the bridge, the prompt analyzer and load tests
+can run on a disconnected box:
+
+    python3 mock_openai_server.py --port 18080 --profile realistic
+    OPENAI_BASE_URL=http://127.0.0.1:18080/v1 OPENAI_API_KEY=x python3 call_gpt.py < request.json
+
+Both ``InvokeGPT`` and ``cluster_prompts.embed_texts`` use the OpenAI SDK,
+which honours ``OPENAI_BASE_URL``.
+
+Replies are the fixed ``--reply`` text, ``--random-words`` of filler, or
+entries from a ``--script`` file (a JSON list, or one JSON value per line)
+played in turn.  A script entry is a string or an object with ``content``
+and/or ``tool_calls`` (``[{"name": ..., "arguments": {...}}]``).
+
+Timing and faults: ``--ttft``, ``--tokens-per-sec`` and ``--jitter`` (a
+fraction each delay varies by) shape the stream; ``--error-rate`` answers
+500, ``--rate-limit-rate`` answers 429 with ``retry-after``, and
+``--stall-rate`` pauses a stream for ``--stall-seconds`` partway through.
+``--profile`` loads a preset from ``PROFILES``; explicit flags override it.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import math
+import random
+import struct
+import time
+
+from bridge_server import BadRequest, read_http_request
+
+DEFAULT_REPLY = "This is a canned reply from the local mock OpenAI server."
+EMBEDDING_DIMENSIONS = 1536
+# Tool call arguments stream in pieces of this many characters.
+ARGUMENT_PIECE = 8
+
+PROFILES = {
+    "instant": {},
+    "realistic": {"ttft": 0.4, "tokens_per_sec": 60, "jitter": 0.3},
+    "slow": {"ttft": 2.0, "tokens_per_sec": 15, "jitter": 0.5},
+    "flaky": {
+        "ttft": 0.4,
+        "tokens_per_sec": 60,
+        "jitter": 0.3,
+        "error_rate": 0.05,
+        "rate_limit_rate": 0.05,
+        "stall_rate": 0.05,
+        "stall_seconds": 5.0,
+    },
+}
+
+WORDS = (
+    "the bridge streams tokens from a model while the agent runs tools and reads files "
+    "to answer questions about code tests build logs and configuration"
+).split()
+
+_ids = itertools.count()
+
+
+def split_tokens(text):
+    """Split text into word-sized pieces that keep their leading space."""
+    pieces = []
+    for i, word in enumerate(text.split(" ")):
+        pieces.append(word if i == 0 else " " + word)
+    return [p for p in pieces if p]
+
+
+def load_script(path):
+    """Read scripted replies from a JSON list or a file of JSON lines."""
+    with open(path) as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = [json.loads(line) for line in text.splitlines() if line.strip()]
+    return data if isinstance(data, list) else [data]
+
+
+def embed(text, dimensions=EMBEDDING_DIMENSIONS):
+    """Deterministic unit vector for ``text``: equal texts embed equally."""
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    vector = [rng.gauss(0, 1) for _ in range(dimensions)]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class MockOpenAIServer:
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=18080,
+        reply=DEFAULT_REPLY,
+        ttft=0.0,
+        tokens_per_sec=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        rate_limit_rate=0.0,
+        retry_after=1.0,
+        stall_rate=0.0,
+        stall_seconds=5.0,
+        script=None,
+        random_words=0,
+        seed=None,
+    ):
+        self.host = host
+        self.port = port
+        self.reply = reply
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.script = list(script or [])
+        self.random_words = random_words
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.stats = {"errors": 0, "rate_limited": 0, "stalls": 0, "embeddings": 0}
+        self._script_index = 0
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def _delay(self, seconds):
+        if not seconds or not self.jitter:
+            return seconds
+        return max(0.0, seconds * (1 + self.random.uniform(-self.jitter, self.jitter)))
+
+    def _next_reply(self):
+        """Return ``(content, tool_calls)`` for the next response."""
+        if self.script:
+            entry = self.script[self._script_index % len(self.script)]
+            self._script_index += 1
+            if isinstance(entry, str):
+                return entry, []
+            return entry.get("content") or "", entry.get("tool_calls") or []
+        if self.random_words:
+            count = self.random.randint(max(1, self.random_words // 2), self.random_words)
+            return " ".join(self.random.choice(WORDS) for _ in range(count)), []
+        return self.reply, []
+
+    async def _handle(self, reader, writer):
+        try:
+            try:
+                method, path, _headers, body = await read_http_request(reader)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, BadRequest):
+                return
+            self.requests += 1
+            route = path.split("?", 1)[0].rstrip("/")
+            if method != "POST" or not route.endswith(("/chat/completions", "/embeddings")):
+                await self._send_json(writer, 404, {"error": {"message": f"No route for {method} {path}"}})
+                return
+            if self.random.random() < self.rate_limit_rate:
+                self.stats["rate_limited"] += 1
+                await self._send_json(
+                    writer,
+                    429,
+                    {"error": {"message": "Rate limit reached (mock)", "type": "requests", "code": "rate_limit_exceeded"}},
+                    headers={"retry-after": f"{self.retry_after:g}"},
+                )
+                return
+            if self.random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                await self._send_json(writer, 500, {"error": {"message": "Injected server error (mock)", "type": "server_error"}})
+                return
+            request = json.loads(body or b"{}")
+            if route.endswith("/embeddings"):
+                await self._embeddings(writer, request)
+            else:
+                await self._chat_completions(writer, request)
+        except (ConnectionError, BrokenPipeError):
+            pass
+        finally:
+            writer.close()
+
+    async def _embeddings(self, writer, request):
+        inputs = request.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dimensions = request.get("dimensions") or EMBEDDING_DIMENSIONS
+        # The OpenAI SDK asks for base64 (packed float32) unless told otherwise.
+        if request.get("encoding_format") == "base64":
+            encode = lambda vector: base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode()
+        else:
+            encode = lambda vector: vector
+        self.stats["embeddings"] += len(inputs)
+        tokens = sum(len(str(text).split()) for text in inputs)
+        await self._send_json(
+            writer,
+            200,
+            {
+                "object": "list",
+                "model": request.get("model", "mock-embedding"),
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": encode(embed(str(text), dimensions))}
+                    for i, text in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            },
+        )
+
+    async def _chat_completions(self, writer, request):
+        model = request.get("model", "mock-model")
+        completion_id = f"chatcmpl-mock{next(_ids)}"
+        created = int(time.time())
+        content, tool_calls = self._next_reply()
+        tokens = split_tokens(content)
+        calls = [
+            {
+                "id": f"call_mock{next(_ids)}",
+                "type": "function",
+                "function": {
+                    "name": call["name"],
+                    "arguments": call["arguments"] if isinstance(call["arguments"], str) else json.dumps(call["arguments"]),
+                },
+            }
+            for call in tool_calls
+        ]
+        finish_reason = "tool_calls" if calls else "stop"
+        prompt_tokens = sum(len(str(m.get("content") or "")) // 4 for m in request.get("messages", []))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)}
+
+        if self.ttft:
+            await asyncio.sleep(self._delay(self.ttft))
+
+        if not request.get("stream"):
+            message = {"role": "assistant", "content": content or None}
+            if calls:
+                message["tool_calls"] = calls
+            await self._send_json(
+                writer,
+                200,
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                    "usage": usage,
+                },
+            )
+            return
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: close\r\n"
+            b"\r\n"
+        )
+
+        def chunk(delta, finish_reason=None):
+            return {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+
+        deltas = [{"content": token} for token in tokens]
+        for index, call in enumerate(calls):
+            fn = call["function"]
+            deltas.append(
+                {"tool_calls": [{"index": index, "id": call["id"], "type": "function", "function": {"name": fn["name"], "arguments": ""}}]}
+            )
+            arguments = fn["arguments"]
+            for start in range(0, len(arguments), ARGUMENT_PIECE):
+                piece = arguments[start : start + ARGUMENT_PIECE]
+                deltas.append({"tool_calls": [{"index": index, "function": {"arguments": piece}}]})
+
+        stall_at = self.random.randrange(len(deltas)) if deltas and self.random.random() < self.stall_rate else None
+        interval = 1.0 / self.tokens_per_sec if self.tokens_per_sec else 0.0
+        await self._send_event(writer, chunk({"role": "assistant", "content": ""}))
+        for i, delta in enumerate(deltas):
+            if i == stall_at:
+                self.stats["stalls"] += 1
+                await asyncio.sleep(self.stall_seconds)
+            if interval:
+                await asyncio.sleep(self._delay(interval))
+            await self._send_event(writer, chunk(delta))
+        await self._send_event(writer, chunk({}, finish_reason))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            await self._send_event(writer, {**chunk({}), "choices": [], "usage": usage})
+        writer.write(b"data: [DONE]\n\n")
+        await writer.drain()
+
+    async def _send_event(self, writer, payload):
+        writer.write(b"data: " + json.dumps(payload).encode() + b"\n\n")
+        await writer.drain()
+
+    async def _send_json(self, writer, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        reason = {200: "OK", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error"}.get(status, "Error")
+        extra = "".join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+        writer.write(
+            (
+                f"HTTP/1.1 {status} {reason}\r\n"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"{extra}"
+                "Connection: close\r\n"
+                "\r\n"
+            ).encode()
+            + body
+        )
+        await writer.drain()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Local mock of the OpenAI chat completions and embeddings API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--profile", choices=sorted(PROFILES), help="Preset for timing and fault injection.")
+    parser.add_argument("--reply", default=DEFAULT_REPLY, help="Assistant text to stream back.")
+    parser.add_argument("--script", help="JSON or JSON-lines file of replies to play in turn.")
+    parser.add_argument("--random-words", type=int, default=0, help="Reply with up to N random words instead of --reply.")
+    parser.add_argument("--seed", type=int, help="Seed for jitter, faults and random replies.")
+    parser.add_argument("--ttft", type=float, help="Seconds before the first chunk.")
+    parser.add_argument("--tokens-per-sec", type=float, help="Streaming rate; 0 sends as fast as possible.")
+    parser.add_argument("--jitter", type=float, help="Fraction by which each delay varies at random.")
+    parser.add_argument("--error-rate", type=float, help="Probability of answering 500.")
+    parser.add_argument("--rate-limit-rate", type=float, help="Probability of answering 429.")
+    parser.add_argument("--retry-after", type=float, help="retry-after seconds sent with a 429.")
+    parser.add_argument("--stall-rate", type=float, help="Probability that a stream stalls partway through.")
+    parser.add_argument("--stall-seconds", type=float, help="Length of an injected stall.")
+    return parser.parse_args(argv)
+
+
+def server_from_args(args):
+    settings = dict(PROFILES.get(args.profile) or {})
+    for name in ("ttft", "tokens_per_sec", "jitter", "error_rate", "rate_limit_rate", "retry_after", "stall_rate", "stall_seconds"):
+        value = getattr(args, name)
+        if value is not None:
+            settings[name] = value
+    return MockOpenAIServer(
+        args.host,
+        args.port,
+        reply=args.reply,
+        script=load_script(args.script) if args.script else None,
+        random_words=args.random_words,
+        seed=args.seed,
+        **settings,
+    )
+
+
+async def main():
+    server = server_from_args(parse_args())
+    await server.start()
+    print(f"Mock OpenAI server listening on {server.base_url}", flush=True)
+    await server.serve_forever()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,169 @@
+"""Resumable JSON parsing for streamed tool-call arguments.
+
+Upstreams send function-call ``arguments`` as a string in tiny fragments
+(``'{"'``, ``'command'``, ``'":["'``, ``'ls'`` ...).  ``PartialJSON``
+consumes those fragments as they arrive and keeps its place between them,
+so each byte is scanned once.  Members of the top-level object are
+exposed in ``fields`` as soon as their value is complete -- the whole
+``command`` array is available before ``timeout`` has arrived -- which
+lets the bridge and the CLI look at a command before the call finishes.
+
+Values only become visible once complete: a half-received string or an
+unclosed nested array never appears in ``fields``.  Malformed input sets
+``failed`` and the rest of the stream is ignored; the caller still has
+the raw argument string.
+"""
+import json
+import re
+
+_STRING_STOP = re.compile(r'["\\]')
+_SCALAR = re.compile(r"[-+.0-9eEa-z]*")
+_WHITESPACE = " \t\r\n"
+_SCALAR_START = "-0123456789tfn"
+
+# Frame states.  Objects: KEY (after "{": key or "}"), KEY_ONLY (after
+# ","), COLON, VALUE, NEXT ("," or "}").  Arrays: VALUE (after "[":
+# value or "]"), VALUE_ONLY (after ","), NEXT ("," or "]").
+KEY, KEY_ONLY, COLON, VALUE, VALUE_ONLY, NEXT = range(6)
+
+
+class PartialJSON:
+    def __init__(self):
+        self.value = None
+        self.fields = {}
+        self.done = False
+        self.failed = False
+        self._stack = []  # [container, state, pending key]
+        self._string = None  # raw pieces of the string being read
+        self._string_is_key = False
+        self._escape = False
+        self._scalar = None  # text of the number/literal being read
+        self._completed = []
+
+    def feed(self, text):
+        """Consume the next fragment; return the top-level keys it completed."""
+        self._completed = []
+        i, n = 0, len(text)
+        while i < n and not self.failed:
+            if self._string is not None:
+                i = self._read_string(text, i)
+            elif self._scalar is not None:
+                m = _SCALAR.match(text, i)
+                self._scalar += m.group()
+                i = m.end()
+                if i < n:
+                    self._end_scalar()
+            else:
+                c = text[i]
+                i += 1
+                if c not in _WHITESPACE:
+                    self._structural(c)
+        return self._completed
+
+    def _read_string(self, text, i):
+        if self._escape:
+            # The escaped character (or the first hex digit of \\uXXXX,
+            # which is never a quote) is kept raw for json.loads below.
+            self._string.append(text[i])
+            self._escape = False
+            return i + 1
+        m = _STRING_STOP.search(text, i)
+        if m is None:
+            self._string.append(text[i:])
+            return len(text)
+        j = m.start()
+        if text[j] == "\\":
+            self._string.append(text[i : j + 1])
+            self._escape = True
+            return j + 1
+        self._string.append(text[i:j])
+        raw, self._string = "".join(self._string), None
+        try:
+            value = json.loads(f'"{raw}"')
+        except ValueError:
+            self.failed = True
+            return j + 1
+        if self._string_is_key:
+            self._stack[-1][1] = COLON
+            self._stack[-1][2] = value
+        else:
+            self._add(value)
+        return j + 1
+
+    def _end_scalar(self):
+        text, self._scalar = self._scalar, None
+        try:
+            value = json.loads(text)
+        except ValueError:
+            self.failed = True
+            return
+        self._add(value)
+
+    def _structural(self, c):
+        frame = self._stack[-1] if self._stack else None
+        state = frame[1] if frame else (None if self.done else VALUE_ONLY)
+        is_object = frame is not None and isinstance(frame[0], dict)
+        # Only an array that was just opened is in VALUE, so "]" closes it.
+        if state is None:
+            self.failed = True  # trailing data after the root value
+        elif state in (VALUE, VALUE_ONLY):
+            if c == "]" and state == VALUE:
+                self._close()
+            else:
+                self._start_value(c)
+        elif state in (KEY, KEY_ONLY):
+            if c == '"':
+                self._string, self._string_is_key = [], True
+            elif c == "}" and state == KEY:
+                self._close()
+            else:
+                self.failed = True
+        elif state == COLON:
+            if c == ":":
+                frame[1] = VALUE_ONLY
+            else:
+                self.failed = True
+        elif c == ",":
+            frame[1] = KEY_ONLY if is_object else VALUE_ONLY
+        elif c == ("}" if is_object else "]"):
+            self._close()
+        else:
+            self.failed = True
+
+    def _start_value(self, c):
+        if c == "{":
+            self._push({})
+        elif c == "[":
+            self._push([])
+        elif c == '"':
+            self._string, self._string_is_key = [], False
+        elif c in _SCALAR_START:
+            self._scalar = c
+        else:
+            self.failed = True
+
+    def _push(self, container):
+        if not self._stack and isinstance(container, dict):
+            # Completed members are only ever inserted, so the root object
+            # is exactly the set of finished top-level fields.
+            self.fields = container
+        self._stack.append([container, KEY if isinstance(container, dict) else VALUE, None])
+
+    def _close(self):
+        container = self._stack.pop()[0]
+        self._add(container)
+
+    def _add(self, value):
+        if not self._stack:
+            self.value = value
+            self.done = True
+            return
+        frame = self._stack[-1]
+        container = frame[0]
+        if isinstance(container, dict):
+            container[frame[2]] = value
+            if len(self._stack) == 1:
+                self._completed.append(frame[2])
+        else:
+            container.append(value)
+        frame[1] = NEXT
@@ -0,0 +1,236 @@
+"""Cross-process request and token rate limiting per provider.
+
+Every bridge process (one-shot or ``--serve``) using a provider shares a
+small JSON state file, updated under ``flock``.  It holds two token
+buckets (requests/min and tokens/min), the processes' in-flight calls and
+an AIMD concurrency limit: each successful call raises it by ``1/limit``,
+each 429 halves it and blocks new calls until the ``retry-after`` time.
+Callers that cannot proceed wait in ``acquire`` instead of failing.
+Extra upstream calls made under a slot already held -- hedged duplicates
+and stall retries -- are charged to the buckets with ``charge``.  The
+state file is read and written in a worker thread, since ``flock`` can
+wait on another process and must not hold up the event loop.
+
+Limits come from the provider's ``rate_limit`` settings in the backend
+config (``{"rpm": 500, "tpm": 200000, "max_concurrency": 8}``) or from
+the environment; the limiter is off unless one of them is set:
+
+``CODEX_BRIDGE_RPM``              requests per minute
+``CODEX_BRIDGE_TPM``              tokens per minute (prompt estimate plus output allowance)
+``CODEX_BRIDGE_MAX_CONCURRENCY``  upper bound for the AIMD limit (default 16)
+``CODEX_BRIDGE_RATE_RETRIES``     429s retried per request before giving up (default 5)
+``CODEX_BRIDGE_RATE_DIR``         state directory (default ~/.codex/bridge_rate)
+
+The OpenAI SDK retries 429s on its own before the limiter sees them; set
+``CODEX_BRIDGE_OPENAI_RETRIES=0`` to let the limiter do all the backing off.
+"""
+import asyncio
+import fcntl
+import json
+import os
+import time
+
+import bridge_metrics
+from bridge_log import WARNING, log
+
+DEFAULT_RATE_DIR = os.path.expanduser("~/.codex/bridge_rate")
+POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 1.0
+DEFAULT_RETRY_AFTER = 1.0
+
+
+def retry_after(exc):
+    """Seconds to back off if ``exc`` is a rate-limit response, else None."""
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    if status != 429:
+        return None
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return DEFAULT_RETRY_AFTER
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class RateLimiter:
+    def __init__(self, path, name="default", rpm=None, tpm=None, max_concurrency=16, max_retries=5):
+        self.path = path
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._cleanup = set()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    @classmethod
+    def for_provider(cls, provider, settings=None):
+        """Limiter for ``provider``, or None when no limit is configured."""
+        config = dict((settings or {}).get("rate_limit") or {})
+        env = os.environ
+        for key, var in (("rpm", "CODEX_BRIDGE_RPM"), ("tpm", "CODEX_BRIDGE_TPM"), ("max_concurrency", "CODEX_BRIDGE_MAX_CONCURRENCY")):
+            if key not in config and env.get(var):
+                config[key] = float(env[var])
+        if not config:
+            return None
+        safe = "".join(c for c in provider if c.isalnum() or c in "-_") or "default"
+        return cls(
+            os.path.join(env.get("CODEX_BRIDGE_RATE_DIR", DEFAULT_RATE_DIR), f"{safe}.json"),
+            name=provider,
+            rpm=config.get("rpm"),
+            tpm=config.get("tpm"),
+            max_concurrency=int(config.get("max_concurrency", 16)),
+            max_retries=int(env.get("CODEX_BRIDGE_RATE_RETRIES", 5)),
+        )
+
+    async def _run(self, change):
+        """``_update`` in a worker thread."""
+        return await asyncio.get_running_loop().run_in_executor(None, self._update, change)
+
+    def _update(self, change):
+        """Apply ``change(state, now)`` to the shared state under the file lock."""
+        with open(self.path, "a+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            raw = f.read()
+            try:
+                state = json.loads(raw) if raw else {}
+            except ValueError:
+                state = {}
+            now = time.time()
+            self._refill(state, now)
+            result = change(state, now)
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(state).encode())
+            return result
+
+    def _refill(self, state, now):
+        elapsed = max(0.0, now - state.get("at", now))
+        state["at"] = now
+        if self.rpm:
+            state["requests"] = min(self.rpm, state.get("requests", self.rpm) + elapsed * self.rpm / 60)
+        if self.tpm:
+            state["tokens"] = min(self.tpm, state.get("tokens", self.tpm) + elapsed * self.tpm / 60)
+        state.setdefault("limit", float(self.max_concurrency))
+        inflight = state.setdefault("inflight", {})
+        for pid in [p for p in inflight if not _alive(int(p))]:
+            del inflight[pid]
+
+    async def _try_acquire(self, tokens):
+        def change(state, now):
+            blocked = state.get("blocked_until", 0) - now
+            if blocked > 0:
+                return blocked
+            if sum(state["inflight"].values()) >= max(1, int(state["limit"])):
+                return POLL_INTERVAL
+            if self.rpm and state["requests"] < 1:
+                return (1 - state["requests"]) * 60 / self.rpm
+            need = min(tokens, self.tpm) if self.tpm else 0
+            if self.tpm and state["tokens"] < need:
+                return (need - state["tokens"]) * 60 / self.tpm
+            if self.rpm:
+                state["requests"] -= 1
+            if self.tpm:
+                state["tokens"] -= need
+            pid = str(os.getpid())
+            state["inflight"][pid] = state["inflight"].get(pid, 0) + 1
+            return 0.0
+
+        # Cancelling the caller does not stop the worker thread, which may
+        # still take a slot; the shield lets us see that and give it back.
+        update = asyncio.ensure_future(self._run(change))
+        try:
+            return await asyncio.shield(update)
+        except asyncio.CancelledError:
+            update.add_done_callback(self._release_abandoned)
+            raise
+
+    def _release_abandoned(self, update):
+        if update.cancelled() or update.exception() is not None or update.result() > 0:
+            return
+        log(f"[WARN] Returning a {self.name} slot taken by a cancelled request", WARNING)
+        task = asyncio.ensure_future(self.release(ok=False))
+        self._cleanup.add(task)
+        task.add_done_callback(self._cleanup.discard)
+
+    async def acquire(self, tokens=0):
+        """Wait until a request of about ``tokens`` tokens may be sent."""
+        start = time.monotonic()
+        while True:
+            wait = await self._try_acquire(tokens)
+            if wait <= 0:
+                break
+            await asyncio.sleep(min(wait, MAX_POLL_INTERVAL))
+        waited = time.monotonic() - start
+        bridge_metrics.observe(f"rate.wait_ms.{self.name}", waited * 1000)
+        if waited > MAX_POLL_INTERVAL:
+            log(f"[✓] Rate limiter held request for {waited:.1f}s")
+        return waited
+
+    async def charge(self, tokens=0, force=True):
+        """Take a request and ``tokens`` from the buckets without taking a slot.
+
+        Unless ``force``, nothing is taken and False returned when the
+        buckets cannot cover it or the provider is backing off; a forced
+        charge may leave the buckets in debt.
+        """
+
+        def change(state, now):
+            need = min(tokens, self.tpm) if self.tpm else 0
+            if not force and (
+                state.get("blocked_until", 0) > now
+                or (self.rpm and state["requests"] < 1)
+                or (self.tpm and state["tokens"] < need)
+            ):
+                return False
+            if self.rpm:
+                state["requests"] -= 1
+            if self.tpm:
+                state["tokens"] -= need
+            return True
+
+        charged = await self._run(change)
+        if charged:
+            bridge_metrics.incr(f"rate.charged.{self.name}")
+        return charged
+
+    async def release(self, ok=True, backoff=None):
+        """Return a slot taken by ``acquire``.
+
+        ``ok`` grows the concurrency limit; ``backoff`` (seconds, from a 429)
+        halves it and pauses every process until the backoff has passed.
+        """
+
+        def change(state, now):
+            pid = str(os.getpid())
+            if state["inflight"].get(pid, 0) > 1:
+                state["inflight"][pid] -= 1
+            else:
+                state["inflight"].pop(pid, None)
+            if backoff is not None:
+                state["limit"] = max(1.0, state["limit"] / 2)
+                state["blocked_until"] = max(state.get("blocked_until", 0), now + backoff)
+            elif ok:
+                state["limit"] = min(float(self.max_concurrency), state["limit"] + 1 / state["limit"])
+            return state["limit"]
+
+        limit = await self._run(change)
+        bridge_metrics.set_gauge(f"rate.concurrency.{self.name}", limit)
+        if backoff is not None:
+            bridge_metrics.incr(f"rate.limited.{self.name}")
+            log(f"[WARN] Rate limited by {self.name}; backing off {backoff:.1f}s, concurrency now {limit:.1f}", WARNING)
@@ -0,0 +1,173 @@
+"""Content-addressed on-disk cache of bridged response streams.
+
+CI and evaluation reruns send byte-identical payloads through the bridge.
+When the cache is enabled, the full event stream of every completed
+response is stored under a hash of everything that determines the model's
+output (messages, model, tools, tool choice and sampling parameters) and
+replayed on an identical request, either at the recorded pace or
+immediately.
+
+Entries are ``<key>.jsonl`` files: a header line followed by one
+``[seconds_since_start, event]`` line per event.  Reads refresh the file's
+mtime, and writes evict least recently used entries once the directory
+exceeds its size budget.  Entries older than the TTL are treated as misses.
+Entries can be several megabytes, so ``get`` and ``put`` read, write and
+evict in a worker thread rather than on the event loop.
+
+Environment:
+
+``CODEX_BRIDGE_CACHE``            set to 1 to enable
+``CODEX_BRIDGE_CACHE_DIR``        directory (default ``~/.cache/codex-bridge/responses``)
+``CODEX_BRIDGE_CACHE_MAX_BYTES``  size budget (default 256 MiB)
+``CODEX_BRIDGE_CACHE_TTL``        seconds before an entry expires (default 7 days, 0 = never)
+``CODEX_BRIDGE_CACHE_PACING``     ``none`` (default) or ``original``
+``CODEX_BRIDGE_CACHE_BYPASS``     set to 1 to skip lookups but still refresh entries
+
+A request can also skip the lookup with ``"bypass_cache": true``.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+from bridge_log import WARNING, log
+
+SAMPLING_PARAMS = (
+    "temperature",
+    "top_p",
+    "max_tokens",
+    "max_completion_tokens",
+    "seed",
+    "stop",
+    "n",
+    "presence_penalty",
+    "frequency_penalty",
+    "logit_bias",
+    "response_format",
+    "parallel_tool_calls",
+    "reasoning_effort",
+)
+
+
+def canonical_hash(obj) -> str:
+    data = json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _truthy(value) -> bool:
+    return str(value).lower() in ("1", "true", "yes", "on")
+
+
+class ResponseCache:
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, ttl=7 * 24 * 3600, pacing="none"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.pacing = pacing
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        """Return a cache configured from the environment, or None if disabled."""
+        env = os.environ
+        if not _truthy(env.get("CODEX_BRIDGE_CACHE", "")):
+            return None
+        return cls(
+            env.get("CODEX_BRIDGE_CACHE_DIR") or os.path.expanduser("~/.cache/codex-bridge/responses"),
+            max_bytes=int(env.get("CODEX_BRIDGE_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+            ttl=float(env.get("CODEX_BRIDGE_CACHE_TTL", 7 * 24 * 3600)),
+            pacing=env.get("CODEX_BRIDGE_CACHE_PACING", "none"),
+        )
+
+    @staticmethod
+    def bypassed(request) -> bool:
+        return bool(request.get("bypass_cache")) or _truthy(os.environ.get("CODEX_BRIDGE_CACHE_BYPASS", ""))
+
+    @staticmethod
+    def key(request, messages, model, fmt="chat") -> str:
+        """Hash of every request field that affects the upstream output."""
+        return canonical_hash(
+            {
+                "messages": messages,
+                "model": model,
+                "tools": request.get("tools"),
+                "tool_choice": request.get("tool_choice", "auto"),
+                "params": {name: request[name] for name in SAMPLING_PARAMS if name in request},
+                "format": fmt,
+            }
+        )
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.jsonl")
+
+    async def get(self, key):
+        """Return the recorded ``[(offset, event), ...]`` for ``key`` or None."""
+        return await asyncio.get_running_loop().run_in_executor(None, self._get, key)
+
+    async def put(self, key, entries):
+        """Store ``[(offset, event), ...]`` atomically and enforce the size budget."""
+        await asyncio.get_running_loop().run_in_executor(None, self._put, key, entries)
+
+    def _get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                header = json.loads(f.readline())
+                if self.ttl and time.time() - header.get("created", 0) > self.ttl:
+                    raise FileNotFoundError(path)
+                entries = [tuple(json.loads(line)) for line in f if line.strip()]
+        except FileNotFoundError:
+            self._remove(path)
+            return None
+        except (OSError, ValueError) as e:
+            log(f"[WARN] Dropping unreadable cache entry {key}: {e}", WARNING)
+            self._remove(path)
+            return None
+        os.utime(path)
+        return entries
+
+    def _put(self, key, entries):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"created": time.time(), "events": len(entries)}) + "\n")
+            for offset, evt in entries:
+                f.write(json.dumps([round(offset, 6), evt]) + "\n")
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the directory fits in ``max_bytes``."""
+        files = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".jsonl"):
+                    continue
+                st = entry.stat()
+                files.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        files.sort()
+        for _mtime, size, path in files:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    async def replay(self, entries):
+        """Yield recorded events, sleeping between them when pacing is ``original``."""
+        start = time.monotonic()
+        for offset, evt in entries:
+            if self.pacing == "original":
+                delay = offset - (time.monotonic() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield evt
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
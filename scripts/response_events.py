@@ -0,0 +1,325 @@
+"""Incremental translation of chat.completion chunks into Responses API events.
+
+``ResponseTranslator`` is a small state machine: every chunk fed to it
+returns the events that chunk makes available, so text and tool-call
+argument deltas reach the client as soon as the upstream produces them
+instead of after ``finish_reason``.  The event shapes match what
+``mock_cwd_response.py`` emits.
+
+Tool-call arguments are also parsed as they stream: whenever a member of
+the arguments object completes, a bridge-specific
+``response.function_call_arguments.partial`` event carries the parsed
+members so far, so a client can inspect ``command`` before the call ends.
+Token usage from the stream's usage chunk, and the ``timings`` the caller
+sets, are attached to ``response.completed``.
+
+A call is closed (``output_item.done``) as soon as it is provably
+complete -- its arguments parse as a whole object or the next call has
+started -- rather than at ``finish_reason``, so the client can approve
+and run the first command while later ones are still generating.
+"""
+import uuid
+
+from partial_json import PartialJSON
+
+
+def gen_id(prefix: str) -> str:
+    return f"{prefix}_{uuid.uuid4().hex[:8]}"
+
+
+def responses_usage(usage):
+    """Convert chat.completions usage to the Responses API shape."""
+    prompt = usage.get("prompt_tokens") or 0
+    completion = usage.get("completion_tokens") or 0
+    return {
+        "input_tokens": prompt,
+        "input_tokens_details": {"cached_tokens": (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0},
+        "output_tokens": completion,
+        "output_tokens_details": {
+            "reasoning_tokens": (usage.get("completion_tokens_details") or {}).get("reasoning_tokens") or 0
+        },
+        "total_tokens": usage.get("total_tokens") or prompt + completion,
+    }
+
+
+class ResponseTranslator:
+    def __init__(self, resp_id=None, model=None):
+        self.resp_id = resp_id or gen_id("resp")
+        self.model = model
+        self.finish_reason = None
+        self.usage = None
+        self.timings = None
+        self._message = None
+        self._calls = {}
+        self._next_index = 0
+        self._done_items = []
+
+    @property
+    def output(self):
+        """Completed output items, in output_index order."""
+        return [item for _, item in sorted(self._done_items, key=lambda pair: pair[0])]
+
+    def assistant_message(self):
+        """The completed output as a chat message, for replaying the history."""
+        text = "".join(
+            part.get("text", "")
+            for item in self.output
+            if item["type"] == "message"
+            for part in item["content"]
+        )
+        message = {"role": "assistant", "content": text or None}
+        tool_calls = [
+            {
+                "id": item["call_id"],
+                "type": "function",
+                "function": {"name": item["name"], "arguments": item["arguments"]},
+            }
+            for item in self.output
+            if item["type"] == "function_call"
+        ]
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        return message
+
+    def start(self):
+        """Events that open the response, before any chunk arrives."""
+        response = {"id": self.resp_id, "status": "in_progress"}
+        return [
+            {"type": "response.created", "response": dict(response)},
+            {"type": "response.in_progress", "response": dict(response)},
+        ]
+
+    def feed(self, chunk):
+        """Consume one chat.completion chunk dict and return the new events."""
+        events = []
+        if chunk.get("model"):
+            self.model = chunk["model"]
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+        for choice in chunk.get("choices") or []:
+            delta = choice.get("delta") or {}
+
+            content = delta.get("content")
+            if content:
+                events.extend(self._text_delta(content))
+
+            for tc in delta.get("tool_calls") or []:
+                events.extend(self._tool_call_delta(tc))
+
+            if choice.get("finish_reason"):
+                self.finish_reason = choice["finish_reason"]
+                events.extend(self._close_all())
+        return events
+
+    def finish(self):
+        """Close any open items and return the terminal response event."""
+        events = self._close_all()
+        if not self._done_items:
+            return events + self.failed("empty_response", "No output received from model")
+        events.append(
+            {
+                "type": "response.completed",
+                "response": {
+                    "id": self.resp_id,
+                    "status": "completed",
+                    "model": self.model,
+                    "output": self.output,
+                    "parallel_tool_calls": len(self._calls) > 1,
+                    "usage": responses_usage(self.usage) if self.usage else None,
+                    # Bridge-specific: ttft_ms, duration_ms, output_tokens_per_sec.
+                    "timings": self.timings,
+                },
+            }
+        )
+        return events
+
+    def failed(self, code, message):
+        """The terminal event for a response that could not be produced."""
+        return [
+            {
+                "type": "response.failed",
+                "response": {
+                    "id": self.resp_id,
+                    "status": "failed",
+                    "model": self.model,
+                    "error": {"code": code, "message": message},
+                    "output": self.output,
+                },
+            }
+        ]
+
+    def incomplete(self, reason):
+        """Close open items and end the response early, e.g. at its deadline."""
+        events = self._close_all()
+        events.append(
+            {
+                "type": "response.incomplete",
+                "response": {
+                    "id": self.resp_id,
+                    "status": "incomplete",
+                    "model": self.model,
+                    "incomplete_details": {"reason": reason},
+                    "output": self.output,
+                },
+            }
+        )
+        return events
+
+    def _claim_index(self):
+        index = self._next_index
+        self._next_index += 1
+        return index
+
+    def _text_delta(self, content):
+        events = []
+        msg = self._message
+        if msg is None or msg["done"]:
+            msg = self._message = {
+                "id": gen_id("msg"),
+                "output_index": self._claim_index(),
+                "text": "",
+                "done": False,
+            }
+            events.append(
+                {
+                    "type": "response.output_item.added",
+                    "output_index": msg["output_index"],
+                    "item": {
+                        "type": "message",
+                        "id": msg["id"],
+                        "status": "in_progress",
+                        "role": "assistant",
+                        "content": [{"type": "output_text", "text": ""}],
+                    },
+                }
+            )
+        msg["text"] += content
+        events.append(
+            {
+                "type": "response.output_text.delta",
+                "item_id": msg["id"],
+                "output_index": msg["output_index"],
+                "content_index": 0,
+                "delta": content,
+            }
+        )
+        return events
+
+    def _tool_call_delta(self, tc):
+        events = []
+        fn = tc.get("function") or {}
+        idx = tc.get("index", 0)
+        call = self._calls.get(idx)
+        if call is None:
+            # Text that precedes a tool call is complete once the call
+            # begins, and so is every earlier call: upstreams stream calls
+            # one index at a time.
+            events.extend(self._close_message())
+            for other in self._calls.values():
+                events.extend(self._close_call(other))
+            call = self._calls[idx] = {
+                "id": gen_id("fc"),
+                "call_id": tc.get("id") or gen_id("call"),
+                "name": fn.get("name") or "",
+                "arguments": "",
+                "parsed": PartialJSON(),
+                "output_index": self._claim_index(),
+                "done": False,
+            }
+            events.append(
+                {
+                    "type": "response.output_item.added",
+                    "output_index": call["output_index"],
+                    "item": self._call_item(call, "in_progress", arguments=""),
+                }
+            )
+        elif fn.get("name"):
+            call["name"] = fn["name"]
+
+        args = fn.get("arguments")
+        if args and call["done"]:
+            # Closed because its arguments already parsed as a whole object;
+            # anything after that can only be whitespace.
+            return events
+        if args:
+            call["arguments"] += args
+            events.append(
+                {
+                    "type": "response.function_call_arguments.delta",
+                    "item_id": call["id"],
+                    "output_index": call["output_index"],
+                    "content_index": 0,
+                    "delta": args,
+                }
+            )
+            completed = call["parsed"].feed(args)
+            if completed:
+                events.append(
+                    {
+                        "type": "response.function_call_arguments.partial",
+                        "item_id": call["id"],
+                        "output_index": call["output_index"],
+                        "arguments": dict(call["parsed"].fields),
+                        "completed": completed,
+                    }
+                )
+            if call["parsed"].done:
+                events.extend(self._close_call(call))
+        return events
+
+    def _call_item(self, call, status, arguments=None):
+        return {
+            "type": "function_call",
+            "id": call["id"],
+            "status": status,
+            "call_id": call["call_id"],
+            "name": call["name"],
+            "arguments": call["arguments"] if arguments is None else arguments,
+        }
+
+    def _close_message(self):
+        msg = self._message
+        if msg is None or msg["done"]:
+            return []
+        msg["done"] = True
+        item = {
+            "type": "message",
+            "id": msg["id"],
+            "status": "completed",
+            "role": "assistant",
+            "content": [{"type": "output_text", "text": msg["text"]}],
+        }
+        self._done_items.append((msg["output_index"], item))
+        return [
+            {
+                "type": "response.output_text.done",
+                "item_id": msg["id"],
+                "output_index": msg["output_index"],
+                "content_index": 0,
+                "text": msg["text"],
+            },
+            {"type": "response.output_item.done", "output_index": msg["output_index"], "item": item},
+        ]
+
+    def _close_call(self, call):
+        if call["done"]:
+            return []
+        call["done"] = True
+        item = self._call_item(call, "completed")
+        self._done_items.append((call["output_index"], item))
+        return [
+            {
+                "type": "response.function_call_arguments.done",
+                "item_id": call["id"],
+                "output_index": call["output_index"],
+                "content_index": 0,
+                "arguments": call["arguments"],
+            },
+            {"type": "response.output_item.done", "output_index": call["output_index"], "item": item},
+        ]
+
+    def _close_all(self):
+        events = self._close_message()
+        for idx in sorted(self._calls):
+            events.extend(self._close_call(self._calls[idx]))
+        return events
@@ -0,0 +1,226 @@
+"""Run the model's ``shell`` tool calls as asyncio subprocesses.
+
+``run_tool_calls`` starts every call at once, bounded by a worker limit,
+reports each one as it finishes and returns the results in call order,
+so independent commands take as long as the slowest rather than the sum.
+
+Output is read incrementally into a head+tail buffer, so memory and the
+follow-up request stay bounded however much a command prints; the middle
+is replaced by a truncation marker.
+
+Each command runs in its own process group, and a timeout, the request's
+deadline or cancellation kills the whole group, so commands that spawn
+children do not outlive the call.
+
+``CODEX_BRIDGE_TOOL_WORKERS``       worker limit (default 8)
+``CODEX_BRIDGE_TOOL_OUTPUT_BYTES``  stdout kept per call (default 32 KiB; stderr gets a quarter)
+``CODEX_BRIDGE_TOOL_PROGRESS_MS``   minimum interval between progress callbacks (default 500)
+"""
+import asyncio
+import json
+import os
+import signal
+import time
+
+from bridge_log import WARNING, log
+
+DEFAULT_WORKERS = 8
+DEFAULT_OUTPUT_BYTES = 32 * 1024
+DEFAULT_PROGRESS_MS = 500
+READ_SIZE = 64 * 1024
+
+
+def worker_limit(parallel=True):
+    """Concurrent tool calls allowed; 1 when the request disables parallel calls."""
+    if not parallel:
+        return 1
+    return max(1, int(os.environ.get("CODEX_BRIDGE_TOOL_WORKERS", DEFAULT_WORKERS)))
+
+
+def parse_shell_args(arguments):
+    """Return ``(command, workdir, timeout_seconds)`` from a call's JSON arguments."""
+    try:
+        call_args = json.loads(arguments) if isinstance(arguments, str) else dict(arguments or {})
+    except ValueError:
+        return [], None, None
+    timeout = call_args.get("timeout")
+    return (
+        call_args.get("command", []),
+        call_args.get("workdir"),
+        timeout / 1000 if isinstance(timeout, (int, float)) else None,
+    )
+
+
+class HeadTailBuffer:
+    """Keep the first and last ``max_bytes / 2`` bytes of a byte stream."""
+
+    def __init__(self, max_bytes):
+        self.head_cap = max_bytes // 2
+        self.tail_cap = max_bytes - self.head_cap
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data):
+        self.total += len(data)
+        room = self.head_cap - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            excess = len(self.tail) - self.tail_cap
+            if excess > 0:
+                del self.tail[:excess]
+
+    @property
+    def dropped(self):
+        return self.total - len(self.head) - len(self.tail)
+
+    def last_line(self, limit=200):
+        data = self.tail or self.head
+        line = bytes(data).rstrip(b"\n").rsplit(b"\n", 1)[-1]
+        return line[-limit:].decode("utf-8", "replace")
+
+    def text(self):
+        head = bytes(self.head).decode("utf-8", "replace")
+        tail = bytes(self.tail).decode("utf-8", "replace")
+        if not self.dropped:
+            return head + tail
+        return f"{head}\n[... {self.dropped} bytes truncated ...]\n{tail}"
+
+
+def output_limit():
+    return int(os.environ.get("CODEX_BRIDGE_TOOL_OUTPUT_BYTES", DEFAULT_OUTPUT_BYTES))
+
+
+def format_output(stdout, stderr, returncode):
+    """Build the tool message content from the captured streams."""
+    text = stdout.text().strip()
+    err = stderr.text().strip()
+    if err:
+        text = f"{text}\n[stderr]\n{err}" if text else f"[stderr]\n{err}"
+    if returncode:
+        text = f"{text}\n[exit code {returncode}]" if text else f"[exit code {returncode}]"
+    return text
+
+
+def kill_group(proc):
+    """Kill ``proc`` and everything it started; it leads its own session."""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+async def run_shell(arguments, on_progress=None, max_bytes=None, deadline=None):
+    """Run one shell call and return its output, capped at ``max_bytes``.
+
+    stdout and stderr are read as they are produced into head+tail buffers,
+    so a chatty command never holds more than the cap in memory.
+    ``on_progress(info)`` is called at most every ``CODEX_BRIDGE_TOOL_PROGRESS_MS``
+    while output arrives, with the bytes seen so far and the latest line.
+    The call's own timeout is shortened to what is left of ``deadline``.
+    """
+    cmd, workdir, timeout = parse_shell_args(arguments)
+    if deadline is not None:
+        timeout = deadline.remaining(timeout)
+    if not isinstance(cmd, list) or not cmd:
+        return ""
+    max_bytes = max_bytes or output_limit()
+    interval = float(os.environ.get("CODEX_BRIDGE_TOOL_PROGRESS_MS", DEFAULT_PROGRESS_MS)) / 1000
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            cwd=workdir,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+        )
+    except Exception as e:
+        return str(e)
+
+    stdout, stderr = HeadTailBuffer(max_bytes), HeadTailBuffer(max_bytes // 4)
+    start = time.monotonic()
+    last_progress = start
+
+    async def pump(reader, buffer):
+        nonlocal last_progress
+        while True:
+            data = await reader.read(READ_SIZE)
+            if not data:
+                return
+            buffer.write(data)
+            now = time.monotonic()
+            if on_progress is not None and now - last_progress >= interval:
+                last_progress = now
+                on_progress(
+                    {
+                        "bytes": stdout.total + stderr.total,
+                        "elapsed_ms": int((now - start) * 1000),
+                        "line": buffer.last_line(),
+                    }
+                )
+
+    async def communicate():
+        await asyncio.gather(pump(proc.stdout, stdout), pump(proc.stderr, stderr))
+        return await proc.wait()
+
+    try:
+        returncode = await asyncio.wait_for(communicate(), timeout)
+    except asyncio.TimeoutError:
+        kill_group(proc)
+        await proc.wait()
+        partial = format_output(stdout, stderr, None)
+        return f"{partial}\nCommand timed out after {timeout} seconds".lstrip("\n")
+    except BaseException:
+        kill_group(proc)
+        if proc.returncode is None:
+            await proc.wait()
+        raise
+    if stdout.dropped or stderr.dropped:
+        log(f"[✓] Truncated tool output of {stdout.total + stderr.total} bytes to the {max_bytes} byte cap")
+    return format_output(stdout, stderr, returncode)
+
+
+async def run_tool_call(call, on_progress=None, deadline=None):
+    fn = call.get("function") or {}
+    if fn.get("name") != "shell":
+        log(f"[WARN] Unsupported tool {fn.get('name')!r}", WARNING)
+        return f"Unsupported tool: {fn.get('name')}"
+    return await run_shell(fn.get("arguments") or "{}", on_progress=on_progress, deadline=deadline)
+
+
+async def run_tool_calls(calls, workers=DEFAULT_WORKERS, on_start=None, on_done=None, on_progress=None, deadline=None):
+    """Run ``calls`` concurrently and return their results in call order.
+
+    ``on_start(index, call)`` is awaited as each call starts, before any of
+    its progress; ``on_done(index, call, result)`` is awaited as each call
+    finishes; ``on_progress(index, call, info)`` is called while a call
+    produces output.
+    """
+    semaphore = asyncio.Semaphore(workers)
+
+    async def run(index, call):
+        progress = None
+        if on_progress is not None:
+            progress = lambda info: on_progress(index, call, info)
+        async with semaphore:
+            if on_start is not None:
+                await on_start(index, call)
+            return index, await run_tool_call(call, on_progress=progress, deadline=deadline)
+
+    results = [None] * len(calls)
+    tasks = [asyncio.ensure_future(run(i, call)) for i, call in enumerate(calls)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            index, result = await finished
+            results[index] = result
+            if on_done is not None:
+                await on_done(index, calls[index], result)
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Wait for cancelled calls to kill their processes before returning.
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return results
@@ -0,0 +1,264 @@
+"""Recover from upstream streams that go quiet part-way through.
+
+Once a response has started, a gap between chunks longer than the stall
+threshold counts as a stall: the stream is closed and the request is sent
+again, up to ``retries`` times.  The client keeps seeing one consistent
+stream:
+
+``retry``   the request is repeated as is; the new stream's text and tool
+            arguments are skipped until they pass what was already sent.
+            A new attempt is a fresh sample, so if it does not reproduce
+            the sent output exactly the response ends as stalled rather
+            than joining two different generations.
+``resume``  the partial assistant text is sent back and the model is asked
+            to continue from it, so nothing is generated twice.  Falls back
+            to ``retry`` once a tool call has started.
+
+Configured by a ``"stall"`` section in the backend config, e.g.
+``{"timeout_ms": 20000, "retries": 1, "mode": "resume"}``, or by the
+environment, which takes precedence:
+
+``CODEX_BRIDGE_STALL_MS``       gap counted as a stall (default 30000; ``off`` disables)
+``CODEX_BRIDGE_STALL_RETRIES``  new attempts per request (default 2)
+``CODEX_BRIDGE_STALL_MODE``     ``retry`` or ``resume`` (default ``retry``)
+
+The wait for the very first chunk is left to hedging and the request
+deadline.  Counted in bridge_metrics as ``stall.detected.<provider>``,
+``stall.recovered.<provider>`` and ``stall.failed.<provider>``, and
+``stall.recovery_ms.<provider>`` observes the time from a stall to the
+first new chunk the client receives.
+"""
+import asyncio
+import os
+import time
+
+import bridge_metrics
+from bridge_log import WARNING, log
+
+DEFAULT_TIMEOUT_MS = 30000
+RESUME_PROMPT = (
+    "Your previous reply was cut off. Continue it from exactly where it stopped, "
+    "without repeating any of it."
+)
+
+
+class StreamStalled(Exception):
+    """The upstream stalled and could not be recovered."""
+
+
+class StallPolicy:
+    def __init__(self, timeout_ms=DEFAULT_TIMEOUT_MS, retries=2, mode="retry"):
+        self.timeout_ms = float(timeout_ms)
+        self.retries = int(retries)
+        self.mode = mode
+
+    @classmethod
+    def from_env(cls, config=None):
+        """Policy from ``config`` overridden by the environment, or None if disabled."""
+        config = dict(config or {})
+        for key, name in (("timeout_ms", "MS"), ("retries", "RETRIES"), ("mode", "MODE")):
+            if f"CODEX_BRIDGE_STALL_{name}" in os.environ:
+                config[key] = os.environ[f"CODEX_BRIDGE_STALL_{name}"]
+        if str(config.get("timeout_ms", DEFAULT_TIMEOUT_MS)) in ("", "0", "off"):
+            return None
+        return cls(**config)
+
+    @property
+    def timeout(self):
+        return self.timeout_ms / 1000
+
+
+class SentOutput:
+    """What the client has been sent, used to trim a repeated stream.
+
+    ``admit`` passes a chunk through unchanged until a stall; after
+    ``restart`` it returns only the part of each chunk beyond what was
+    already sent, or None when nothing new remains.  It raises
+    ``StreamStalled`` when the new attempt differs from what was sent.
+    """
+
+    def __init__(self):
+        self.id = None
+        self.text_len = 0
+        self._parts = []
+        self._args = {}
+        self._sent_text = None
+        self._pos = None
+        self._arg_pos = None
+        self._replayed = ()
+
+    def text(self):
+        return "".join(self._parts)
+
+    @property
+    def tool_calls_started(self):
+        return bool(self._args)
+
+    def restart(self, resume):
+        """Start trimming a new attempt; ``resume`` continues after the sent text."""
+        self._sent_text = self.text()
+        self._pos = self.text_len if resume else 0
+        self._arg_pos = {}
+        self._replayed = dict(self._args)
+
+    def admit(self, chunk):
+        if self.id is None:
+            self.id = chunk.get("id")
+        choices = chunk.get("choices") or []
+        if self._pos is None:
+            for choice in choices:
+                delta = choice.get("delta") or {}
+                if delta.get("content"):
+                    self._parts.append(delta["content"])
+                    self.text_len += len(delta["content"])
+                for tc in delta.get("tool_calls") or []:
+                    self._record_args(tc.get("index", 0), (tc.get("function") or {}).get("arguments") or "")
+            return chunk
+
+        kept = []
+        for choice in choices:
+            delta = dict(choice.get("delta") or {})
+            delta.pop("role", None)
+            if delta.get("content"):
+                fresh = self._fresh_text(delta["content"])
+                if fresh:
+                    delta["content"] = fresh
+                else:
+                    del delta["content"]
+            calls = [tc for tc in (self._fresh_call(tc) for tc in delta.pop("tool_calls", None) or []) if tc]
+            if calls:
+                delta["tool_calls"] = calls
+            if choice.get("finish_reason"):
+                self._check_reproduced()
+            if any(v is not None for v in delta.values()) or choice.get("finish_reason"):
+                kept.append({**choice, "delta": delta})
+        if not kept and not chunk.get("usage"):
+            return None
+        # Keep the first attempt's id so the client sees a single response.
+        return {**chunk, "id": self.id or chunk.get("id"), "choices": kept}
+
+    def _fresh_text(self, content):
+        start = self._pos
+        self._pos += len(content)
+        overlap = max(0, min(self.text_len, self._pos) - start)
+        if overlap and content[:overlap] != self._sent_text[start : start + overlap]:
+            raise StreamStalled("the retried stream's text differs from the text already sent")
+        fresh = content[overlap:]
+        if fresh:
+            self._parts.append(fresh)
+            self.text_len += len(fresh)
+        return fresh
+
+    def _fresh_call(self, tc):
+        index = tc.get("index", 0)
+        sent = self._replayed.get(index)
+        if sent is None:
+            # A call the client has not seen yet passes through whole.
+            self._record_args(index, (tc.get("function") or {}).get("arguments") or "")
+            return tc
+        fn = {k: v for k, v in (tc.get("function") or {}).items() if k != "name"}
+        # The client already has this call's id and name.
+        tc = {k: v for k, v in tc.items() if k not in ("id", "type")}
+        args = fn.pop("arguments", None) or ""
+        start = self._arg_pos.get(index, 0)
+        self._arg_pos[index] = start + len(args)
+        overlap = max(0, min(len(sent), start + len(args)) - start)
+        if overlap and args[:overlap] != sent[start : start + overlap]:
+            raise StreamStalled(f"the retried stream's arguments for tool call {index} differ from those already sent")
+        if args[overlap:]:
+            fn["arguments"] = args[overlap:]
+            self._record_args(index, fn["arguments"])
+        if not fn:
+            return None
+        return {**tc, "function": fn}
+
+    def _check_reproduced(self):
+        """A finished attempt must have covered everything already sent."""
+        if self._pos < self.text_len:
+            raise StreamStalled("the retried stream ended before reproducing the text already sent")
+        for index, sent in self._replayed.items():
+            if self._arg_pos.get(index, 0) < len(sent):
+                raise StreamStalled(f"the retried stream ended before reproducing tool call {index}")
+
+    def _record_args(self, index, args):
+        self._args[index] = self._args.get(index, "") + args
+
+
+class StallWatchdog:
+    """An upstream stream that is reopened through ``reopen`` when it stalls.
+
+    ``reopen(messages)`` must return a new stream for ``messages``.
+    """
+
+    def __init__(self, stream, reopen, policy, messages, provider):
+        self.stream = stream
+        self.reopen = reopen
+        self.policy = policy
+        self.messages = messages
+        self.provider = provider
+        self.stalls = 0
+        self.sent = SentOutput()
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        iterator = aiter(self.stream)
+        watching = False
+        stalled_at = None
+        while True:
+            try:
+                async with asyncio.timeout(self.policy.timeout if watching else None):
+                    chunk = await anext(iterator)
+            except StopAsyncIteration:
+                return
+            except TimeoutError:
+                stalled_at = time.monotonic()
+                iterator = await self._restart()
+                continue
+            watching = True
+            if hasattr(chunk, "to_dict"):
+                chunk = chunk.to_dict()
+            try:
+                chunk = self.sent.admit(chunk)
+            except StreamStalled:
+                bridge_metrics.incr(f"stall.failed.{self.provider}")
+                raise
+            if chunk is None:
+                continue
+            if stalled_at is not None:
+                bridge_metrics.incr(f"stall.recovered.{self.provider}")
+                bridge_metrics.observe(f"stall.recovery_ms.{self.provider}", (time.monotonic() - stalled_at) * 1000)
+                stalled_at = None
+            yield chunk
+
+    async def _restart(self):
+        bridge_metrics.incr(f"stall.detected.{self.provider}")
+        self.stalls += 1
+        await self.stream.close()
+        if self.stalls > self.policy.retries:
+            bridge_metrics.incr(f"stall.failed.{self.provider}")
+            raise StreamStalled(f"no chunk for {self.policy.timeout_ms:.0f} ms after {self.policy.retries} retries")
+
+        resume = self.policy.mode == "resume" and self.sent.text_len and not self.sent.tool_calls_started
+        messages = self.messages
+        if resume:
+            messages = messages + [
+                {"role": "assistant", "content": self.sent.text()},
+                {"role": "user", "content": RESUME_PROMPT},
+            ]
+        log(
+            f"[WARN] Upstream stalled for {self.policy.timeout_ms:.0f} ms; "
+            f"{'resuming' if resume else 'retrying'} (attempt {self.stalls} of {self.policy.retries})",
+            WARNING,
+        )
+        try:
+            self.stream = await self.reopen(messages)
+        except Exception:
+            bridge_metrics.incr(f"stall.failed.{self.provider}")
+            raise
+        self.sent.restart(resume)
+        return aiter(self.stream)
+
+    async def close(self):
+        await self.stream.close()
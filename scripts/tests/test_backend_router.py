@@ -0,0 +1,77 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from invoke_llm import BackendRouter, InvokeGPT, InvokeStub
+
+CONFIG = {
+    "default": "openai",
+    "providers": {
+        "local": {"type": "ollama"},
+        "compat": {"type": "openai-compatible", "base_url": "http://127.0.0.1:9/v1"},
+        "canned": {"type": "stub", "reply": "hello there"},
+    },
+    "routes": {
+        "llama3*": "local",
+        "llama3.1-big*": "compat",
+        "codex-mini-latest": {"provider": "openai", "model": "gpt-4o-mini"},
+    },
+}
+
+
+class BackendRouterTests(unittest.TestCase):
+    def test_routes_by_name_prefix_and_provider(self):
+        router = BackendRouter(CONFIG)
+        self.assertEqual(router.route("codex-mini-latest"), ("openai", "gpt-4o-mini"))
+        self.assertEqual(router.route("llama3:8b"), ("local", "llama3:8b"))
+        self.assertEqual(router.route("llama3.1-big:70b"), ("compat", "llama3.1-big:70b"))
+        self.assertEqual(router.route("canned/anything"), ("canned", "anything"))
+        self.assertEqual(router.route("gpt-4.1"), ("openai", "gpt-4.1"))
+
+    def test_unconfigured_router_sends_default_model(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop("CODEX_BRIDGE_MODEL", None)
+            self.assertEqual(BackendRouter().route("codex-mini-latest"), ("openai", "gpt-4o-mini"))
+            self.assertEqual(BackendRouter({"providers": {}}).route("o4-mini"), ("openai", "gpt-4o-mini"))
+            os.environ["CODEX_BRIDGE_MODEL"] = "gpt-4.1"
+            router = BackendRouter()
+            self.assertEqual(router.route("codex-mini-latest"), ("openai", "gpt-4.1"))
+            self.assertEqual(router.route("stub/demo"), ("stub", "demo"))
+
+    def test_backends_are_built_once(self):
+        router = BackendRouter(CONFIG)
+        backend = router.backend("compat")
+        self.assertIsInstance(backend, InvokeGPT)
+        self.assertIs(router.backend("compat"), backend)
+        with self.assertRaises(ValueError):
+            router.backend("missing")
+
+    def test_loads_config_file(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump(CONFIG, f)
+        self.addCleanup(os.unlink, f.name)
+        with mock.patch.dict(os.environ, {"CODEX_BRIDGE_BACKENDS": f.name}):
+            self.assertEqual(BackendRouter.from_env().route("llama3")[0], "local")
+
+    def test_stub_streams_chunks(self):
+        async def collect():
+            stream = await InvokeStub(reply="a b c").get_response([], stream=True)
+            chunks = [c async for c in stream]
+            await stream.close()
+            return chunks
+
+        chunks = asyncio.run(collect())
+        text = "".join(c["choices"][0]["delta"].get("content") or "" for c in chunks if c["choices"])
+        self.assertEqual(text, "a b c")
+        self.assertEqual(chunks[-2]["choices"][0]["finish_reason"], "stop")
+        self.assertEqual(chunks[-1]["usage"]["completion_tokens"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
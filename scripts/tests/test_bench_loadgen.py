@@ -0,0 +1,50 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench.loadgen import drive, load_corpus, report
+
+
+class LoadgenTests(unittest.TestCase):
+    def test_load_corpus_skips_non_requests(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as f:
+            f.write(json.dumps({"messages": [{"role": "user", "content": "hi"}]}) + "\n")
+            f.write(json.dumps({"request_id": "user-001", "title": "not a bridge input"}) + "\n")
+            f.write("not json\n")
+            f.write(json.dumps({"input": []}) + "\n")
+        self.addCleanup(os.unlink, f.name)
+        self.assertEqual(len(load_corpus(f.name)), 2)
+
+    def test_closed_loop_respects_concurrency(self):
+        active = {"now": 0, "peak": 0}
+
+        async def send(data):
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+            await asyncio.sleep(0.01)
+            active["now"] -= 1
+            if data == b"bad":
+                raise RuntimeError("boom")
+            return 1.0, 2.0, True
+
+        results = asyncio.run(drive(send, [b"a", b"bad"], concurrency=3, requests=10))
+        self.assertEqual(len(results), 10)
+        self.assertEqual(active["peak"], 3)
+        row = report("process", results, 1.0, 50.0, 30.0)
+        self.assertEqual((row["errors"], row["throughput_rps"], row["cpu_ms_per_session"]), (5, 5.0, 5.0))
+
+    def test_open_loop_sends_requested_count(self):
+        async def send(data):
+            return 1.0, 2.0, True
+
+        results = asyncio.run(drive(send, [b"a"], rate=1000, requests=20))
+        self.assertEqual(len(results), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench.stats import baseline_scale, compare, percentile, summarize
+
+
+class BenchStatsTests(unittest.TestCase):
+    def test_percentiles(self):
+        values = list(range(1, 101))
+        self.assertEqual(summarize(values), {"n": 100, "p50": 50, "p95": 95, "p99": 99})
+        self.assertEqual(percentile([3.0], 99), 3.0)
+
+    def test_compare_flags_only_real_regressions(self):
+        baseline = {"small": {"total": {"p50": 100.0}, "emit_event": {"p50": 0.01}}}
+        results = {"small": {"total": {"p50": 130.0}, "emit_event": {"p50": 0.02}, "new_stage": {"p50": 1.0}}}
+        self.assertEqual(compare(results, baseline, threshold=0.2), [("small", "total", 100.0, 130.0)])
+
+    def test_compare_scales_baseline_to_this_machine(self):
+        baseline = {"calibration_ms": 2.0, "results": {"small": {"total": {"p50": 100.0}}}}
+        results = {"small": {"total": {"p50": 130.0}}}
+        # This machine runs the calibration workload twice as slow.
+        scale = baseline_scale(baseline, 4.0)
+        self.assertEqual(scale, 2.0)
+        self.assertEqual(compare(results, baseline, threshold=0.2, scale=scale), [])
+        self.assertEqual(baseline_scale({"small": {}}, 4.0), 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import importlib.util
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import bridge_json
+
+EVENTS = [
+    {"type": "response.created", "response": {"id": "resp_1", "status": "in_progress"}},
+    {"type": "response.in_progress", "response": {"status": "in_progress", "id": "resp_1"}},
+    {"type": "response.output_text.delta", "item_id": "msg_1", "output_index": 0, "content_index": 0, "delta": 'tø "ken"\n'},
+    {"type": "response.function_call_arguments.delta", "item_id": "fc_1", "output_index": 2, "content_index": 0, "delta": '{"command":'},
+    {"type": "response.output_text.delta", "item_id": "msg_1", "output_index": 0, "content_index": 0, "delta": "x", "extra": 1},
+    {"type": "response.created", "response": {"id": "resp_1", "status": "in_progress", "model": "m"}},
+    {"id": "c1", "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": "hi"}}]},
+    # Half of a surrogate pair, as a stream split inside an emoji can leave.
+    {"type": "response.output_text.delta", "item_id": "msg_1", "output_index": 0, "content_index": 0, "delta": "a\ud83d"},
+    {"type": "response.output_text.done", "item_id": "msg_1", "text": "ok \ud83d"},
+]
+
+
+def installed(module):
+    return importlib.util.find_spec(module) is not None
+
+
+class BridgeJsonTests(unittest.TestCase):
+    def tearDown(self):
+        bridge_json._select("auto")
+
+    def check_backend(self, backend):
+        bridge_json._select(backend)
+        self.assertEqual(bridge_json.BACKEND, backend)
+        for evt in EVENTS:
+            encoded = bridge_json.encode_event(evt)
+            self.assertIsInstance(encoded, bytes)
+            encoded.decode("utf-8")
+            self.assertEqual(json.loads(encoded), evt, (backend, evt))
+        self.assertEqual(bridge_json.loads(b'{"a": [1, "\\u00f8"]}'), {"a": [1, "ø"]})
+
+    def test_stdlib_round_trips_events(self):
+        self.check_backend("json")
+
+    @unittest.skipUnless(installed("orjson"), "orjson is not installed")
+    def test_orjson_round_trips_events(self):
+        self.check_backend("orjson")
+
+    @unittest.skipUnless(installed("msgspec"), "msgspec is not installed")
+    def test_msgspec_round_trips_events(self):
+        self.check_backend("msgspec")
+
+    def test_stdlib_templates_match_generic_encoding(self):
+        bridge_json._select("json")
+        for evt in EVENTS:
+            self.assertEqual(json.loads(bridge_json.encode_event(evt)), json.loads(bridge_json.dumpb(evt)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import bridge_log
+
+
+class BridgeLogTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "log.out")
+
+    def tearDown(self):
+        bridge_log.configure()
+        self.tmp.cleanup()
+
+    def read(self):
+        bridge_log.shutdown()
+        with open(self.path) as f:
+            return f.read()
+
+    def test_filters_by_level_and_appends(self):
+        with open(self.path, "w") as f:
+            f.write("previous run\n")
+        bridge_log.configure(path=self.path, level="INFO")
+        bridge_log.log("debug line", bridge_log.DEBUG)
+        bridge_log.log("info line")
+        bridge_log.log("error line", bridge_log.ERROR)
+        out = self.read()
+        self.assertTrue(out.startswith("previous run\n"))
+        self.assertNotIn("debug line", out)
+        self.assertIn("info line", out)
+        self.assertIn("error line", out)
+
+    def test_off_never_creates_file(self):
+        bridge_log.configure(path=self.path, level="OFF")
+        bridge_log.log("nothing", bridge_log.ERROR)
+        bridge_log.shutdown()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_samples_chunks(self):
+        bridge_log.configure(path=self.path, level="DEBUG", sample=3)
+        for i in range(7):
+            bridge_log.log_chunk({"n": i})
+        out = self.read()
+        self.assertEqual(out.count("Chunk:"), 3)
+        self.assertIn("{'n': 6}", out)
+
+    def test_rotates_by_size(self):
+        bridge_log.configure(path=self.path, level="INFO", max_bytes=200, backups=2)
+        for i in range(40):
+            bridge_log.log(f"line {i:03d} " + "x" * 20)
+            if i % 5 == 4:
+                bridge_log.shutdown()
+        bridge_log.shutdown()
+        self.assertTrue(os.path.exists(self.path + ".1"))
+        self.assertTrue(os.path.exists(self.path + ".2"))
+        self.assertFalse(os.path.exists(self.path + ".3"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bridge_server import BridgeServer
+
+
+async def fake_handler(request):
+    for i in range(request.get("n", 0)):
+        await asyncio.sleep(0.01)
+        yield {"type": "response.output_text.delta", "delta": str(i)}
+
+
+async def post(port, payload, request_id=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode()
+    headers = f"POST /v1/responses HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n"
+    if request_id:
+        headers += f"X-Request-Id: {request_id}\r\n"
+    writer.write(headers.encode() + b"\r\n" + body)
+    await writer.drain()
+    raw = (await reader.read()).decode()
+    writer.close()
+    head, _, stream = raw.partition("\r\n\r\n")
+    events = [
+        (frame.split("\n")[0], json.loads(frame.split("data: ", 1)[1]))
+        for frame in stream.split("\n\n")
+        if frame
+    ]
+    return head, events
+
+
+class BridgeServerTests(unittest.TestCase):
+    def test_serves_concurrent_tagged_streams(self):
+        async def scenario():
+            server = BridgeServer(fake_handler, port=0, coalesce_ms=0)
+            await server.start()
+            try:
+                return await asyncio.gather(
+                    post(server.port, {"n": 3}, request_id="a"),
+                    post(server.port, {"n": 2, "request_id": "b"}),
+                )
+            finally:
+                await server.close()
+
+        (head_a, events_a), (head_b, events_b) = asyncio.run(scenario())
+        self.assertIn("X-Request-Id: a", head_a)
+        self.assertIn("X-Request-Id: b", head_b)
+        self.assertEqual([e["delta"] for _, e in events_a], ["0", "1", "2"])
+        self.assertEqual([tag for tag, _ in events_b], ["id: b:0", "id: b:1"])
+
+    def test_coalesces_deltas(self):
+        async def scenario():
+            server = BridgeServer(fake_handler, port=0, coalesce_ms=200)
+            await server.start()
+            try:
+                return await post(server.port, {"n": 3})
+            finally:
+                await server.close()
+
+        _head, events = asyncio.run(scenario())
+        self.assertEqual([e["delta"] for _, e in events], ["012"])
+
+    def test_rejects_invalid_json(self):
+        async def scenario():
+            server = BridgeServer(fake_handler, port=0)
+            await server.start()
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+                writer.write(b"POST /v1/responses HTTP/1.1\r\nContent-Length: 3\r\n\r\n{x}")
+                raw = await reader.read()
+                writer.close()
+                return raw.decode()
+            finally:
+                await server.close()
+
+        self.assertTrue(asyncio.run(scenario()).startswith("HTTP/1.1 400"))
+
+    def test_rejects_malformed_requests(self):
+        cases = {
+            b"GET /" + b"x" * 70_000 + b" HTTP/1.1\r\n\r\n": "HTTP/1.1 431",
+            b"POST /v1/responses HTTP/1.1\r\nContent-Length: -1\r\n\r\n": "HTTP/1.1 400",
+            b"POST /v1/responses HTTP/1.1\r\nContent-Length: ten\r\n\r\n": "HTTP/1.1 400",
+            b"POST /v1/responses HTTP/1.1\r\nContent-Length: 2\r\n\r\n[]": "HTTP/1.1 400",
+        }
+
+        async def send(port, data):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(data)
+            raw = await reader.read()
+            writer.close()
+            return raw.decode()
+
+        async def scenario():
+            server = BridgeServer(fake_handler, port=0)
+            await server.start()
+            try:
+                return [await send(server.port, data) for data in cases]
+            finally:
+                await server.close()
+
+        for response, status in zip(asyncio.run(scenario()), cases.values()):
+            self.assertTrue(response.startswith(status), response[:40])
+
+    def test_request_ids_are_validated_and_unique(self):
+        async def scenario():
+            server = BridgeServer(fake_handler, port=0, coalesce_ms=0)
+            await server.start()
+            try:
+                injected = await post(server.port, {"n": 1, "request_id": "a\r\nSet-Cookie: evil=1\r\n\r\nX"})
+                first = asyncio.create_task(post(server.port, {"n": 5}, request_id="dup"))
+                await asyncio.sleep(0.02)
+                reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+                body = b'{"n": 1, "request_id": "dup"}'
+                writer.write(b"POST /v1/responses HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+                duplicate = (await reader.read()).decode()
+                writer.close()
+                return injected, await first, duplicate
+            finally:
+                await server.close()
+
+        (head, events), (_head, first_events), duplicate = asyncio.run(scenario())
+        self.assertNotIn("Set-Cookie", head)
+        self.assertRegex(head, r"X-Request-Id: req_[0-9a-f]{8}")
+        self.assertEqual(len(events), 1)
+        self.assertTrue(duplicate.startswith("HTTP/1.1 409"), duplicate[:40])
+        self.assertEqual(len(first_events), 5)
+
+    def test_handler_errors_are_reported(self):
+        async def failing_handler(request):
+            for i in range(request["n"]):
+                yield {"type": "response.created", "response": {"id": "resp_1"}} if i == 0 else {"type": "response.output_text.delta", "delta": "x"}
+            raise AttributeError("boom")
+
+        async def scenario(fmt, n):
+            server = BridgeServer(failing_handler, port=0, coalesce_ms=0, fmt=fmt)
+            await server.start()
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+                body = json.dumps({"n": n}).encode()
+                writer.write(b"POST /v1/responses HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+                raw = (await reader.read()).decode()
+                writer.close()
+                return raw
+            finally:
+                await server.close()
+
+        before_start = asyncio.run(scenario("responses", 0))
+        self.assertTrue(before_start.startswith("HTTP/1.1 500"), before_start[:40])
+        self.assertIn("boom", before_start)
+
+        responses = asyncio.run(scenario("responses", 2))
+        self.assertTrue(responses.startswith("HTTP/1.1 200"))
+        last = json.loads(responses.rstrip().rsplit("data: ", 1)[1])
+        self.assertEqual(last["type"], "response.failed")
+        self.assertEqual(last["response"]["id"], "resp_1")
+
+        chat = asyncio.run(scenario("chat", 1))
+        self.assertEqual(json.loads(chat.rstrip().rsplit("data: ", 1)[1])["error"]["message"], "boom")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,18 @@
+import asyncio
 import os
 import sys
+import tempfile
+import time
 import unittest
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
-from call_gpt import convert_input_messages, build_messages
+import bridge_metrics
+from call_gpt import convert_input_messages, build_messages, stream_response
+from conversation_store import ConversationStore
+from invoke_llm import Backend, BackendRouter, ChunkStream, chat_chunk
+from response_cache import ResponseCache
+from usage_ledger import UsageLedger
 
 class ConvertInputMessagesTests(unittest.TestCase):
     def test_handles_output_text(self):
@@ -35,6 +43,9 @@ class ConvertInputMessagesTests(unittest.TestCase):
             ],
         )
 
+    def test_string_input(self):
+        self.assertEqual(convert_input_messages("hello"), [{"role": "user", "content": "hello"}])
+
 
 class BuildMessagesTests(unittest.TestCase):
     def test_prefers_messages_field(self):
@@ -58,5 +69,169 @@ class BuildMessagesTests(unittest.TestCase):
             [{"role": "system", "content": "sys"}, {"role": "user", "content": "hello"}],
         )
 
+    def test_extends_stored_conversation(self):
+        store = ConversationStore()
+        store.put(
+            "resp_1",
+            [
+                {"role": "system", "content": "old sys"},
+                {"role": "user", "content": "hello"},
+                {"role": "assistant", "content": "hi there"},
+            ],
+        )
+        request = {
+            "instructions": "sys",
+            "previous_response_id": "resp_1",
+            "input": [
+                {"type": "message", "role": "user", "content": [{"type": "input_text", "text": "again"}]},
+            ],
+        }
+        self.assertEqual(
+            build_messages(request, store),
+            [
+                {"role": "system", "content": "sys"},
+                {"role": "user", "content": "hello"},
+                {"role": "assistant", "content": "hi there"},
+                {"role": "user", "content": "again"},
+            ],
+        )
+
+    def test_unknown_previous_response_uses_input(self):
+        request = {
+            "previous_response_id": "resp_missing",
+            "input": [
+                {"type": "message", "role": "user", "content": [{"type": "input_text", "text": "again"}]},
+            ],
+        }
+        self.assertEqual(build_messages(request, ConversationStore()), [{"role": "user", "content": "again"}])
+
+
+class StreamResponseTests(unittest.TestCase):
+    def test_routes_request_model_and_stores_reply(self):
+        router = BackendRouter({"providers": {"canned": {"type": "stub", "reply": "hi there"}}})
+        store = ConversationStore()
+        request = {"model": "canned/demo", "messages": [{"role": "user", "content": "hello"}]}
+
+        async def collect():
+            return [evt async for evt in stream_response(request, fmt="responses", store=store, router=router)]
+
+        events = asyncio.run(collect())
+        completed = events[-1]
+        self.assertEqual(completed["type"], "response.completed")
+        self.assertEqual(completed["response"]["model"], "demo")
+        self.assertEqual(store.get(completed["response"]["id"])[-1]["content"], "hi there")
+
+    def test_deadline_ends_response_as_incomplete(self):
+        router = BackendRouter({"providers": {"slow": {"type": "stub", "reply": "one two three four", "delay": 0.2}}})
+        store = ConversationStore()
+        request = {"model": "slow/demo", "messages": [{"role": "user", "content": "hello"}], "timeout_ms": 300}
+
+        async def collect():
+            return [evt async for evt in stream_response(request, fmt="responses", store=store, router=router)]
+
+        start = time.monotonic()
+        events = asyncio.run(collect())
+        self.assertLess(time.monotonic() - start, 0.6)
+        final = events[-1]
+        self.assertEqual(final["type"], "response.incomplete")
+        self.assertEqual(final["response"]["incomplete_details"], {"reason": "deadline_exceeded"})
+        self.assertEqual(final["response"]["output"][0]["content"][0]["text"], "one")
+        self.assertIsNone(store.get(final["response"]["id"]))
+
+    def test_invalid_timeout_is_ignored(self):
+        router = BackendRouter({"providers": {"canned": {"type": "stub", "reply": "hi"}}})
+
+        async def collect(timeout):
+            request = {"model": "canned/demo", "messages": [{"role": "user", "content": "hello"}], "timeout_ms": timeout}
+            return [evt async for evt in stream_response(request, fmt="responses", router=router)]
+
+        for timeout in ("soon", "nan", [5]):
+            self.assertEqual(asyncio.run(collect(timeout))[-1]["type"], "response.completed")
+
+    def test_upstream_error_ends_response(self):
+        router = BackendRouter({"providers": {"broken": {"type": "missing"}}})
+        request = {"model": "broken/demo", "messages": [{"role": "user", "content": "hello"}]}
+
+        async def collect(fmt):
+            return [evt async for evt in stream_response(request, fmt=fmt, router=router)]
+
+        events = asyncio.run(collect("responses"))
+        self.assertEqual([evt["type"] for evt in events], ["response.created", "response.in_progress", "response.failed"])
+        self.assertEqual(events[-1]["response"]["error"]["code"], "upstream_error")
+        self.assertIn("missing", events[-1]["response"]["error"]["message"])
+        self.assertEqual(asyncio.run(collect("chat"))[-1]["error"]["code"], "upstream_error")
+
+    def test_cache_hits_are_recorded_in_the_ledger(self):
+        router = BackendRouter({"providers": {"canned": {"type": "stub", "reply": "hi there"}}})
+        request = {"model": "canned/demo", "messages": [{"role": "user", "content": "hello"}], "session_id": "s1"}
+
+        async def collect(cache, ledger):
+            return [evt async for evt in stream_response(request, fmt="responses", cache=cache, router=router, ledger=ledger)]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResponseCache(os.path.join(tmp, "cache"))
+            ledger = UsageLedger(os.path.join(tmp, "usage.json"))
+            asyncio.run(collect(cache, ledger))
+            asyncio.run(collect(cache, ledger))
+            session = ledger.read()["sessions"]["s1"]
+        self.assertEqual((session["requests"], session["cache_hits"], session["completion_tokens"]), (2, 1, 2))
+
+    def test_hedge_winner_gets_the_usage(self):
+        class Stalled(Backend):
+            async def get_response(self, messages=None, tools=None, stream=False, tool_choice="auto", model=None):
+                async def chunks():
+                    await asyncio.sleep(5)
+                    yield chat_chunk("chatcmpl-slow", model, {"content": "late"})
+
+                return ChunkStream(chunks())
+
+        router = BackendRouter(
+            {
+                "providers": {"canned": {"type": "stub", "reply": "hi there"}},
+                "hedge": {"delay_ms": 20, "provider": "canned", "model": "fast"},
+            }
+        )
+        router._backends["slow"] = Stalled()
+        router.providers["slow"] = {"type": "stub"}
+        request = {"model": "slow/demo", "messages": [{"role": "user", "content": "hello"}], "session_id": "s1"}
+
+        async def collect(ledger):
+            return [evt async for evt in stream_response(request, fmt="responses", router=router, ledger=ledger)]
+
+        bridge_metrics.METRICS.reset()
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger = UsageLedger(os.path.join(tmp, "usage.json"))
+            completed = asyncio.run(collect(ledger))[-1]["response"]
+            totals = ledger.read()
+        self.assertEqual(completed["output"][0]["content"][0]["text"], "hi there")
+        self.assertEqual(list(totals["models"]), ["canned/fast"])
+        self.assertEqual(bridge_metrics.METRICS.counters["tokens.completion.canned"], 2)
+        self.assertNotIn("tokens.completion.slow", bridge_metrics.METRICS.counters)
+
+    def test_reports_usage_and_timings(self):
+        router = BackendRouter({"providers": {"canned": {"type": "stub", "reply": "hi there"}}})
+        request = {"model": "canned/demo", "messages": [{"role": "user", "content": "hello"}], "session_id": "s1"}
+
+        async def collect(fmt, ledger):
+            return [evt async for evt in stream_response(request, fmt=fmt, router=router, ledger=ledger)]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger = UsageLedger(os.path.join(tmp, "usage.json"))
+            completed = asyncio.run(collect("responses", ledger))[-1]["response"]
+            chunks = [evt for evt in asyncio.run(collect("chat", ledger)) if "choices" in evt]
+            totals = ledger.read()
+
+        self.assertEqual(completed["usage"]["output_tokens"], 2)
+        self.assertEqual(completed["usage"]["total_tokens"], completed["usage"]["input_tokens"] + 2)
+        self.assertGreaterEqual(completed["timings"]["duration_ms"], completed["timings"]["ttft_ms"])
+        # Chat output puts usage on the finishing chunk, the last one the CLI reads.
+        self.assertTrue(all(chunk["choices"] for chunk in chunks))
+        self.assertEqual(chunks[-1]["choices"][0]["finish_reason"], "stop")
+        self.assertEqual(chunks[-1]["usage"]["completion_tokens"], 2)
+        self.assertIn("ttft_ms", chunks[-1]["timings"])
+        self.assertEqual(totals["sessions"]["s1"]["requests"], 2)
+        self.assertEqual(totals["models"]["canned/demo"]["completion_tokens"], 4)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,40 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from chunk_trace import ReplayStream, TraceWriter, read_trace
+
+
+class ChunkTraceTests(unittest.TestCase):
+    def test_round_trip_and_replay_pacing(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            trace = TraceWriter.in_directory(tmp, model="m")
+            trace.write({"n": 0})
+            time.sleep(0.05)
+            trace.write({"n": 1})
+            trace.close()
+
+            header, chunks = read_trace(trace.path)
+            self.assertEqual(header["model"], "m")
+            self.assertEqual([c for _, c in chunks], [{"n": 0}, {"n": 1}])
+            self.assertGreaterEqual(chunks[1][0] - chunks[0][0], 0.04)
+
+            async def play(speed):
+                start = time.monotonic()
+                got = [c async for c in ReplayStream(chunks, speed=speed)]
+                return got, time.monotonic() - start
+
+            got, elapsed = asyncio.run(play(1.0))
+            self.assertEqual(got, [{"n": 0}, {"n": 1}])
+            self.assertGreaterEqual(elapsed, 0.04)
+            _, fast = asyncio.run(play(0))
+            self.assertLess(fast, 0.04)
+
+
+if __name__ == "__main__":
+    unittest.main()
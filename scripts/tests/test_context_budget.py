@@ -0,0 +1,89 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import context_budget
+from context_budget import TokenCounter, context_window, fit_messages, group_units
+
+
+def history(turns, size=400):
+    messages = [{"role": "system", "content": "be brief"}]
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"q{i} " + "x" * size})
+        messages.append({"role": "assistant", "content": f"a{i} " + "y" * size})
+    return messages
+
+
+class ContextBudgetTests(unittest.TestCase):
+    def setUp(self):
+        self.counter = TokenCounter("approx")
+
+    def test_fits_without_counting(self):
+        messages = history(2)
+        with mock.patch.object(self.counter, "count", side_effect=AssertionError):
+            kept, report = fit_messages(messages, 10_000, self.counter)
+        self.assertIs(kept, messages)
+        self.assertEqual(report["dropped_messages"], 0)
+
+    def test_multibyte_text_is_counted(self):
+        # Two tokens per character, as BPE tokenizers often give CJK text.
+        context_budget.register_tokenizer("wide", lambda text: 2 * len(text))
+        self.addCleanup(context_budget._tokenizers.pop, "wide")
+        messages = [{"role": "user", "content": "旧" * 300}, {"role": "user", "content": "新" * 300}]
+        kept, report = fit_messages(messages, 1000, TokenCounter("wide"))
+        self.assertEqual(kept, messages[1:])
+        self.assertEqual(report["dropped_messages"], 1)
+
+    def test_drops_oldest_turns_and_keeps_system(self):
+        messages = history(10)
+        kept, report = fit_messages(messages, 500, self.counter)
+        self.assertEqual(kept[0], messages[0])
+        self.assertEqual(kept[-1], messages[-1])
+        self.assertEqual(report["dropped_messages"], len(messages) - len(kept))
+        self.assertLessEqual(report["kept_tokens"], 500)
+        self.assertGreater(report["dropped_tokens"], 0)
+
+    def test_newest_unit_is_always_kept(self):
+        messages = history(1, size=10_000)
+        kept, report = fit_messages(messages, 100, self.counter)
+        self.assertEqual(kept, [messages[0], messages[-1]])
+        self.assertEqual(report["dropped_messages"], 1)
+
+    def test_tool_calls_stay_with_outputs(self):
+        call = {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {"id": "c1", "type": "function", "function": {"name": "shell", "arguments": "{}"}},
+                {"id": "c2", "type": "function", "function": {"name": "shell", "arguments": "{}"}},
+            ],
+        }
+        outputs = [
+            {"role": "tool", "tool_call_id": "c1", "content": "o" * 2000},
+            {"role": "tool", "tool_call_id": "c2", "content": "p" * 2000},
+        ]
+        messages = [{"role": "user", "content": "go"}, call, *outputs, {"role": "user", "content": "next"}]
+        self.assertEqual([len(u) for u in group_units(messages)], [1, 3, 1])
+
+        kept, _report = fit_messages(messages, 300, self.counter)
+        self.assertEqual(kept, [messages[-1]])
+
+    def test_counts_are_cached_by_content(self):
+        counter = TokenCounter("approx")
+        counter.count({"role": "user", "content": "hello"})
+        counter.count({"role": "user", "content": "hello"})
+        self.assertEqual((counter.hits, counter.misses), (1, 1))
+
+    def test_context_window_by_prefix_and_override(self):
+        self.assertEqual(context_window("gpt-4o-mini-2024-07-18"), 128_000)
+        self.assertEqual(context_window("gpt-4-0613"), 8_192)
+        with mock.patch.dict(os.environ, {"CODEX_BRIDGE_CONTEXT_TOKENS": "off"}):
+            self.assertIsNone(context_window("gpt-4o"))
+            self.assertEqual(context_budget.fit_to_context(history(1), "gpt-4o")[1], None)
+
+
+if __name__ == "__main__":
+    unittest.main()
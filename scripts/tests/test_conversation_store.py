@@ -0,0 +1,55 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from conversation_store import ConversationStore
+
+
+def convo(text):
+    return [{"role": "user", "content": text}]
+
+
+class ConversationStoreTests(unittest.TestCase):
+    def test_lru_eviction_by_entries(self):
+        store = ConversationStore(max_entries=2)
+        store.put("a", convo("a"))
+        store.put("b", convo("b"))
+        store.get("a")
+        store.put("c", convo("c"))
+        self.assertEqual(store.get("a"), convo("a"))
+        self.assertIsNone(store.get("b"))
+        self.assertEqual(len(store), 2)
+
+    def test_byte_budget(self):
+        store = ConversationStore(max_bytes=500)
+        store.put("a", convo("x" * 300))
+        store.put("b", convo("y" * 300))
+        self.assertIsNone(store.get("a"))
+        self.assertIsNotNone(store.get("b"))
+        self.assertLessEqual(store.bytes, 500)
+
+    def test_ttl(self):
+        store = ConversationStore(ttl=0.05)
+        store.put("a", convo("a"))
+        time.sleep(0.1)
+        self.assertIsNone(store.get("a"))
+
+    def test_spills_evicted_conversations_to_disk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = ConversationStore(max_entries=1, spill_dir=tmp)
+            store.put("resp_a", convo("a"))
+            store.put("resp_b", convo("b"))
+            self.assertEqual(len(store), 1)
+            self.assertEqual(store.get("resp_a"), convo("a"))
+
+            disk_only = ConversationStore(max_entries=0, spill_dir=tmp)
+            disk_only.put("resp_c", convo("c"))
+            self.assertEqual(ConversationStore(spill_dir=tmp).get("resp_c"), convo("c"))
+
+
+if __name__ == "__main__":
+    unittest.main()
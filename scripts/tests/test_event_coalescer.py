@@ -0,0 +1,78 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from event_coalescer import CoalescingEmitter
+
+
+def text_delta(item_id, delta):
+    return {"type": "response.output_text.delta", "item_id": item_id, "output_index": 0, "content_index": 0, "delta": delta}
+
+
+def chat_chunk(delta, finish_reason=None):
+    return {"id": "c1", "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+
+class CoalescingEmitterTests(unittest.TestCase):
+    def setUp(self):
+        self.out = []
+        self.emitter = CoalescingEmitter(self.out.append, window=10, max_bytes=1000)
+
+    def test_merges_response_deltas_until_boundary(self):
+        for piece in ("a", "b", "c"):
+            self.emitter.emit(text_delta("msg_1", piece))
+        self.assertEqual(self.out, [])
+        self.emitter.emit({"type": "response.output_text.done", "item_id": "msg_1", "text": "abc"})
+        self.assertEqual([e.get("delta") for e in self.out], ["abc", None])
+        self.assertEqual(self.emitter.merged, 2)
+
+    def test_different_items_are_not_merged(self):
+        self.emitter.emit(text_delta("msg_1", "a"))
+        self.emitter.emit(text_delta("msg_2", "b"))
+        self.emitter.flush()
+        self.assertEqual([(e["item_id"], e["delta"]) for e in self.out], [("msg_1", "a"), ("msg_2", "b")])
+
+    def test_merges_chat_chunks_without_touching_originals(self):
+        first = chat_chunk({"content": "Hel"})
+        self.emitter.emit(chat_chunk({"role": "assistant", "content": ""}))
+        self.emitter.emit(first)
+        self.emitter.emit(chat_chunk({"content": "lo"}))
+        self.emitter.emit(chat_chunk({}, "stop"))
+        self.assertEqual(len(self.out), 3)
+        self.assertEqual(self.out[1]["choices"][0]["delta"], {"content": "Hello"})
+        self.assertEqual(first["choices"][0]["delta"], {"content": "Hel"})
+
+    def test_merges_chat_tool_arguments(self):
+        def args(text, **extra):
+            return chat_chunk({"tool_calls": [{"index": 0, "function": {"arguments": text}, **extra}]})
+
+        self.emitter.emit(args("", id="call_1", type="function"))
+        self.emitter.emit(args('{"command":'))
+        self.emitter.emit(args('["ls"]}'))
+        self.emitter.flush()
+        self.assertEqual(len(self.out), 2)
+        self.assertEqual(self.out[1]["choices"][0]["delta"]["tool_calls"][0]["function"]["arguments"], '{"command":["ls"]}')
+
+    def test_byte_budget_forces_flush(self):
+        self.emitter.max_bytes = 4
+        for piece in ("ab", "cd", "ef"):
+            self.emitter.emit(text_delta("msg_1", piece))
+        self.assertEqual([e["delta"] for e in self.out], ["abcd"])
+
+    def test_byte_budget_counts_encoded_bytes(self):
+        self.emitter.max_bytes = 6
+        for piece in ("你", "好", "吗"):
+            self.emitter.emit(text_delta("msg_1", piece))
+        self.assertEqual([e["delta"] for e in self.out], ["你好"])
+
+    def test_zero_window_passes_through(self):
+        emitter = CoalescingEmitter(self.out.append, window=0)
+        emitter.emit(text_delta("msg_1", "a"))
+        emitter.emit(text_delta("msg_1", "b"))
+        self.assertEqual(len(self.out), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
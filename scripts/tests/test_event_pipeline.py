@@ -0,0 +1,109 @@
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import bridge_metrics
+from event_pipeline import PipeWriter, WatermarkQueue, buffered
+
+
+class EventPipelineTests(unittest.TestCase):
+    def setUp(self):
+        bridge_metrics.METRICS.reset()
+
+    def test_producer_pauses_at_high_and_resumes_at_low(self):
+        produced = []
+
+        async def source():
+            for i in range(20):
+                produced.append(i)
+                yield i
+
+        async def scenario():
+            events = buffered(source(), "test")
+            first = await anext(events)
+            await asyncio.sleep(0.01)
+            # Read ahead up to the high watermark, then paused.
+            ahead = len(produced)
+            await anext(events)
+            await asyncio.sleep(0.01)
+            still_paused = len(produced)
+            await anext(events)
+            await asyncio.sleep(0.01)
+            resumed = len(produced)
+            rest = [evt async for evt in events]
+            return first, ahead, still_paused, resumed, rest
+
+        with mock.patch.dict(os.environ, {"CODEX_BRIDGE_QUEUE_HIGH": "4", "CODEX_BRIDGE_QUEUE_LOW": "1"}):
+            first, ahead, still_paused, resumed, rest = asyncio.run(scenario())
+        self.assertEqual(first, 0)
+        self.assertEqual(ahead, 4)
+        self.assertEqual(still_paused, 4)
+        self.assertGreater(resumed, 4)
+        self.assertEqual(rest, list(range(3, 20)))
+        metrics = bridge_metrics.METRICS
+        self.assertGreaterEqual(metrics.counters["queue.paused.test"], 2)
+        self.assertEqual(metrics.gauges["queue.max_depth.test"], 4)
+        self.assertEqual(metrics.gauges["queue.depth.test"], 0)
+
+    def test_closing_consumer_closes_source(self):
+        closed = []
+
+        async def source():
+            try:
+                for i in range(1000):
+                    yield i
+            finally:
+                closed.append(True)
+
+        async def scenario():
+            events = buffered(source())
+            await anext(events)
+            await events.aclose()
+
+        asyncio.run(scenario())
+        self.assertEqual(closed, [True])
+
+    def test_source_errors_reach_consumer(self):
+        async def source():
+            yield 1
+            raise ValueError("boom")
+
+        async def scenario():
+            return [evt async for evt in buffered(source())]
+
+        with self.assertRaises(ValueError):
+            asyncio.run(scenario())
+
+    def test_queue_low_watermark_is_below_high(self):
+        queue = WatermarkQueue(high=2, low=5)
+        self.assertEqual((queue.high, queue.low), (2, 1))
+
+    def test_pipe_writer_delivers_everything_before_close(self):
+        read_fd, write_fd = os.pipe()
+
+        async def scenario():
+            with os.fdopen(write_fd, "wb") as f:
+                out = await PipeWriter.open(f)
+                data = b"x" * (1 << 20)
+                out.write(data)
+                reader = asyncio.get_running_loop().run_in_executor(None, read_all)
+                await out.drain()
+                await out.close()
+            return await reader
+
+        def read_all():
+            chunks = []
+            with os.fdopen(read_fd, "rb") as f:
+                while chunk := f.read(65536):
+                    chunks.append(chunk)
+            return b"".join(chunks)
+
+        self.assertEqual(len(asyncio.run(scenario())), 1 << 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import bridge_metrics
+from hedging import HedgePolicy, hedged_response
+from invoke_llm import Backend, ChunkStream, chat_chunk
+from rate_limiter import RateLimiter
+
+
+class SlowBackend(Backend):
+    def __init__(self, ttft, text):
+        self.ttft = ttft
+        self.text = text
+        self.calls = 0
+        self.closed = False
+
+    async def get_response(self, messages=None, tools=None, stream=False, tool_choice="auto", model=None):
+        self.calls += 1
+
+        async def chunks():
+            try:
+                await asyncio.sleep(self.ttft)
+                yield chat_chunk("c", model, {"content": self.text})
+                yield chat_chunk("c", model, {}, "stop")
+            finally:
+                self.closed = True
+
+        return ChunkStream(chunks())
+
+
+class FakeRouter:
+    def __init__(self, backends, limiters=None):
+        self.backends = backends
+        self.limiters = limiters or {}
+
+    def backend(self, provider):
+        return self.backends[provider]
+
+    def limiter(self, provider):
+        return self.limiters.get(provider)
+
+
+def run(policy, primary, fallback, limiters=None):
+    async def scenario():
+        router = FakeRouter({"main": primary, "spare": fallback}, limiters)
+        stream = await hedged_response(policy, router, "main", primary, "m", [], {"stream": True}, estimate=100)
+        text = "".join([c["choices"][0]["delta"].get("content") or "" async for c in stream])
+        await stream.close()
+        await asyncio.sleep(0)
+        return stream.label, text
+
+    return asyncio.run(scenario())
+
+
+class HedgingTests(unittest.TestCase):
+    def setUp(self):
+        bridge_metrics.METRICS.reset()
+
+    def test_fast_primary_is_not_hedged(self):
+        primary, spare = SlowBackend(0, "primary"), SlowBackend(0, "spare")
+        label, text = run(HedgePolicy(200, provider="spare"), primary, spare)
+        self.assertEqual((label, text), ("primary", "primary"))
+        self.assertEqual(spare.calls, 0)
+        self.assertEqual(bridge_metrics.METRICS.counters["hedge.not_needed"], 1)
+
+    def test_stalled_primary_loses_to_hedge(self):
+        primary, spare = SlowBackend(5, "primary"), SlowBackend(0, "spare")
+        label, text = run(HedgePolicy(20, provider="spare"), primary, spare)
+        self.assertEqual((label, text), ("hedge", "spare"))
+        self.assertTrue(primary.closed)
+        counters = bridge_metrics.METRICS.counters
+        self.assertEqual((counters["hedge.fired"], counters["hedge.won.hedge"], counters["hedge.cancelled"]), (1, 1, 1))
+
+    def test_hedge_is_charged_to_its_rate_limiter(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "spare.json")
+            limiter = RateLimiter(path, name="spare", rpm=60, tpm=1000)
+            primary, spare = SlowBackend(5, "primary"), SlowBackend(0, "spare")
+            self.assertEqual(run(HedgePolicy(20, provider="spare"), primary, spare, {"spare": limiter})[0], "hedge")
+            with open(path) as f:
+                state = json.load(f)
+            self.assertLess(state["requests"], 59.1)
+            self.assertLess(state["tokens"], 901)
+
+            # With the bucket empty the hedge is not sent at all.
+            with open(path, "w") as f:
+                json.dump({"at": time.time(), "requests": 0.0}, f)
+            primary, spare = SlowBackend(0.1, "primary"), SlowBackend(0, "spare")
+            self.assertEqual(run(HedgePolicy(20, provider="spare"), primary, spare, {"spare": limiter})[0], "primary")
+            self.assertEqual(spare.calls, 0)
+            self.assertEqual(bridge_metrics.METRICS.counters["hedge.rate_limited"], 1)
+
+    def test_percentile_delay_needs_samples(self):
+        policy = HedgePolicy("p90", default_ms=1500, min_samples=3)
+        self.assertEqual(asyncio.run(policy.delay("main")), 1.5)
+        for ms in (100, 200, 300):
+            bridge_metrics.observe("ttft_ms.main", ms)
+        self.assertEqual(asyncio.run(policy.delay("main")), 0.3)
+
+    def test_percentile_samples_persist_across_processes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with mock.patch.dict(os.environ, {"CODEX_BRIDGE_RATE_DIR": tmp}):
+                policy = HedgePolicy.from_env({"delay_ms": "p50", "min_samples": 2})
+                for _ in range(2):
+                    run(policy, SlowBackend(0, "fast"), SlowBackend(0, "spare"))
+                # A fresh process has no samples of its own.
+                bridge_metrics.METRICS.reset()
+                fresh = HedgePolicy.from_env({"delay_ms": "p50", "min_samples": 2})
+                self.assertLess(asyncio.run(fresh.delay("main")), 1)
+                with open(os.path.join(tmp, "ttft.json")) as f:
+                    self.assertEqual(len(json.load(f)["main"]), 2)
+            with mock.patch.dict(os.environ, {"CODEX_BRIDGE_RATE_DIR": tmp, "CODEX_BRIDGE_HEDGE_HISTORY": "off"}):
+                self.assertIsNone(HedgePolicy.from_env({"delay_ms": "p50"}).history)
+
+    def test_disabled_without_delay(self):
+        self.assertIsNone(HedgePolicy.from_env({"provider": "spare"}))
+        self.assertEqual(asyncio.run(HedgePolicy.from_env({"delay_ms": 250}).delay("main")), 0.25)
+
+
+if __name__ == "__main__":
+    unittest.main()
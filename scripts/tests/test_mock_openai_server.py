@@ -0,0 +1,67 @@
+import asyncio
+import json
+import os
+import sys
+import unittest
+
+import openai
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from call_gpt import stream_response
+from invoke_llm import BackendRouter, aclose_shared_clients
+from mock_openai_server import MockOpenAIServer
+from rate_limiter import retry_after
+
+
+async def with_server(server, scenario):
+    await server.start()
+    try:
+        return await scenario(server)
+    finally:
+        await server.close()
+        await aclose_shared_clients()
+
+
+class MockOpenAIServerTests(unittest.TestCase):
+    def test_scripted_tool_call_through_bridge(self):
+        script = [{"content": "Listing.", "tool_calls": [{"name": "shell", "arguments": {"command": ["ls", "-la"]}}]}]
+
+        async def scenario(server):
+            router = BackendRouter({"providers": {"mock": {"type": "openai-compatible", "base_url": server.base_url}}})
+            request = {"model": "mock/gpt", "messages": [{"role": "user", "content": "ls"}]}
+            return [evt async for evt in stream_response(request, fmt="responses", router=router)]
+
+        events = asyncio.run(with_server(MockOpenAIServer(port=0, script=script, tokens_per_sec=500), scenario))
+        output = events[-1]["response"]["output"]
+        self.assertEqual(output[0]["content"][0]["text"], "Listing.")
+        self.assertEqual(json.loads(output[1]["arguments"]), {"command": ["ls", "-la"]})
+
+    def test_embeddings_are_deterministic(self):
+        async def scenario(server):
+            client = openai.AsyncOpenAI(base_url=server.base_url, api_key="x")
+            first = await client.embeddings.create(input=["a", "b"], model="text-embedding-3-small")
+            second = await client.embeddings.create(input="a", model="text-embedding-3-small", dimensions=8)
+            return first, second
+
+        first, second = asyncio.run(with_server(MockOpenAIServer(port=0), scenario))
+        a, b = (d.embedding for d in first.data)
+        self.assertEqual(len(a), 1536)
+        self.assertNotEqual(a, b)
+        self.assertAlmostEqual(sum(v * v for v in a), 1.0, places=4)
+        self.assertEqual(len(second.data[0].embedding), 8)
+
+    def test_injects_rate_limits(self):
+        async def scenario(server):
+            client = openai.AsyncOpenAI(base_url=server.base_url, api_key="x", max_retries=0)
+            try:
+                await client.chat.completions.create(model="m", messages=[{"role": "user", "content": "hi"}])
+            except openai.RateLimitError as e:
+                return e
+
+        error = asyncio.run(with_server(MockOpenAIServer(port=0, rate_limit_rate=1.0, retry_after=3), scenario))
+        self.assertEqual(retry_after(error), 3.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
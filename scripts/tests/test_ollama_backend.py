@@ -0,0 +1,84 @@
+import asyncio
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import invoke_llm
+from invoke_llm import InvokeLLama, to_ollama_messages
+from response_events import ResponseTranslator
+
+NDJSON_LINES = [
+    {"message": {"role": "assistant", "content": "Let me "}, "done": False},
+    {"message": {"role": "assistant", "content": "check."}, "done": False},
+    {
+        "message": {
+            "role": "assistant",
+            "content": "",
+            "tool_calls": [{"function": {"name": "shell", "arguments": {"command": ["ls"]}}}],
+        },
+        "done": False,
+    },
+    {"message": {"role": "assistant", "content": ""}, "done": True, "done_reason": "stop",
+     "prompt_eval_count": 12, "eval_count": 5},
+]
+
+
+class OllamaBackendTests(unittest.TestCase):
+    def setUp(self):
+        self.payloads = []
+
+        def handler(request):
+            self.payloads.append(json.loads(request.content))
+            body = "".join(json.dumps(line) + "\n" for line in NDJSON_LINES)
+            return httpx.Response(200, content=body.encode())
+
+        self.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        patcher = mock.patch.object(invoke_llm, "_http_client", self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_streams_ndjson_through_translator(self):
+        tools = [{"type": "function", "name": "shell", "description": "run", "parameters": {}}]
+
+        async def run():
+            backend = InvokeLLama(keep_alive="1h")
+            stream = await backend.get_response([{"role": "user", "content": "hi"}], tools=tools, stream=True)
+            chunks = [c async for c in stream]
+            await stream.close()
+            return chunks
+
+        chunks = asyncio.run(run())
+        payload = self.payloads[0]
+        self.assertTrue(payload["stream"])
+        self.assertEqual(payload["keep_alive"], "1h")
+        self.assertEqual(payload["tools"][0]["function"]["name"], "shell")
+        self.assertEqual(chunks[-1]["usage"]["total_tokens"], 17)
+
+        translator = ResponseTranslator()
+        for chunk in chunks:
+            translator.feed(chunk)
+        self.assertEqual(translator.finish_reason, "tool_calls")
+        message = translator.assistant_message()
+        self.assertEqual(message["content"], "Let me check.")
+        self.assertEqual(json.loads(message["tool_calls"][0]["function"]["arguments"]), {"command": ["ls"]})
+
+    def test_preload_sends_empty_chat(self):
+        asyncio.run(InvokeLLama(preload=["llama3:8b"]).preload())
+        self.assertEqual(self.payloads, [{"model": "llama3:8b", "messages": [], "keep_alive": "30m"}])
+
+    def test_converts_tool_call_arguments_to_objects(self):
+        messages = to_ollama_messages(
+            [{"role": "assistant", "content": None,
+              "tool_calls": [{"id": "c1", "type": "function", "function": {"name": "shell", "arguments": '{"a": 1}'}}]}]
+        )
+        self.assertEqual(messages[0]["tool_calls"][0]["function"]["arguments"], {"a": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from partial_json import PartialJSON
+from response_events import ResponseTranslator
+
+
+class PartialJSONTests(unittest.TestCase):
+    def test_fields_complete_before_the_object_does(self):
+        parser = PartialJSON()
+        seen = []
+        for piece in ('{"', "command", '":["', "ls", '","-la"]', ',"time', 'out":', "10", "00}"):
+            seen.append(parser.feed(piece))
+            if seen[-1] == ["command"]:
+                self.assertEqual(parser.fields, {"command": ["ls", "-la"]})
+                self.assertFalse(parser.done)
+        self.assertEqual([keys for keys in seen if keys], [["command"], ["timeout"]])
+        self.assertTrue(parser.done)
+        self.assertEqual(parser.value, {"command": ["ls", "-la"], "timeout": 1000})
+
+    def test_matches_json_loads_one_character_at_a_time(self):
+        text = json.dumps(
+            {"a": [1, -2.5e3, True, False, None, {"b": []}], "s": 'q"u\\oé\n', "e": {}, "u": "😀"}
+        )
+        parser = PartialJSON()
+        for c in text:
+            parser.feed(c)
+        self.assertTrue(parser.done)
+        self.assertEqual(parser.value, json.loads(text))
+
+    def test_malformed_input_stops_parsing(self):
+        parser = PartialJSON()
+        self.assertEqual(parser.feed('{"a": 1, "b": ]'), ["a"])
+        self.assertTrue(parser.failed)
+        self.assertEqual(parser.feed('2}'), [])
+        self.assertFalse(parser.done)
+
+    def test_translator_emits_partial_events(self):
+        tr = ResponseTranslator()
+        events = []
+        for piece in ('{"command":["git",', '"status"],', '"workdir":"/tmp"}'):
+            tc = {"index": 0, "id": "call_a", "function": {"name": "shell", "arguments": piece}}
+            events += tr.feed({"choices": [{"index": 0, "delta": {"tool_calls": [tc]}}]})
+        partial = [e for e in events if e["type"] == "response.function_call_arguments.partial"]
+        self.assertEqual([e["completed"] for e in partial], [["command"], ["workdir"]])
+        self.assertEqual(partial[0]["arguments"], {"command": ["git", "status"]})
+        self.assertEqual(partial[1]["arguments"], {"command": ["git", "status"], "workdir": "/tmp"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import asyncio
+import fcntl
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from rate_limiter import RateLimiter, retry_after
+
+
+class RateLimiterTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "openai.json")
+
+    def state(self):
+        with open(self.path) as f:
+            return json.load(f)
+
+    def test_request_bucket_queues_instead_of_failing(self):
+        limiter = RateLimiter(self.path, rpm=1200)  # 20 per second, burst of 1200
+
+        async def scenario():
+            with open(self.path, "w") as f:
+                json.dump({"at": time.time(), "requests": 0.0}, f)
+            start = time.monotonic()
+            await limiter.acquire()
+            return time.monotonic() - start
+
+        self.assertGreaterEqual(asyncio.run(scenario()), 0.04)
+        self.assertEqual(self.state()["inflight"], {str(os.getpid()): 1})
+        asyncio.run(limiter.release())
+        self.assertEqual(self.state()["inflight"], {})
+
+    def test_concurrency_cap_holds_extra_callers(self):
+        limiter = RateLimiter(self.path, max_concurrency=1)
+
+        async def scenario():
+            await limiter.acquire()
+            waiter = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0.1)
+            held = not waiter.done()
+            await limiter.release()
+            await asyncio.wait_for(waiter, 1)
+            await limiter.release()
+            return held
+
+        self.assertTrue(asyncio.run(scenario()))
+
+    def test_429_halves_limit_and_blocks(self):
+        limiter = RateLimiter(self.path, max_concurrency=8)
+        asyncio.run(limiter.acquire())
+        asyncio.run(limiter.release(ok=False, backoff=30))
+        state = self.state()
+        self.assertEqual(state["limit"], 4.0)
+        self.assertGreater(state["blocked_until"], time.time() + 25)
+
+        limiter._update(lambda s, now: s.update(blocked_until=0))
+        asyncio.run(limiter.acquire())
+        asyncio.run(limiter.release(ok=True))
+        self.assertAlmostEqual(self.state()["limit"], 4.25)
+
+    def test_charge_takes_budget_without_a_slot(self):
+        limiter = RateLimiter(self.path, rpm=60, tpm=1000)
+        self.assertTrue(asyncio.run(limiter.charge(400)))
+        state = self.state()
+        self.assertEqual(state["inflight"], {})
+        self.assertLess(state["tokens"], 601)
+
+        self.assertFalse(asyncio.run(limiter.charge(800, force=False)))
+        self.assertTrue(asyncio.run(limiter.charge(800)))
+        self.assertLess(self.state()["tokens"], 0)
+
+    def test_lock_waits_off_the_event_loop(self):
+        limiter = RateLimiter(self.path, rpm=60)
+
+        async def scenario():
+            ticks = 0
+            with open(self.path, "a+b") as held:
+                fcntl.flock(held, fcntl.LOCK_EX)
+                waiter = asyncio.ensure_future(limiter.acquire())
+                for _ in range(5):
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+                self.assertFalse(waiter.done())
+            await asyncio.wait_for(waiter, 1)
+            await limiter.release()
+            return ticks
+
+        self.assertEqual(asyncio.run(scenario()), 5)
+
+    def test_cancelled_acquire_gives_back_its_slot(self):
+        limiter = RateLimiter(self.path, rpm=60)
+
+        async def scenario():
+            with open(self.path, "a+b") as held:
+                fcntl.flock(held, fcntl.LOCK_EX)
+                with self.assertRaises(TimeoutError):
+                    await asyncio.wait_for(limiter.acquire(), 0.1)
+            # The worker takes the slot once the lock is free, then returns it.
+            for _ in range(50):
+                await asyncio.sleep(0.01)
+                if not limiter._cleanup and self.state().get("inflight") == {}:
+                    break
+
+        asyncio.run(scenario())
+        self.assertEqual(self.state()["inflight"], {})
+        self.assertLess(self.state()["requests"], 59.5)
+
+    def test_retry_after_parsing(self):
+        def error(status, headers):
+            return SimpleNamespace(status_code=status, response=SimpleNamespace(status_code=status, headers=headers))
+
+        self.assertIsNone(retry_after(error(500, {})))
+        self.assertEqual(retry_after(error(429, {"retry-after": "3"})), 3.0)
+        self.assertEqual(retry_after(error(429, {"retry-after-ms": "250"})), 0.25)
+        self.assertEqual(retry_after(error(429, {})), 1.0)
+
+    def test_disabled_without_limits(self):
+        with mock.patch.dict(os.environ, {"CODEX_BRIDGE_RATE_DIR": os.path.dirname(self.path)}, clear=True):
+            self.assertIsNone(RateLimiter.for_provider("openai"))
+            limiter = RateLimiter.for_provider("openai", {"rate_limit": {"rpm": 60}})
+        self.assertEqual(limiter.rpm, 60)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from response_cache import ResponseCache
+
+
+class ResponseCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_ignores_unrelated_fields_and_order(self):
+        messages = [{"role": "user", "content": "hi"}]
+        a = ResponseCache.key({"tools": [{"name": "shell"}], "temperature": 0, "user": "a"}, messages, "m")
+        b = ResponseCache.key({"temperature": 0, "tools": [{"name": "shell"}], "user": "b"}, messages, "m")
+        c = ResponseCache.key({"temperature": 1, "tools": [{"name": "shell"}]}, messages, "m")
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+        self.assertNotEqual(a, ResponseCache.key({"temperature": 0, "tools": [{"name": "shell"}]}, messages, "m", "responses"))
+
+    def test_round_trip_and_replay(self):
+        cache = ResponseCache(self.tmp.name)
+        entries = [(0.0, {"type": "a"}), (0.01, {"type": "b"})]
+        asyncio.run(cache.put("k", entries))
+        self.assertEqual(asyncio.run(cache.get("k")), entries)
+
+        async def collect():
+            return [evt async for evt in cache.replay(await cache.get("k"))]
+
+        self.assertEqual(asyncio.run(collect()), [{"type": "a"}, {"type": "b"}])
+        self.assertIsNone(asyncio.run(cache.get("missing")))
+
+    def test_expired_entries_miss(self):
+        cache = ResponseCache(self.tmp.name, ttl=0.05)
+        asyncio.run(cache.put("k", [(0.0, {"type": "a"})]))
+        time.sleep(0.1)
+        self.assertIsNone(asyncio.run(cache.get("k")))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, "k.jsonl")))
+
+    def test_evicts_least_recently_used(self):
+        cache = ResponseCache(self.tmp.name, max_bytes=10 ** 9)
+        big = [(0.0, {"delta": "x" * 500})]
+        for i, key in enumerate(("a", "b", "c")):
+            asyncio.run(cache.put(key, big))
+            os.utime(os.path.join(self.tmp.name, f"{key}.jsonl"), (1000 + i, 1000 + i))
+        asyncio.run(cache.get("a"))
+        cache.max_bytes = 1200
+        cache.evict()
+        self.assertIsNotNone(asyncio.run(cache.get("a")))
+        self.assertIsNone(asyncio.run(cache.get("b")))
+        self.assertIsNotNone(asyncio.run(cache.get("c")))
+
+    def test_file_io_runs_off_the_event_loop(self):
+        cache = ResponseCache(self.tmp.name)
+        threads = []
+        real_put, real_get = cache._put, cache._get
+        cache._put = lambda *args: threads.append(threading.get_ident()) or real_put(*args)
+        cache._get = lambda *args: threads.append(threading.get_ident()) or real_get(*args)
+
+        async def scenario():
+            await cache.put("k", [(0.0, {"type": "a"})])
+            return await cache.get("k")
+
+        self.assertEqual(asyncio.run(scenario()), [(0.0, {"type": "a"})])
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.get_ident(), threads)
+
+
+if __name__ == "__main__":
+    unittest.main()
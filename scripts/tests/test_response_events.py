@@ -0,0 +1,120 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from response_events import ResponseTranslator
+
+
+def text_chunk(text, finish_reason=None):
+    return {"model": "gpt-4o-mini", "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": finish_reason}]}
+
+
+def tool_chunk(index, arguments, call_id=None, name=None, finish_reason=None):
+    tc = {"index": index, "function": {"arguments": arguments}}
+    if call_id:
+        tc["id"] = call_id
+        tc["function"]["name"] = name
+    return {"choices": [{"index": 0, "delta": {"tool_calls": [tc]}, "finish_reason": finish_reason}]}
+
+
+class ResponseTranslatorTests(unittest.TestCase):
+    def test_streams_text_deltas_as_they_arrive(self):
+        tr = ResponseTranslator(resp_id="resp_1")
+        self.assertEqual([e["type"] for e in tr.start()], ["response.created", "response.in_progress"])
+
+        first = tr.feed(text_chunk("Hel"))
+        self.assertEqual([e["type"] for e in first], ["response.output_item.added", "response.output_text.delta"])
+        self.assertEqual(first[1]["delta"], "Hel")
+        self.assertEqual([e["delta"] for e in tr.feed(text_chunk("lo"))], ["lo"])
+
+        done = tr.feed({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        self.assertEqual([e["type"] for e in done], ["response.output_text.done", "response.output_item.done"])
+        self.assertEqual(done[0]["text"], "Hello")
+
+        final = tr.finish()
+        self.assertEqual(final[-1]["type"], "response.completed")
+        self.assertEqual(final[-1]["response"]["output"][0]["content"][0]["text"], "Hello")
+        self.assertEqual(final[-1]["response"]["model"], "gpt-4o-mini")
+
+    def test_streams_tool_call_argument_deltas(self):
+        tr = ResponseTranslator()
+        tr.start()
+        added = tr.feed(tool_chunk(0, "", call_id="call_a", name="shell"))
+        self.assertEqual(added[0]["type"], "response.output_item.added")
+        self.assertEqual(added[0]["item"]["call_id"], "call_a")
+        events = tr.feed(tool_chunk(0, '{"command":')) + tr.feed(tool_chunk(0, '["ls"]}'))
+        deltas = [e for e in events if e["type"] == "response.function_call_arguments.delta"]
+        self.assertEqual([e["delta"] for e in deltas], ['{"command":', '["ls"]}'])
+        self.assertEqual(events[-3]["type"], "response.function_call_arguments.partial")
+        self.assertEqual(events[-3]["arguments"], {"command": ["ls"]})
+
+        # The call closes as soon as its arguments form a whole object.
+        done = events[-2:]
+        self.assertEqual(done[0]["type"], "response.function_call_arguments.done")
+        self.assertEqual(done[0]["arguments"], '{"command":["ls"]}')
+        self.assertEqual(done[1]["item"]["status"], "completed")
+        self.assertEqual(tr.feed({"choices": [{"index": 0, "delta": {}, "finish_reason": "tool_calls"}]}), [])
+
+    def test_closes_each_call_when_the_next_one_starts(self):
+        tr = ResponseTranslator()
+        tr.feed(tool_chunk(0, '{"command":["ls"]', call_id="call_a", name="shell"))
+        events = tr.feed(tool_chunk(1, '{"command":', call_id="call_b", name="shell"))
+        self.assertEqual(
+            [e["type"] for e in events],
+            [
+                "response.function_call_arguments.done",
+                "response.output_item.done",
+                "response.output_item.added",
+                "response.function_call_arguments.delta",
+            ],
+        )
+        self.assertEqual(events[1]["item"]["call_id"], "call_a")
+        self.assertEqual(events[1]["item"]["arguments"], '{"command":["ls"]')
+        ends = tr.feed(tool_chunk(1, '["pwd"]}')) + tr.feed(tool_chunk(1, "\n"))
+        self.assertEqual(ends[-1]["item"]["arguments"], '{"command":["pwd"]}')
+        output = tr.finish()[-1]["response"]["output"]
+        self.assertEqual([item["call_id"] for item in output], ["call_a", "call_b"])
+
+    def test_text_before_tool_call_is_closed_first(self):
+        tr = ResponseTranslator()
+        tr.feed(text_chunk("Let me look."))
+        events = tr.feed(tool_chunk(0, "{}", call_id="call_a", name="shell"))
+        self.assertEqual(
+            [e["type"] for e in events],
+            [
+                "response.output_text.done",
+                "response.output_item.done",
+                "response.output_item.added",
+                "response.function_call_arguments.delta",
+                "response.function_call_arguments.done",
+                "response.output_item.done",
+            ],
+        )
+        output = tr.finish()[-1]["response"]["output"]
+        self.assertEqual([item["type"] for item in output], ["message", "function_call"])
+
+    def test_assistant_message_for_history(self):
+        tr = ResponseTranslator()
+        tr.feed(text_chunk("Checking."))
+        tr.feed(tool_chunk(0, '{"command":["ls"]}', call_id="call_a", name="shell"))
+        tr.finish()
+        self.assertEqual(
+            tr.assistant_message(),
+            {
+                "role": "assistant",
+                "content": "Checking.",
+                "tool_calls": [
+                    {"id": "call_a", "type": "function", "function": {"name": "shell", "arguments": '{"command":["ls"]}'}}
+                ],
+            },
+        )
+
+    def test_empty_stream_fails(self):
+        tr = ResponseTranslator()
+        self.assertEqual(tr.finish()[-1]["type"], "response.failed")
+
+
+if __name__ == "__main__":
+    unittest.main()
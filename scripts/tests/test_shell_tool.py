@@ -0,0 +1,125 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from cancellation import Deadline
+from shell_tool import HeadTailBuffer, parse_shell_args, run_shell, run_tool_calls
+
+
+def shell_call(call_id, command, **extra):
+    return {
+        "id": call_id,
+        "type": "function",
+        "function": {"name": "shell", "arguments": json.dumps({"command": command, **extra})},
+    }
+
+
+def sleep_then_echo(seconds, text):
+    return [sys.executable, "-c", f"import time; time.sleep({seconds}); print({text!r})"]
+
+
+def alive(pid):
+    """False once ``pid`` is gone or a zombie waiting to be reaped."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] not in ("Z", "X")
+    except FileNotFoundError:
+        return False
+
+
+class ShellToolTests(unittest.TestCase):
+    def test_runs_calls_concurrently_in_call_order(self):
+        calls = [
+            shell_call("a", sleep_then_echo(0.8, "slow")),
+            shell_call("b", sleep_then_echo(0.2, "fast")),
+            shell_call("c", sleep_then_echo(0.5, "mid")),
+        ]
+        finished = []
+
+        async def on_done(index, call, result):
+            finished.append(call["id"])
+
+        start = time.monotonic()
+        results = asyncio.run(run_tool_calls(calls, workers=3, on_done=on_done))
+        elapsed = time.monotonic() - start
+        self.assertEqual(results, ["slow", "fast", "mid"])
+        self.assertEqual(finished, ["b", "c", "a"])
+        self.assertLess(elapsed, 0.8 + 0.5)
+
+    def test_calls_start_before_their_progress(self):
+        calls = [shell_call(str(i), ["sh", "-c", "echo one; sleep 0.05; echo two"]) for i in range(3)]
+        events = []
+
+        async def on_start(index, call):
+            await asyncio.sleep(0.01)
+            events.append(("start", call["id"]))
+
+        def on_progress(index, call, info):
+            events.append(("progress", call["id"]))
+
+        with mock.patch.dict(os.environ, {"CODEX_BRIDGE_TOOL_PROGRESS_MS": "0"}):
+            asyncio.run(run_tool_calls(calls, workers=2, on_start=on_start, on_progress=on_progress))
+        for call in calls:
+            seen = [kind for kind, call_id in events if call_id == call["id"]]
+            self.assertEqual(seen[0], "start")
+            self.assertIn("progress", seen)
+
+    def test_worker_limit_serialises(self):
+        calls = [shell_call(str(i), sleep_then_echo(0.1, i)) for i in range(3)]
+        start = time.monotonic()
+        asyncio.run(run_tool_calls(calls, workers=1))
+        self.assertGreaterEqual(time.monotonic() - start, 0.3)
+
+    def test_timeout_and_errors(self):
+        timed_out = asyncio.run(run_shell(json.dumps({"command": sleep_then_echo(5, "x"), "timeout": 100})))
+        self.assertIn("timed out", timed_out)
+        self.assertIn("No such file", asyncio.run(run_shell(json.dumps({"command": ["/nonexistent/cmd"]}))))
+        self.assertEqual(parse_shell_args("not json"), ([], None, None))
+
+    def test_deadline_kills_the_whole_process_group(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            pid_file = os.path.join(tmp, "pid")
+            script = f"sleep 30 & echo $! > {pid_file}; wait"
+            start = time.monotonic()
+            result = asyncio.run(
+                run_shell(json.dumps({"command": ["sh", "-c", script], "timeout": 10000}), deadline=Deadline(0.3))
+            )
+            self.assertLess(time.monotonic() - start, 2)
+            self.assertIn("timed out", result)
+            with open(pid_file) as f:
+                grandchild = int(f.read())
+        time.sleep(0.1)
+        self.assertFalse(alive(grandchild))
+
+    def test_head_tail_buffer_truncates_middle(self):
+        buffer = HeadTailBuffer(10)
+        for piece in (b"abc", b"defgh", b"ijklmnop", b"qrst"):
+            buffer.write(piece)
+        self.assertEqual(buffer.dropped, 10)
+        self.assertEqual(buffer.text(), "abcde\n[... 10 bytes truncated ...]\npqrst")
+        self.assertEqual(buffer.last_line(), "pqrst")
+
+    def test_caps_chatty_command_and_reports_progress(self):
+        script = "import sys, time\nfor i in range(200):\n    print('line', i)\n    sys.stdout.flush()\n    time.sleep(0.001)\nsys.exit(3)"
+        progress = []
+        with mock.patch.dict(os.environ, {"CODEX_BRIDGE_TOOL_PROGRESS_MS": "0"}):
+            result = asyncio.run(
+                run_shell(json.dumps({"command": [sys.executable, "-c", script]}), on_progress=progress.append, max_bytes=200)
+            )
+        self.assertTrue(result.startswith("line 0\n"))
+        self.assertIn("bytes truncated", result)
+        self.assertTrue(result.endswith("line 199\n[exit code 3]"))
+        self.assertLess(len(result), 300)
+        self.assertTrue(progress)
+        self.assertGreater(progress[-1]["bytes"], progress[0]["bytes"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import bridge_metrics
+from invoke_llm import chat_chunk
+from response_events import ResponseTranslator
+from stall_watchdog import StallPolicy, StallWatchdog, StreamStalled
+
+
+class FakeStream:
+    """Yields ``chunks``, then hangs if ``stall`` is set instead of finishing."""
+
+    def __init__(self, chunks, stall=False):
+        self.chunks = chunks
+        self.stall = stall
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            yield chunk
+        if self.stall:
+            await asyncio.sleep(3600)
+
+    async def close(self):
+        self.closed = True
+
+
+def text(*pieces, finish=False):
+    chunks = [chat_chunk("chatcmpl-a", "m", {"content": piece}) for piece in pieces]
+    if finish:
+        chunks.append(chat_chunk("chatcmpl-a", "m", {}, "stop"))
+    return chunks
+
+
+def tool(arguments, finish=False):
+    tc = {"index": 0, "id": "call_1", "type": "function", "function": {"name": "shell", "arguments": arguments}}
+    chunks = [chat_chunk("chatcmpl-b", "m", {"tool_calls": [tc]})]
+    if finish:
+        chunks.append(chat_chunk("chatcmpl-b", "m", {}, "tool_calls"))
+    return chunks
+
+
+def run(first, retries, mode="retry", max_retries=2):
+    """Stream ``first`` then each retry stream; return (chunks, reopened messages)."""
+    reopened = []
+    pending = list(retries)
+
+    async def reopen(messages):
+        reopened.append(messages)
+        return pending.pop(0)
+
+    async def collect():
+        policy = StallPolicy(timeout_ms=50, retries=max_retries, mode=mode)
+        watchdog = StallWatchdog(first, reopen, policy, [{"role": "user", "content": "hi"}], "test")
+        try:
+            return [chunk async for chunk in watchdog]
+        finally:
+            await watchdog.close()
+
+    return asyncio.run(collect()), reopened
+
+
+def joined_text(chunks):
+    return "".join(c["choices"][0]["delta"].get("content") or "" for c in chunks if c["choices"])
+
+
+class StallWatchdogTests(unittest.TestCase):
+    def setUp(self):
+        bridge_metrics.METRICS.reset()
+
+    def test_retry_skips_text_already_sent(self):
+        first = FakeStream(text("Hel", "lo wo"), stall=True)
+        chunks, reopened = run(first, [FakeStream(text("Hello", " world", "!", finish=True))])
+        self.assertTrue(first.closed)
+        self.assertEqual(reopened, [[{"role": "user", "content": "hi"}]])
+        self.assertEqual(joined_text(chunks), "Hello world!")
+        self.assertEqual({c["id"] for c in chunks}, {"chatcmpl-a"})
+        counters = bridge_metrics.METRICS.counters
+        self.assertEqual((counters["stall.detected.test"], counters["stall.recovered.test"]), (1, 1))
+        self.assertEqual(bridge_metrics.METRICS.count("stall.recovery_ms.test"), 1)
+
+    def test_resume_sends_partial_text_back(self):
+        first = FakeStream(text("Hello wo"), stall=True)
+        chunks, reopened = run(first, [FakeStream(text("rld!", finish=True))], mode="resume")
+        self.assertEqual(reopened[0][1], {"role": "assistant", "content": "Hello wo"})
+        self.assertEqual(reopened[0][2]["role"], "user")
+        self.assertEqual(joined_text(chunks), "Hello world!")
+
+    def test_retried_tool_call_keeps_one_call(self):
+        args = json.dumps({"command": ["ls", "-la"]})
+        first = FakeStream(tool(args[:9]), stall=True)
+        chunks, _ = run(first, [FakeStream(tool(args, finish=True))])
+        translator = ResponseTranslator()
+        for chunk in chunks:
+            translator.feed(chunk)
+        output = translator.finish()[-1]["response"]["output"]
+        self.assertEqual(len(output), 1)
+        self.assertEqual(output[0]["call_id"], "call_1")
+        self.assertEqual(output[0]["arguments"], args)
+
+    def test_retry_diverging_inside_tool_arguments_stops(self):
+        sent = json.dumps({"command": ["ls", "-la"]})
+        first = FakeStream(tool(sent[:16]), stall=True)
+        retry = FakeStream(tool(json.dumps({"command": ["rm", "-rf", "."]}), finish=True))
+        with self.assertRaises(StreamStalled):
+            run(first, [retry])
+        self.assertEqual(bridge_metrics.METRICS.counters["stall.failed.test"], 1)
+
+    def test_retry_diverging_text_stops(self):
+        with self.assertRaises(StreamStalled):
+            run(FakeStream(text("Hello"), stall=True), [FakeStream(text("Howdy there", finish=True))])
+
+    def test_retry_ending_short_of_sent_text_stops(self):
+        with self.assertRaises(StreamStalled):
+            run(FakeStream(text("Hello world"), stall=True), [FakeStream(text("Hello", finish=True))])
+
+    def test_gives_up_after_retries(self):
+        with self.assertRaises(StreamStalled):
+            run(FakeStream(text("a"), stall=True), [FakeStream(text("a"), stall=True)], max_retries=1)
+        self.assertEqual(bridge_metrics.METRICS.counters["stall.failed.test"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from usage_ledger import UsageLedger, session_id
+
+USAGE = {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120, "prompt_tokens_details": {"cached_tokens": 64}}
+
+
+class UsageLedgerTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "nested", "usage.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_sums_per_session_and_model(self):
+        ledger = UsageLedger(self.path)
+        asyncio.run(ledger.record("a", "openai/m", USAGE, {"ttft_ms": 50, "duration_ms": 400}))
+        asyncio.run(ledger.record("b", "openai/m", USAGE, {"ttft_ms": 70, "duration_ms": 600}))
+        state = ledger.read()
+        model = state["models"]["openai/m"]
+        self.assertEqual(
+            (model["requests"], model["prompt_tokens"], model["cached_tokens"], model["ttft_ms"], model["duration_ms"]),
+            (2, 200, 128, 120, 1000),
+        )
+        self.assertEqual(state["sessions"]["a"]["total_tokens"], 120)
+        self.assertLessEqual(model["first_seen"], model["last_seen"])
+
+        asyncio.run(ledger.record("a", "openai/m", None, cache_hit=True))
+        model = ledger.read()["models"]["openai/m"]
+        self.assertEqual((model["requests"], model["cache_hits"], model["prompt_tokens"]), (3, 1, 200))
+
+    def test_keeps_most_recent_sessions(self):
+        ledger = UsageLedger(self.path, max_sessions=2)
+        for session in ("a", "b", "c"):
+            asyncio.run(ledger.record(session, "m", USAGE))
+        self.assertEqual(sorted(ledger.read()["sessions"]), ["b", "c"])
+        self.assertEqual(ledger.read()["models"]["m"]["requests"], 3)
+
+    def test_off_disables(self):
+        with mock.patch.dict(os.environ, {"CODEX_BRIDGE_USAGE_FILE": "off"}):
+            self.assertIsNone(UsageLedger.from_env())
+
+    def test_session_from_request_or_env(self):
+        self.assertEqual(session_id({"metadata": {"session_id": "meta"}}), "meta")
+        with mock.patch.dict(os.environ, {"CODEX_BRIDGE_SESSION": "cli"}):
+            self.assertEqual(session_id({}), "cli")
+            self.assertEqual(session_id({"session_id": "req"}), "req")
+
+
+if __name__ == "__main__":
+    unittest.main()
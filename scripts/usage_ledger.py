@@ -0,0 +1,117 @@
+"""Rolling usage totals per session and per model.
+
+Every bridged response adds its token usage and timings to one small JSON
+file, updated under ``flock`` so that all bridge processes (one per turn,
+or a long-lived server) add to the same totals, and replaced atomically so
+capacity tooling can read it at any time without locking::
+
+    {
+      "updated_at": 1718000000.0,
+      "models": {"openai/gpt-4o-mini": {"requests": 12, "prompt_tokens": 48213, ...}},
+      "sessions": {"5f2c...": {"requests": 3, ...}}
+    }
+
+Each entry sums ``requests``, ``cache_hits`` (requests replayed from the
+response cache, which used no upstream tokens), ``prompt_tokens``,
+``completion_tokens``, ``cached_tokens``, ``total_tokens``, ``duration_ms``
+and ``ttft_ms`` and records ``first_seen``/``last_seen``; averages and
+tokens/sec follow by division.  Only the ``max_sessions`` most recently active sessions are
+kept.  The session comes from the request's ``session_id`` (which the CLI
+fills in) or ``metadata.session_id``, else ``CODEX_BRIDGE_SESSION``.
+
+``CODEX_BRIDGE_USAGE_FILE``      the file (default ``~/.codex/bridge_usage.json``; ``off`` disables)
+``CODEX_BRIDGE_USAGE_SESSIONS``  sessions kept (default 200)
+"""
+import asyncio
+import fcntl
+import json
+import os
+import time
+
+from bridge_log import WARNING, log
+
+DEFAULT_PATH = os.path.join("~", ".codex", "bridge_usage.json")
+DEFAULT_MAX_SESSIONS = 200
+SUMMED = ("requests", "cache_hits", "prompt_tokens", "completion_tokens", "cached_tokens", "total_tokens", "duration_ms", "ttft_ms")
+
+
+def session_id(request):
+    metadata = request.get("metadata") or {}
+    return request.get("session_id") or metadata.get("session_id") or os.environ.get("CODEX_BRIDGE_SESSION") or "unknown"
+
+
+def usage_figures(usage, timings, cache_hit=False):
+    """The summed fields of one response, from chat usage and bridge timings."""
+    usage = usage or {}
+    timings = timings or {}
+    prompt = usage.get("prompt_tokens") or 0
+    completion = usage.get("completion_tokens") or 0
+    return {
+        "requests": 1,
+        "cache_hits": int(cache_hit),
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "cached_tokens": (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0,
+        "total_tokens": usage.get("total_tokens") or prompt + completion,
+        "duration_ms": timings.get("duration_ms") or 0,
+        "ttft_ms": timings.get("ttft_ms") or 0,
+    }
+
+
+class UsageLedger:
+    def __init__(self, path, max_sessions=DEFAULT_MAX_SESSIONS):
+        self.path = os.path.expanduser(path)
+        self.max_sessions = max_sessions
+
+    @classmethod
+    def from_env(cls):
+        """The configured ledger, or None when disabled."""
+        path = os.environ.get("CODEX_BRIDGE_USAGE_FILE", DEFAULT_PATH)
+        if path in ("", "0", "off"):
+            return None
+        return cls(path, int(os.environ.get("CODEX_BRIDGE_USAGE_SESSIONS", DEFAULT_MAX_SESSIONS)))
+
+    def read(self):
+        try:
+            with open(self.path, "rb") as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return {}
+
+    async def record(self, session, model, usage, timings=None, cache_hit=False):
+        """Add one response to its session's and model's totals; never raises.
+
+        The update runs in a worker thread: ``flock`` may wait on another
+        process.
+        """
+        figures = usage_figures(usage, timings, cache_hit)
+        await asyncio.get_running_loop().run_in_executor(None, self._record, session, model, figures)
+
+    def _record(self, session, model, figures):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path + ".lock", "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                state = self.read()
+                now = time.time()
+                state["updated_at"] = now
+                _add(state.setdefault("models", {}), model, figures, now)
+                sessions = state.setdefault("sessions", {})
+                _add(sessions, session, figures, now)
+                if len(sessions) > self.max_sessions:
+                    oldest = sorted(sessions, key=lambda s: sessions[s].get("last_seen", 0))
+                    for stale in oldest[: len(sessions) - self.max_sessions]:
+                        del sessions[stale]
+                tmp = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump(state, f)
+                os.replace(tmp, self.path)
+        except OSError as e:
+            log(f"[WARN] Could not update usage ledger {self.path}: {e}", WARNING)
+
+
+def _add(table, key, figures, now):
+    entry = table.setdefault(key, {"first_seen": now})
+    for name in SUMMED:
+        entry[name] = entry.get(name, 0) + figures[name]
+    entry["last_seen"] = now
@@ -2,7 +2,7 @@
 set -euo pipefail
 
 # install python deps if needed and compile
-pip install -q httpx openai requests
+pip install -q "httpx[http2]" openai
 python3 -m py_compile scripts/call_gpt.py
 
 # prepare sanitized input